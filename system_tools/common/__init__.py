@@ -1,12 +1,44 @@
 """Server Tools."""
 
-from system_tools.common.lib import bash_wrapper, configure_logger, signal_alert
-from system_tools.common.parallelize import parallelize_process, parallelize_thread
+from system_tools.common.alerts import AlertDispatcher, get_alert_dispatcher
+from system_tools.common.instrumentation import CommandStats, add_command_hook, command_verb, remove_command_hook
+from system_tools.common.json_stream import iter_json_members
+from system_tools.common.lib import (
+    CommandResult,
+    async_bash_wrapper,
+    async_run_command,
+    bash_stream,
+    bash_wrapper,
+    configure_logger,
+    run_cli,
+    run_command,
+    set_default_timeout,
+    signal_alert,
+)
+from system_tools.common.parallelize import ParallelResult, iter_parallel, parallelize_process, parallelize_thread
+from system_tools.common.prometheus import TextfileMetrics
 
 __all__ = [
+    "AlertDispatcher",
+    "CommandResult",
+    "CommandStats",
+    "ParallelResult",
+    "TextfileMetrics",
+    "add_command_hook",
+    "async_bash_wrapper",
+    "async_run_command",
+    "bash_stream",
     "bash_wrapper",
+    "command_verb",
     "configure_logger",
+    "get_alert_dispatcher",
+    "iter_json_members",
+    "iter_parallel",
     "parallelize_process",
     "parallelize_thread",
+    "remove_command_hook",
+    "run_cli",
+    "run_command",
+    "set_default_timeout",
     "signal_alert",
 ]
@@ -0,0 +1,203 @@
+"""alerts."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+from math import inf
+from os import getenv
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from apprise import Apprise
+
+logger = logging.getLogger(__name__)
+
+
+class AlertDispatcher:
+    """Send alerts from a background thread, coalesced into digests.
+
+    Alerts sent within `window_secs` of the first pending alert go out as one digest, identical alerts are counted
+    instead of repeated, and digests are at least `min_interval_secs` apart.
+    The Apprise client is built once, on the first digest, and reused.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        window_secs: float = 5.0,
+        min_interval_secs: float = 60.0,
+        max_alerts: int = 50,
+    ) -> None:
+        """__init__.
+
+        Args:
+            url (str): The Apprise URL to notify, for example `signal://localhost:8989/<from>/<to>`.
+            window_secs (float, optional): How long to collect alerts before sending a digest. Defaults to 5.0.
+            min_interval_secs (float, optional): The minimum time between digests. Defaults to 60.0.
+            max_alerts (int, optional): The most alerts listed in a digest, the rest are counted. Defaults to 50.
+        """
+        self.url = url
+        self.window_secs = window_secs
+        self.min_interval_secs = min_interval_secs
+        self.max_alerts = max_alerts
+
+        self._client: Apprise | None = None
+        self._condition = Condition()
+        self._thread: Thread | None = None
+        # Pending alerts keyed by title and body with how many times they were sent, in the order they arrived
+        self._pending: dict[tuple[str, str], int] = {}
+        self._first_pending = inf
+        self._last_sent = -inf
+        self._sending = False
+        self._flush = False
+        self._closed = False
+
+    def send(self, body: str, title: str = "") -> None:
+        """Queue an alert, it is sent with the next digest.
+
+        Args:
+            body (str): The body of the alert.
+            title (str, optional): The title of the alert. Defaults to "".
+        """
+        with self._condition:
+            if self._closed:
+                logger.warning(f"Alert dispatcher is closed, dropping {title=} {body=}")
+                return
+
+            key = (title, body)
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self._first_pending = min(self._first_pending, monotonic())
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Send the pending alerts now, ignoring the window and the rate limit, and wait for them to be sent.
+
+        Args:
+            timeout (float | None, optional): How long to wait in seconds. Defaults to waiting forever.
+
+        Returns:
+            bool: True if every pending alert was sent.
+        """
+        with self._condition:
+            self._flush = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending and not self._sending, timeout)
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        """Send the pending alerts and stop the background thread.
+
+        Args:
+            timeout (float | None, optional): How long to wait for the pending alerts in seconds. Defaults to 10.0.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _next_digest(self) -> dict[tuple[str, str], int] | None:
+        """Wait until a digest is due and take the pending alerts, None once closed with nothing pending."""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    if self._closed:
+                        return None
+                    self._flush = False
+                    self._condition.notify_all()
+                    self._condition.wait()
+                    continue
+
+                due = max(self._first_pending + self.window_secs, self._last_sent + self.min_interval_secs)
+                if self._flush or self._closed or monotonic() >= due:
+                    break
+                self._condition.wait(due - monotonic())
+
+            pending = self._pending
+            self._pending = {}
+            self._first_pending = inf
+            self._last_sent = monotonic()
+            self._sending = True
+            return pending
+
+    def _run(self) -> None:
+        """Send digests until closed."""
+        while (pending := self._next_digest()) is not None:
+            try:
+                self._notify(pending)
+            except Exception:
+                logger.exception(f"Failed to send {len(pending)} alerts")
+            finally:
+                with self._condition:
+                    self._sending = False
+                    self._condition.notify_all()
+
+    def _notify(self, pending: dict[tuple[str, str], int]) -> None:
+        """Send a digest of the pending alerts."""
+        if self._client is None:
+            # Apprise is slow to import, only pay for it once there is something to send
+            from apprise import Apprise
+
+            self._client = Apprise()
+            self._client.add(self.url)
+
+        title, body = format_digest(pending, self.max_alerts)
+        if not self._client.notify(title=title, body=body):
+            logger.warning(f"Failed to send {len(pending)} alerts to {self.url}")
+
+
+def format_digest(pending: dict[tuple[str, str], int], max_alerts: int = 50) -> tuple[str, str]:
+    """Format alerts as a single message.
+
+    Args:
+        pending (dict[tuple[str, str], int]): The title and body of each alert with how many times it was sent.
+        max_alerts (int, optional): The most alerts listed, the rest are counted. Defaults to 50.
+
+    Returns:
+        tuple[str, str]: The title and body of the message.
+    """
+    if len(pending) == 1:
+        ((title, body), count) = next(iter(pending.items()))
+        return title, body if count == 1 else f"{body} (x{count})"
+
+    lines: list[str] = []
+    for (title, body), count in list(pending.items())[:max_alerts]:
+        line = f"{title}: {body}" if title else body
+        lines.append(line if count == 1 else f"{line} (x{count})")
+
+    if len(pending) > max_alerts:
+        lines.append(f"... and {len(pending) - max_alerts} more")
+
+    return f"{sum(pending.values())} alerts", "\n".join(lines)
+
+
+_dispatchers: dict[str, AlertDispatcher] = {}
+_dispatchers_lock = Lock()
+
+
+def get_alert_dispatcher() -> AlertDispatcher | None:
+    """Get the signal alert dispatcher, it is closed at exit so queued alerts are still sent.
+
+    The signal gateway is SIGNAL_ALERT_HOST, localhost:8989 by default.
+
+    Returns:
+        AlertDispatcher | None: The dispatcher, None if SIGNAL_ALERT_FROM_PHONE or SIGNAL_ALERT_TO_PHONE is not set.
+    """
+    from_phone = getenv("SIGNAL_ALERT_FROM_PHONE")
+    to_phone = getenv("SIGNAL_ALERT_TO_PHONE")
+    if not from_phone or not to_phone:
+        return None
+
+    url = f"signal://{getenv('SIGNAL_ALERT_HOST', 'localhost:8989')}/{from_phone}/{to_phone}"
+    with _dispatchers_lock:
+        if url not in _dispatchers:
+            dispatcher = AlertDispatcher(url)
+            atexit.register(dispatcher.close)
+            _dispatchers[url] = dispatcher
+        return _dispatchers[url]
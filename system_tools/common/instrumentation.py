@@ -0,0 +1,158 @@
+"""instrumentation."""
+
+from __future__ import annotations
+
+import json
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from math import ceil
+from re import compile as re_compile
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    CommandHook = Callable[[str, float, int], None]
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+SUBCOMMAND = re_compile(r"[a-z][a-z-]*")
+
+_command_hooks: list[CommandHook] = []
+
+
+def add_command_hook(hook: CommandHook) -> None:
+    """Call hook with the command, duration in seconds and output bytes of every command that is run.
+
+    Args:
+        hook (CommandHook): The hook.
+    """
+    _command_hooks.append(hook)
+
+
+def remove_command_hook(hook: CommandHook) -> None:
+    """Stop calling a hook added with add_command_hook.
+
+    Args:
+        hook (CommandHook): The hook.
+    """
+    _command_hooks.remove(hook)
+
+
+def record_command(command: str, duration: float, output_bytes: int) -> None:
+    """Pass a finished command to the command hooks.
+
+    Args:
+        command (str): The command.
+        duration (float): How long the command took in seconds.
+        output_bytes (int): The size of the output of the command in bytes.
+    """
+    for hook in tuple(_command_hooks):
+        try:
+            hook(command, duration, output_bytes)
+        except Exception:
+            logger.exception(f"Command hook {hook} failed")
+
+
+def command_verb(command: str) -> str:
+    """Get the program and subcommand of a command, for example `zfs list` or `systemctl is-active`.
+
+    Args:
+        command (str): The command.
+
+    Returns:
+        str: The verb of the command.
+    """
+    program, *arguments = command.split()
+    program = program.rsplit("/", 1)[-1]
+    subcommand = next((argument for argument in arguments if not argument.startswith("-")), "")
+    if SUBCOMMAND.fullmatch(subcommand):
+        return f"{program} {subcommand}"
+    return program
+
+
+class CommandStats:
+    """Latency and output size of commands grouped by verb.
+
+    Register it with `add_command_hook(stats.record)`.
+    """
+
+    def __init__(self) -> None:
+        """__init__."""
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self.output_bytes: dict[str, int] = defaultdict(int)
+        self._lock = Lock()
+
+    def record(self, command: str, duration: float, output_bytes: int) -> None:
+        """Record a finished command.
+
+        Args:
+            command (str): The command.
+            duration (float): How long the command took in seconds.
+            output_bytes (int): The size of the output of the command in bytes.
+        """
+        verb = command_verb(command)
+        with self._lock:
+            self.durations[verb].append(duration)
+            self.output_bytes[verb] += output_bytes
+
+    def histogram(self, verb: str) -> list[tuple[float, int]]:
+        """Get the cumulative latency histogram of a verb.
+
+        Args:
+            verb (str): The verb of the commands.
+
+        Returns:
+            list[tuple[float, int]]: The number of commands that took at most each bucket of seconds,
+                the last bucket is infinity.
+        """
+        with self._lock:
+            durations = sorted(self.durations.get(verb, []))
+
+        buckets = (*LATENCY_BUCKETS, float("inf"))
+        return [(bucket, bisect_right(durations, bucket)) for bucket in buckets]
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Summarize the commands of each verb.
+
+        Returns:
+            dict[str, dict[str, float]]: The count, total_secs, avg_secs, p95_secs, max_secs and output_bytes
+                of each verb, slowest total first.
+        """
+        with self._lock:
+            verbs = {verb: sorted(durations) for verb, durations in self.durations.items()}
+            output_bytes = dict(self.output_bytes)
+
+        summary: dict[str, dict[str, float]] = {}
+        for verb, durations in sorted(verbs.items(), key=lambda item: sum(item[1]), reverse=True):
+            total = sum(durations)
+            summary[verb] = {
+                "count": len(durations),
+                "total_secs": total,
+                "avg_secs": total / len(durations),
+                "p95_secs": durations[ceil(len(durations) * 0.95) - 1],
+                "max_secs": durations[-1],
+                "output_bytes": output_bytes[verb],
+            }
+        return summary
+
+    def report(self, stats_file: Path | None = None) -> None:
+        """Log the summary and write it to a JSON file.
+
+        Args:
+            stats_file (Path | None, optional): The JSON file to write the summary to. Defaults to None.
+        """
+        summary = self.summary()
+        for verb, stats in summary.items():
+            logger.info(
+                f"{verb}: count={stats['count']} total={stats['total_secs']:.3f}s avg={stats['avg_secs']:.3f}s "
+                f"p95={stats['p95_secs']:.3f}s max={stats['max_secs']:.3f}s output={stats['output_bytes']}B"
+            )
+
+        if stats_file:
+            stats_file.write_text(json.dumps(summary, indent=2))
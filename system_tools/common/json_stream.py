@@ -0,0 +1,110 @@
+"""json_stream."""
+
+from __future__ import annotations
+
+from json import JSONDecodeError, JSONDecoder
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+WHITESPACE = " \t\n\r"
+
+
+class _JsonReader:
+    """Reads JSON tokens from a stream of text chunks."""
+
+    def __init__(self, chunks: Iterable[str]) -> None:
+        """__init__."""
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.position = 0
+        self.decoder = JSONDecoder()
+
+    def fill(self) -> bool:
+        """Read the next chunk into the buffer, dropping what was already consumed."""
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self.fill():
+                error = "Unexpected end of JSON stream"
+                raise JSONDecodeError(error, self.buffer, self.position)
+
+    def expect(self, *expected: str) -> str:
+        """Consume the next non whitespace character and check it is one of expected."""
+        char = self.peek()
+        if char not in expected:
+            error = f"Expected one of {expected} got {char!r}"
+            raise JSONDecodeError(error, self.buffer, self.position)
+        self.position += 1
+        return char
+
+    def value(self) -> Any:  # noqa: ANN401
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+
+            self.position = end
+            return value
+
+
+def iter_json_members(chunks: Iterable[str], key: str, header: dict[str, Any]) -> Iterator[tuple[str, Any]]:
+    """Yield the members of a top level JSON object member as they are parsed.
+
+    Only one member of `key` is held in memory at a time.
+
+    Args:
+        chunks (Iterable[str]): The JSON document in chunks.
+        key (str): The top level member to stream.
+        header (dict[str, Any]): Filled with the other top level members as they are parsed.
+
+    Yields:
+        tuple[str, Any]: The name and value of each member of `key`.
+    """
+    reader = _JsonReader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name != key:
+            header[name] = reader.value()
+        else:
+            reader.expect("{")
+            while reader.peek() != "}":
+                member_name = reader.value()
+                reader.expect(":")
+                yield member_name, reader.value()
+                if reader.expect(",", "}") == "}":
+                    break
+            else:
+                reader.expect("}")
+
+        if reader.expect(",", "}") == "}":
+            return
@@ -4,11 +4,23 @@ from __future__ import annotations
 
 import logging
 import sys
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import UTC, datetime
+from functools import partial
 from os import getenv
-from subprocess import PIPE, Popen
+from pathlib import Path
+from subprocess import PIPE, Popen, TimeoutExpired
+from threading import Event, Thread, Timer
+from time import perf_counter
+from typing import IO, TYPE_CHECKING
 
-from apprise import Apprise
+from system_tools.common.alerts import get_alert_dispatcher
+from system_tools.common.instrumentation import record_command
+
+if TYPE_CHECKING:
+    from asyncio import Semaphore
+    from collections.abc import Callable, Iterator
 
 logger = logging.getLogger(__name__)
 
@@ -27,44 +39,305 @@ def configure_logger(level: str = "INFO") -> None:
     )
 
 
-def bash_wrapper(command: str) -> tuple[str, int]:
+@dataclass(frozen=True)
+class CommandResult:
+    """The outcome of a command run by run_command."""
+
+    command: str
+    stdout: str
+    stderr: str
+    returncode: int
+    duration: float
+
+
+_default_timeout: float | None = float(getenv("SYSTEM_TOOLS_COMMAND_TIMEOUT", "0")) or None
+
+
+def set_default_timeout(timeout: float | None) -> None:
+    """Set the timeout of commands that are not given one.
+
+    Starts from the SYSTEM_TOOLS_COMMAND_TIMEOUT environment variable, no timeout if it is not set.
+
+    Args:
+        timeout (float | None): The timeout in seconds, None for no timeout.
+    """
+    global _default_timeout  # noqa: PLW0603 The default is process wide
+    _default_timeout = timeout
+
+
+def _stop_process(process: Popen[str], kill_after: float) -> None:
+    """Terminate a process, kill it if it does not exit within kill_after seconds."""
+    process.terminate()
+    try:
+        process.wait(kill_after)
+    except TimeoutExpired:
+        process.kill()
+        try:
+            process.wait(kill_after)
+        except TimeoutExpired:
+            # A process stuck in the kernel, on a suspended pool for example, can not be killed
+            logger.error(f"{process.args!r} did not exit after SIGKILL")  # noqa: TRY400
+
+
+def _read_lines(stream: IO[str], lines: list[str], on_line: Callable[[str], None] | None) -> None:
+    """Read a stream line by line."""
+    for line in stream:
+        lines.append(line)
+        if on_line:
+            on_line(line)
+
+
+def run_command(
+    command: str,
+    timeout: float | None = None,
+    on_stdout: Callable[[str], None] | None = None,
+    kill_after: float = 5,
+) -> CommandResult:
+    """Execute a command and capture stdout and stderr separately.
+
+    When the timeout expires the command gets SIGTERM, then SIGKILL if it is still running kill_after seconds later.
+
+    Args:
+        command (str): The command to be executed.
+        timeout (float | None, optional): The timeout in seconds. Defaults to the default timeout.
+        on_stdout (Callable[[str], None] | None, optional): Called with each line of stdout as it is read.
+            Defaults to None.
+        kill_after (float, optional): The seconds between SIGTERM and SIGKILL. Defaults to 5.
+
+    Raises:
+        TimeoutError: If the command did not finish in time.
+
+    Returns:
+        CommandResult: The output, return code and duration of the command.
+    """
+    timeout = timeout if timeout is not None else _default_timeout
+    start = perf_counter()
+    # This is a acceptable risk
+    process = Popen(command.split(), stdout=PIPE, stderr=PIPE, text=True)
+    try:
+        if on_stdout is None:
+            stdout, stderr = process.communicate(timeout=timeout)
+        else:
+            stdout, stderr = _stream_command(process, timeout, on_stdout)
+    except TimeoutExpired:
+        # Not waiting on the pipes or the exit, a process that can not be killed would block forever
+        _stop_process(process, kill_after)
+        record_command(command, perf_counter() - start, 0)
+        error = f"{command=} timed out after {timeout}s"
+        raise TimeoutError(error) from None
+
+    duration = perf_counter() - start
+    record_command(command, duration, len(stdout.encode()))
+    logger.debug(f"{command=} returned {process.returncode} in {duration:.3f}s")
+    return CommandResult(command, stdout, stderr, process.returncode, duration)
+
+
+def _stream_command(
+    process: Popen[str],
+    timeout: float | None,
+    on_stdout: Callable[[str], None],
+) -> tuple[str, str]:
+    """Wait for a process while its stdout is passed to on_stdout line by line."""
+    if process.stdout is None or process.stderr is None:
+        error = f"Failed to open pipes for {process.args!r}"
+        raise RuntimeError(error)
+
+    stdout: list[str] = []
+    stderr: list[str] = []
+    readers = (
+        Thread(target=_read_lines, args=(process.stdout, stdout, on_stdout), daemon=True),
+        Thread(target=_read_lines, args=(process.stderr, stderr, None), daemon=True),
+    )
+    for reader in readers:
+        reader.start()
+
+    process.wait(timeout)
+    for reader in readers:
+        reader.join()
+
+    return "".join(stdout), "".join(stderr)
+
+
+def bash_wrapper(command: str, timeout: float | None = None) -> tuple[str, int]:
     """Execute a bash command and capture the output.
 
     Args:
         command (str): The bash command to be executed.
+        timeout (float | None, optional): The timeout in seconds. Defaults to the default timeout.
 
     Returns:
         Tuple[str, int]: A tuple containing the output of the command (stdout) as a string,
         the error output (stderr) as a string (optional), and the return code as an integer.
     """
+    result = run_command(command, timeout)
+    if result.stderr:
+        logger.error(f"error={result.stderr!r}")
+        return result.stderr, result.returncode
+
+    return result.stdout, result.returncode
+
+
+def bash_stream(
+    command: str,
+    chunk_size: int = 65536,
+    timeout: float | None = None,
+    check: bool = True,  # noqa: FBT001, FBT002
+) -> Iterator[str]:
+    """Execute a bash command and yield its output as it is produced.
+
+    Args:
+        command (str): The bash command to be executed.
+        chunk_size (int, optional): The number of characters to read at a time. Defaults to 65536.
+        timeout (float | None, optional): The timeout in seconds for the whole command.
+            Defaults to the default timeout.
+        check (bool, optional): Raise if the command fails, otherwise its stderr is logged.
+            The output must be read to the end for either to happen. Defaults to True.
+
+    Raises:
+        TimeoutError: If the command did not finish in time.
+        RuntimeError: If check and the command failed, with its stderr.
+
+    Yields:
+        str: Chunks of the output of the command (stdout).
+    """
+    timeout = timeout if timeout is not None else _default_timeout
     # This is a acceptable risk
-    process = Popen(command.split(), stdout=PIPE, stderr=PIPE)
-    output, error = process.communicate()
-    if error:
-        logger.error(f"{error=}")
-        return error.decode(), process.returncode
+    with Popen(command.split(), stdout=PIPE, stderr=PIPE, text=True) as process:
+        if process.stdout is None or process.stderr is None:
+            error = f"Failed to open pipes for {command=}"
+            raise RuntimeError(error)
+
+        timed_out = Event()
+
+        def expire() -> None:
+            timed_out.set()
+            _stop_process(process, 5)
+
+        watchdog = Timer(timeout, expire) if timeout is not None else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
+
+        # Drained while stdout is read, a command that fills the stderr pipe would otherwise block
+        stderr: list[str] = []
+        stderr_reader = Thread(target=_read_lines, args=(process.stderr, stderr, None), daemon=True)
+        stderr_reader.start()
+
+        start = perf_counter()
+        output_size = 0
+        try:
+            for chunk in iter(partial(process.stdout.read, chunk_size), ""):
+                output_size += len(chunk.encode())
+                yield chunk
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            record_command(command, perf_counter() - start, output_size)
+
+        if timed_out.is_set():
+            error = f"{command=} timed out after {timeout}s"
+            raise TimeoutError(error)
+
+        process.wait()
+        stderr_reader.join()
+        if process.returncode != 0 and check:
+            error = f"{command=} returned {process.returncode}: {''.join(stderr).strip()}"
+            raise RuntimeError(error)
+
+        if stderr:
+            logger.error(f"error={''.join(stderr)!r}")
+
+
+async def async_run_command(command: str, semaphore: Semaphore | None = None) -> CommandResult:
+    """Execute a command without blocking the event loop and capture stdout and stderr separately.
+
+    The command is killed if the task running it is cancelled, so `asyncio.timeout` can bound it.
+
+    Args:
+        command (str): The command to be executed.
+        semaphore (Semaphore | None, optional): Limits how many commands run at once. Defaults to None.
+
+    Returns:
+        CommandResult: The output, return code and duration of the command.
+    """
+    import asyncio
+
+    async with semaphore or nullcontext():
+        start = perf_counter()
+        # This is a acceptable risk
+        process = await asyncio.create_subprocess_exec(*command.split(), stdout=PIPE, stderr=PIPE)
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            logger.warning(f"{command=} was cancelled")
+            raise
+        duration = perf_counter() - start
+        record_command(command, duration, len(stdout))
+
+    return CommandResult(command, stdout.decode(), stderr.decode(), process.returncode or 0, duration)
 
-    return output.decode(), process.returncode
+
+async def async_bash_wrapper(command: str, semaphore: Semaphore | None = None) -> tuple[str, int]:
+    """Execute a bash command without blocking the event loop and capture the output.
+
+    The command is killed if the task running it is cancelled, so `asyncio.timeout` can bound it.
+
+    Args:
+        command (str): The bash command to be executed.
+        semaphore (Semaphore | None, optional): Limits how many commands run at once. Defaults to None.
+
+    Returns:
+        tuple[str, int]: The output of the command, stderr if there was any, and the return code.
+    """
+    result = await async_run_command(command, semaphore)
+    if result.stderr:
+        logger.error(f"error={result.stderr!r}")
+        return result.stderr, result.returncode
+
+    return result.stdout, result.returncode
 
 
 def signal_alert(body: str, title: str = "") -> None:
-    """Send a signal alert.
+    """Queue a signal alert.
+
+    The alert dispatcher sends it from a background thread, coalesced with the other alerts of its window,
+    so the caller never waits on the signal gateway.
 
     Args:
         body (str): The body of the alert.
         title (str, optional): The title of the alert. Defaults to "".
     """
-    apprise_client = Apprise()
-
-    from_phone = getenv("SIGNAL_ALERT_FROM_PHONE")
-    to_phone = getenv("SIGNAL_ALERT_TO_PHONE")
-    if not from_phone or not to_phone:
+    if (dispatcher := get_alert_dispatcher()) is None:
         logger.info("SIGNAL_ALERT_FROM_PHONE or SIGNAL_ALERT_TO_PHONE not set")
         return
 
-    apprise_client.add(f"signal://localhost:8989/{from_phone}/{to_phone}")
+    dispatcher.send(body, title)
+
+
+def run_cli(main: Callable[..., None], daemon: Callable[..., None]) -> None:
+    """Run main, or daemon for `<program> daemon ...`, from the command line arguments.
+
+    A lone configuration file is passed straight on, only options and --help need typer,
+    which takes longer to import than the rest of the CLI.
+
+    Args:
+        main (Callable[..., None]): Runs once, its first parameter is the configuration file.
+        daemon (Callable[..., None]): Stays resident, its first parameter is the configuration file.
+    """
+    func = main
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        del sys.argv[1]
+        func = daemon
+
+    if len(sys.argv) == 2 and not sys.argv[1].startswith("-"):  # noqa: PLR2004
+        func(Path(sys.argv[1]))
+        return
+
+    import typer
 
-    apprise_client.notify(title=title, body=body)
+    typer.run(func)
 
 
 def utcnow() -> datetime:
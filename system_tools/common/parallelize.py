@@ -3,13 +3,16 @@
 from __future__ import annotations
 
 import logging
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import reprlib
+from collections.abc import Sized
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from itertools import batched, islice
 from multiprocessing import cpu_count
 from typing import TYPE_CHECKING, Any, Generic, Literal, TypeVar
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Mapping, Sequence
+    from collections.abc import Callable, Generator, Iterable, Mapping, Sequence
 
 R = TypeVar("R")
 
@@ -28,41 +31,150 @@ class ExecutorResults(Generic[R]):
         return f"results={self.results} exceptions={self.exceptions}"
 
 
+@dataclass
+class ParallelResult(Generic[R]):
+    """The outcome of one call of iter_parallel, `index` is the position of its kwargs in kwargs_list."""
+
+    index: int
+    kwargs: Mapping[str, Any]
+    result: R | None = None
+    exception: BaseException | None = None
+
+
+def _run_chunk(
+    func: Callable[..., R],
+    kwargs_chunk: Sequence[Mapping[str, Any]],
+) -> list[tuple[R | None, Exception | None]]:
+    """Run a function for each kwargs of a chunk, so a chunk is one task and one IPC round trip of a process pool."""
+    outcomes: list[tuple[R | None, Exception | None]] = []
+    for kwargs in kwargs_chunk:
+        try:
+            outcomes.append((func(**kwargs), None))
+        except Exception as exception:  # noqa: BLE001
+            outcomes.append((None, exception))
+    return outcomes
+
+
+def _chunk_outcomes(
+    future: Future[list[tuple[R | None, Exception | None]]],
+    chunk: Sequence[tuple[int, Mapping[str, Any]]],
+) -> list[ParallelResult[R]]:
+    """Get the outcome of each call of a finished task, every call fails if the task itself failed.
+
+    A task fails as a whole when its chunk could not be sent to or from a worker, for example a broken process pool.
+    """
+    if (exception := future.exception()) is not None:
+        return [ParallelResult(index, kwargs, exception=exception) for index, kwargs in chunk]
+
+    return [
+        ParallelResult(index, kwargs, result, exception)
+        for (index, kwargs), (result, exception) in zip(chunk, future.result(), strict=True)
+    ]
+
+
+def iter_parallel(
+    func: Callable[..., R],
+    kwargs_list: Iterable[Mapping[str, Any]],
+    executor_type: type[ThreadPoolExecutor | ProcessPoolExecutor] = ThreadPoolExecutor,
+    max_workers: int | None = None,
+    progress_tracker: int | None = None,
+    mode: modes = "normal",
+    chunksize: int = 1,
+    max_in_flight: int | None = None,
+) -> Generator[ParallelResult[R]]:
+    """Run a function with multiple arguments in parallel and yield each outcome as soon as it completes.
+
+    kwargs_list is consumed lazily, at most max_in_flight tasks of chunksize calls are submitted at once,
+    so it can be a generator of any length.
+    The calls that have not started are cancelled when the generator is closed early or, in early_error mode,
+    when a call raises. Calls that are already running finish in the background.
+
+    Args:
+        func (Callable[..., R]): Function to run in parallel.
+        kwargs_list (Iterable[Mapping[str, Any]]): The dictionaries with the arguments for the function.
+        executor_type (type[ThreadPoolExecutor | ProcessPoolExecutor], optional): The executor to run the calls in.
+            Defaults to ThreadPoolExecutor.
+        max_workers (int, optional): Number of workers to use. Defaults to the executor default.
+        progress_tracker (int, optional): Number of tasks to complete before logging progress.
+        mode (modes, optional): Mode to use, early_error raises the first exception. Defaults to "normal".
+        chunksize (int, optional): The number of calls in each task, larger chunks cut the per task overhead
+            of a process pool. Defaults to 1.
+        max_in_flight (int | None, optional): The most tasks submitted at once. Defaults to 4 per worker.
+
+    Yields:
+        ParallelResult[R]: The outcome of each call, in the order they complete.
+    """
+    total_work = f"/{len(kwargs_list)}" if isinstance(kwargs_list, Sized) else ""
+    max_in_flight = max(max_in_flight or 4 * (max_workers or cpu_count()), 1)
+    chunks = batched(enumerate(kwargs_list), max(chunksize, 1))
+
+    executor = executor_type(max_workers=max_workers)
+    pending: dict[Future[list[tuple[R | None, Exception | None]]], tuple[tuple[int, Mapping[str, Any]], ...]] = {}
+
+    def submit_chunks() -> None:
+        for chunk in islice(chunks, max_in_flight - len(pending)):
+            pending[executor.submit(_run_chunk, func, [kwargs for _, kwargs in chunk])] = chunk
+
+    completed = 0
+    finished = False
+    try:
+        submit_chunks()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            outcomes = [outcome for future in done for outcome in _chunk_outcomes(future, pending.pop(future))]
+            # Keep the workers busy while the caller handles the results
+            submit_chunks()
+
+            for outcome in outcomes:
+                completed += 1
+                if outcome.exception is not None:
+                    # reprlib keeps the kwargs short, a whole dataset and its snapshots for example
+                    logging.error(
+                        f"{getattr(func, '__name__', repr(func))} call {outcome.index} "
+                        f"with {reprlib.repr(outcome.kwargs)} raised {outcome.exception.__class__.__name__}"
+                    )
+                    if mode == "early_error":
+                        raise outcome.exception
+                yield outcome
+
+                if progress_tracker and completed % progress_tracker == 0:
+                    logging.info(f"Progress: {completed}{total_work}")
+        finished = True
+    finally:
+        # Stopping early does not wait for the running calls, only cancels the ones that have not started
+        executor.shutdown(wait=finished, cancel_futures=True)
+
+
 def _parallelize_base(
     executor_type: type[ThreadPoolExecutor | ProcessPoolExecutor],
     func: Callable[..., R],
-    kwargs_list: Sequence[Mapping[str, Any]],
+    kwargs_list: Iterable[Mapping[str, Any]],
     max_workers: int | None,
     progress_tracker: int | None,
     mode: modes,
+    chunksize: int = 1,
 ) -> ExecutorResults:
-    total_work = len(kwargs_list)
-
-    with executor_type(max_workers=max_workers) as executor:
-        futures = [executor.submit(func, **kwarg) for kwarg in kwargs_list]
-
-    results = []
-    exceptions = []
-    for index, future in enumerate(futures, 1):
-        if exception := future.exception():
-            logging.error(f"{future} raised {exception.__class__.__name__}")
-            exceptions.append(exception)
-            if mode == "early_error":
-                executor.shutdown(wait=False)
-                raise exception
-            continue
-
-        results.append(future.result())
-
-        if progress_tracker and index % progress_tracker == 0:
-            logging.info(f"Progress: {index}/{total_work}")
+    outcomes = sorted(
+        iter_parallel(
+            func=func,
+            kwargs_list=kwargs_list,
+            executor_type=executor_type,
+            max_workers=max_workers,
+            progress_tracker=progress_tracker,
+            mode=mode,
+            chunksize=chunksize,
+        ),
+        key=lambda outcome: outcome.index,
+    )
 
+    results = [outcome.result for outcome in outcomes if outcome.exception is None]
+    exceptions = [outcome.exception for outcome in outcomes if outcome.exception is not None]
     return ExecutorResults(results, exceptions)
 
 
 def parallelize_thread(
     func: Callable[..., R],
-    kwargs_list: Sequence[Mapping[str, Any]],
+    kwargs_list: Iterable[Mapping[str, Any]],
     max_workers: int | None = None,
     progress_tracker: int | None = None,
     mode: modes = "normal",
@@ -71,7 +183,7 @@ def parallelize_thread(
 
     Args:
         func (Callable[..., R]): Function to run in threads.
-        kwargs_list (Sequence[Mapping[str, Any]]): List of dictionaries with the arguments for the function.
+        kwargs_list (Iterable[Mapping[str, Any]]): Dictionaries with the arguments for the function.
         max_workers (int, optional): Number of workers to use. Defaults to 8.
         progress_tracker (int, optional): Number of tasks to complete before logging progress.
         mode (modes, optional): Mode to use. Defaults to "normal".
@@ -91,19 +203,22 @@ def parallelize_thread(
 
 def parallelize_process(
     func: Callable[..., R],
-    kwargs_list: Sequence[Mapping[str, Any]],
+    kwargs_list: Iterable[Mapping[str, Any]],
     max_workers: int | None = None,
     progress_tracker: int | None = None,
     mode: modes = "normal",
+    chunksize: int = 1,
 ) -> ExecutorResults:
     """Generic function to run a function with multiple arguments in process.
 
     Args:
         func (Callable[..., R]): Function to run in process.
-        kwargs_list (Sequence[Mapping[str, Any]]): List of dictionaries with the arguments for the function.
+        kwargs_list (Iterable[Mapping[str, Any]]): Dictionaries with the arguments for the function.
         max_workers (int, optional): Number of workers to use. Defaults to 4.
         progress_tracker (int, optional): Number of tasks to complete before logging progress.
         mode (modes, optional): Mode to use. Defaults to "normal".
+        chunksize (int, optional): The number of calls sent to a worker at once, raise it for many small calls.
+            Defaults to 1.
 
     Returns:
         tuple[list[R], list[Exception]]: List with the results and a list with the exceptions.
@@ -118,15 +233,17 @@ def parallelize_process(
         max_workers=max_workers,
         progress_tracker=progress_tracker,
         mode=mode,
+        chunksize=chunksize,
     )
 
 
 def process_executor_unchecked(
     func: Callable[..., R],
-    kwargs_list: Sequence[Mapping[str, Any]],
+    kwargs_list: Iterable[Mapping[str, Any]],
     max_workers: int | None,
     progress_tracker: int | None,
     mode: modes = "normal",
+    chunksize: int = 1,
 ) -> ExecutorResults:
     """Generic function to run a function with multiple arguments in parallel.
 
@@ -135,10 +252,12 @@ def process_executor_unchecked(
 
     Args:
         func (Callable[..., R]): Function to run in parallel.
-        kwargs_list (Sequence[Mapping[str, Any]]): List of dictionaries with the arguments for the function.
+        kwargs_list (Iterable[Mapping[str, Any]]): Dictionaries with the arguments for the function.
         max_workers (int, optional): Number of workers to use. Defaults to 8.
         progress_tracker (int, optional): Number of tasks to complete before logging progress.
         mode (modes, optional): Mode to use. Defaults to "normal".
+        chunksize (int, optional): The number of calls sent to a worker at once, raise it for many small calls.
+            Defaults to 1.
 
     Returns:
         tuple[list[R], list[Exception]]: List with the results and a list with the exceptions.
@@ -150,4 +269,5 @@ def process_executor_unchecked(
         max_workers=max_workers,
         progress_tracker=progress_tracker,
         mode=mode,
+        chunksize=chunksize,
     )
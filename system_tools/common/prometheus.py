@@ -0,0 +1,128 @@
+"""prometheus."""
+
+from __future__ import annotations
+
+import os
+from math import isinf
+from tempfile import NamedTemporaryFile
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+    from pathlib import Path
+
+    from system_tools.common.instrumentation import CommandStats
+
+MetricType = Literal["counter", "gauge", "histogram", "untyped"]
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value."""
+    if isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, int):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Mapping[str, str]) -> str:
+    """Format sample labels."""
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class TextfileMetrics:
+    """Metrics in the Prometheus text format for the node_exporter textfile collector."""
+
+    def __init__(self) -> None:
+        """__init__."""
+        self._families: dict[str, tuple[str, MetricType, list[str]]] = {}
+
+    def add(
+        self,
+        name: str,
+        value: float,
+        help_text: str,
+        labels: Mapping[str, str] | None = None,
+        metric_type: MetricType = "gauge",
+        sample_name: str | None = None,
+    ) -> None:
+        """Add a sample.
+
+        Args:
+            name (str): The name of the metric family.
+            value (float): The value of the sample.
+            help_text (str): What the metric measures.
+            labels (Mapping[str, str] | None, optional): The labels of the sample. Defaults to None.
+            metric_type (MetricType, optional): The type of the metric family. Defaults to "gauge".
+            sample_name (str | None, optional): The name of the sample when it differs from the family,
+                for example the `_bucket` samples of a histogram. Defaults to the name of the family.
+        """
+        _, _, samples = self._families.setdefault(name, (help_text, metric_type, []))
+        samples.append(f"{sample_name or name}{_format_labels(labels or {})} {_format_value(value)}")
+
+    def add_command_stats(self, command_stats: CommandStats, prefix: str = "system_tools_command") -> None:
+        """Add the latency histogram and output size of the commands of each verb.
+
+        Args:
+            command_stats (CommandStats): The command stats.
+            prefix (str, optional): The prefix of the metric names. Defaults to "system_tools_command".
+        """
+        summary = command_stats.summary()
+        name = f"{prefix}_duration_seconds"
+        help_text = "How long the commands took."
+        for verb, stats in summary.items():
+            labels = {"verb": verb}
+            for bucket, count in command_stats.histogram(verb):
+                self.add(name, count, help_text, labels | {"le": _format_value(bucket)}, "histogram", f"{name}_bucket")
+            self.add(name, stats["total_secs"], help_text, labels, "histogram", f"{name}_sum")
+            self.add(name, stats["count"], help_text, labels, "histogram", f"{name}_count")
+
+        for verb, stats in summary.items():
+            self.add(f"{prefix}_output_bytes", stats["output_bytes"], "The size of the command output.", {"verb": verb})
+
+    def extend(self, other: TextfileMetrics) -> None:
+        """Add the samples of other.
+
+        Args:
+            other (TextfileMetrics): The metrics to add.
+        """
+        for name, (help_text, metric_type, samples) in other._families.items():  # noqa: SLF001
+            self._families.setdefault(name, (help_text, metric_type, []))[2].extend(samples)
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text format.
+
+        Returns:
+            str: The metrics.
+        """
+        lines: list[str] = []
+        for name, (help_text, metric_type, samples) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples)
+        return "".join(f"{line}\n" for line in lines)
+
+    def write(self, path: Path) -> None:
+        """Write the metrics so the collector never reads a partial file.
+
+        The metrics are written to a temporary file in the same directory, then renamed over path.
+
+        Args:
+            path (Path): The `.prom` file.
+        """
+        with NamedTemporaryFile("w", dir=path.parent, prefix=f".{path.name}.", delete=False) as temporary_file:
+            temporary_file.write(self.render())
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+
+        # NamedTemporaryFile is only readable by its owner, node_exporter usually runs as another user
+        os.chmod(temporary_file.name, 0o644)  # noqa: PTH101
+        os.replace(temporary_file.name, path)  # noqa: PTH105
@@ -0,0 +1,208 @@
+"""checks."""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from threading import Lock, Thread
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from system_tools.common.lib import utcnow
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Collection
+    from pathlib import Path
+
+    from system_tools.common import TextfileMetrics
+
+
+@dataclass(frozen=True)
+class Check:
+    """A validation check, `func` returns its errors."""
+
+    name: str
+    func: Callable[[], list[str] | None]
+    timeout_secs: float = 60.0
+
+
+@dataclass
+class CheckResult:
+    """The outcome of a check."""
+
+    name: str
+    errors: list[str] = field(default_factory=list)
+    duration: float = 0.0
+    timed_out: bool = False
+
+
+class CheckRunner:
+    """Run registered checks concurrently, each with its own timeout.
+
+    Every check runs in a daemon thread, a check that is still running when its timeout expires is reported as
+    timed out and left behind, so a hung command can not hold back the results of the other checks
+    or the exit of the process.
+    """
+
+    def __init__(self) -> None:
+        """__init__."""
+        self.checks: dict[str, Check] = {}
+
+    def register(self, name: str, func: Callable[[], list[str] | None], timeout_secs: float = 60.0) -> None:
+        """Register a check.
+
+        Args:
+            name (str): The name of the check.
+            func (Callable[[], list[str] | None]): Runs the check and returns its errors.
+            timeout_secs (float, optional): How long to wait for the check in seconds. Defaults to 60.0.
+        """
+        if name in self.checks:
+            error = f"Check {name} is already registered"
+            raise ValueError(error)
+
+        self.checks[name] = Check(name, func, timeout_secs)
+
+    def run(self, names: Collection[str] | None = None) -> list[CheckResult]:
+        """Run the checks and wait for each of them until it finishes or times out.
+
+        Args:
+            names (Collection[str] | None, optional): Only run these checks. Defaults to every check.
+
+        Returns:
+            list[CheckResult]: The result of each check, in the order they were registered.
+        """
+        checks = [check for check in self.checks.values() if names is None or check.name in names]
+        results: dict[str, CheckResult] = {}
+        lock = Lock()
+
+        start = perf_counter()
+        threads: list[tuple[Check, Thread]] = []
+        for check in checks:
+            thread = Thread(target=_run_check, args=(check, results, lock), name=f"check-{check.name}", daemon=True)
+            thread.start()
+            threads.append((check, thread))
+
+        for check, thread in threads:
+            thread.join(max(check.timeout_secs - (perf_counter() - start), 0))
+            with lock:
+                if check.name not in results:
+                    logging.error(f"{check.name} check timed out after {check.timeout_secs}s")
+                    results[check.name] = CheckResult(
+                        check.name,
+                        [f"{check.name} check timed out after {check.timeout_secs}s"],
+                        perf_counter() - start,
+                        timed_out=True,
+                    )
+
+        for result in results.values():
+            logging.info(f"{result.name} check took {result.duration:.3f}s with {len(result.errors)} errors")
+
+        return [results[check.name] for check in checks]
+
+
+def _run_check(check: Check, results: dict[str, CheckResult], lock: Lock) -> None:
+    """Run a check and store its result, unless it already timed out."""
+    start = perf_counter()
+    try:
+        errors = list(check.func() or [])
+    except Exception as error:
+        logging.exception(f"{check.name} check failed")
+        errors = [f"{check.name} check failed: {error}"]
+
+    with lock:
+        results.setdefault(check.name, CheckResult(check.name, errors, perf_counter() - start))
+
+
+def record_check_metrics(metrics: TextfileMetrics, results: list[CheckResult]) -> None:
+    """Record the duration and outcome of each check.
+
+    Args:
+        metrics (TextfileMetrics): The metrics.
+        results (list[CheckResult]): The check results.
+    """
+    for result in results:
+        labels = {"check": result.name}
+        metrics.add("validate_system_check_duration_seconds", result.duration, "How long the check took.", labels)
+        metrics.add("validate_system_check_success", int(not result.errors), "1 if the check passed.", labels)
+        metrics.add("validate_system_check_timed_out", int(result.timed_out), "1 if the check timed out.", labels)
+
+
+@dataclass
+class CheckState:
+    """The last known outcome of a check, `since` is the timestamp of its last transition."""
+
+    ok: bool
+    since: float
+    errors: list[str] = field(default_factory=list)
+
+
+class CheckStateStore:
+    """Remember whether each check passed, so only the transitions between passing and failing are alerted on.
+
+    The state is kept in memory and written to `state_file` on every transition, so a restart neither repeats
+    the alert of a check that is still failing nor misses its recovery.
+    A check seen for the first time is only alerted on when it fails.
+    """
+
+    def __init__(self, state_file: Path | None = None) -> None:
+        """__init__.
+
+        Args:
+            state_file (Path | None, optional): The JSON file the state is kept in. Defaults to memory only.
+        """
+        self.state_file = state_file
+        self.states: dict[str, CheckState] = {}
+        self._lock = Lock()
+        if state_file:
+            self.states = self._load(state_file)
+
+    @staticmethod
+    def _load(state_file: Path) -> dict[str, CheckState]:
+        """Load the state, starting over if the file is missing or corrupt."""
+        try:
+            return {name: CheckState(**state) for name, state in json.loads(state_file.read_text()).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, TypeError, ValueError, AttributeError):
+            logging.warning(f"Ignoring unreadable check state in {state_file}")
+            return {}
+
+    def save(self) -> None:
+        """Write the state, replacing the file so a crash never leaves it half written."""
+        if not self.state_file:
+            return
+
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = self.state_file.with_name(f".{self.state_file.name}.tmp")
+        temporary_file.write_text(json.dumps({name: asdict(state) for name, state in self.states.items()}))
+        temporary_file.replace(self.state_file)
+
+    def update(self, result: CheckResult) -> str | None:
+        """Record the result of a check.
+
+        Args:
+            result (CheckResult): The result.
+
+        Returns:
+            str | None: The alert if the check started failing or recovered.
+        """
+        now = utcnow().timestamp()
+        ok = not result.errors
+        with self._lock:
+            previous = self.states.get(result.name)
+            if previous is not None and previous.ok == ok:
+                previous.errors = result.errors
+                return None
+
+            self.states[result.name] = CheckState(ok, now, result.errors)
+            self.save()
+
+        if not ok:
+            return f"{result.name} check failed: {'; '.join(result.errors)}"
+        if previous is None:
+            return None
+
+        failed_for = f"{now - previous.since:.0f}s"
+        logging.info(f"{result.name} check recovered after {failed_for}")
+        return f"{result.name} check recovered after {failed_for}, it failed with: {'; '.join(previous.errors)}"
@@ -2,25 +2,42 @@
 
 from __future__ import annotations
 
+import json
 import logging
-from copy import copy
+from dataclasses import dataclass
+from pathlib import Path
 from re import search
 from time import sleep
 from typing import TYPE_CHECKING
 
-from system_tools.common import bash_wrapper
-from system_tools.zfs import Zpool
+from system_tools.common import async_run_command, bash_wrapper, run_command
+from system_tools.zfs import get_zpools
+from system_tools.zfs.iostat import mirror_latency_errors, record_iostat_metrics, sample_zpool_iostat
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Collection, Sequence
 
+    from system_tools.common import CommandResult, TextfileMetrics
+    from system_tools.zfs import Zpool, ZpoolIostatSampler
 
-def zpool_tests(pool_names: Sequence[str], zpool_capacity_threshold: int = 90) -> list[str] | None:
+ZFS_MODULE_VERSION = Path("/sys/module/zfs/version")
+
+
+def zpool_tests(
+    pool_names: Sequence[str],
+    zpool_capacity_threshold: int = 90,
+    metrics: TextfileMetrics | None = None,
+    upgrade_cache_file: Path | None = None,
+) -> list[str] | None:
     """Check the zpool health and capacity.
 
     Args:
         pool_names (Sequence[str]): A list of pool names to test.
         zpool_capacity_threshold (int, optional): The threshold for the zpool capacity. Defaults to 90.
+        metrics (TextfileMetrics | None, optional): Records the health, capacity and fragmentation of each pool.
+            Defaults to None.
+        upgrade_cache_file (Path | None, optional): Remembers a passed `zpool upgrade` check until the pools
+            or the zfs module change. Defaults to None.
 
     Returns:
         list[str] | None: A list of errors if any.
@@ -28,70 +45,404 @@ def zpool_tests(pool_names: Sequence[str], zpool_capacity_threshold: int = 90) -
     logging.info("Testing zpool")
 
     errors: list[str] = []
-    for pool_name in pool_names:
-        pool = Zpool(pool_name)
+    pools = get_zpools(pool_names, fields=("guid", "health", "capacity", "fragmentation"))
+    for pool in pools:
+        if metrics:
+            record_zpool_metrics(metrics, pool)
         if pool.health != "ONLINE":
             errors.append(f"{pool.name} is {pool.health}")
         if pool.capacity >= zpool_capacity_threshold:
             errors.append(f"{pool.name} is low on space")
 
-    upgrade_status, _ = bash_wrapper("zpool upgrade")
-    if not search(r"Every feature flags pool has all supported and requested features enabled.", upgrade_status):
-        errors.append("ZPool out of date run `sudo zpool upgrade -a`")
+    errors.extend(zpool_upgrade_tests(pools, upgrade_cache_file))
 
     return errors
 
 
+def _zfs_module_version() -> str | None:
+    """Get the version of the loaded zfs kernel module."""
+    try:
+        return ZFS_MODULE_VERSION.read_text().strip()
+    except OSError:
+        return None
+
+
+def parse_zpool_upgrade(output: str) -> set[str] | None:
+    """Get the pools `zpool upgrade` lists as lacking supported features.
+
+    Pools with feature flags are listed unindented in the POOL FEATURE table, each followed by its missing features,
+    pools with a legacy version are listed in the VER POOL table.
+
+    Args:
+        output (str): The output of zpool upgrade.
+
+    Returns:
+        set[str] | None: The names of the pools to upgrade, None if the output is not understood.
+    """
+    if search(r"Every feature flags pool has all supported and requested features enabled.", output):
+        return set()
+
+    pool_names: set[str] = set()
+    header: list[str] = []
+    in_table = seen_table = False
+    for line in output.splitlines():
+        if not line.strip():
+            in_table = False
+        elif set(line.strip()) <= {"-", " "}:
+            in_table = seen_table = True
+        elif not in_table:
+            header = line.split()
+        elif header == ["POOL", "FEATURE"] and not line[0].isspace():
+            pool_names.add(line.strip())
+        elif header == ["VER", "POOL"]:
+            pool_names.add(line.split()[-1])
+
+    return pool_names if seen_table else None
+
+
+def zpool_upgrade_tests(pools: Sequence[Zpool], upgrade_cache_file: Path | None = None) -> list[str]:
+    """Check every pool has all the supported features enabled.
+
+    `zpool upgrade` reports on every imported pool, only the given pools are checked.
+    The features a pool lacks only change when pools are created, imported or upgraded, or the zfs module is updated,
+    so a passed check is cached keyed on the pool guids and the zfs module version.
+
+    Args:
+        pools (Sequence[Zpool]): The pools, loaded with guid.
+        upgrade_cache_file (Path | None, optional): The JSON file of the passed check. Defaults to None.
+
+    Returns:
+        list[str]: A list of errors if any.
+    """
+    zfs_version = _zfs_module_version()
+    cache_key = {"guids": sorted(str(pool.guid) for pool in pools), "zfs_version": zfs_version}
+    if upgrade_cache_file and zfs_version:
+        try:
+            if json.loads(upgrade_cache_file.read_text()) == cache_key:
+                logging.debug(f"zpool upgrade check cached in {upgrade_cache_file}")
+                return []
+        except (OSError, ValueError):
+            logging.debug(f"No zpool upgrade check cached in {upgrade_cache_file}")
+
+    upgrade_status, _ = bash_wrapper("zpool upgrade")
+    if (pools_to_upgrade := parse_zpool_upgrade(upgrade_status)) is None:
+        return ["ZPool out of date run `sudo zpool upgrade -a`"]
+
+    if errors := [
+        f"{pool.name} is out of date run `sudo zpool upgrade {pool.name}`"
+        for pool in pools
+        if pool.name in pools_to_upgrade
+    ]:
+        return errors
+
+    if upgrade_cache_file and zfs_version:
+        upgrade_cache_file.parent.mkdir(parents=True, exist_ok=True)
+        upgrade_cache_file.write_text(json.dumps(cache_key))
+
+    return []
+
+
+def zpool_iostat_tests(
+    pool_names: Sequence[str],
+    interval_secs: int = 5,
+    max_latency_ratio: float = 5.0,
+    metrics: TextfileMetrics | None = None,
+    sampler: ZpoolIostatSampler | None = None,
+) -> list[str]:
+    """Check no disk is much slower than the other disks of its mirror.
+
+    Args:
+        pool_names (Sequence[str]): A list of pool names to test.
+        interval_secs (int, optional): How long to measure the I/O for in seconds. Defaults to 5.
+        max_latency_ratio (float, optional): How many times slower than its mirror partners a disk may be.
+            Defaults to 5.0.
+        metrics (TextfileMetrics | None, optional): Records the operations, bandwidth and latency of each vdev.
+            Defaults to None.
+        sampler (ZpoolIostatSampler | None, optional): Check the last interval of this running zpool iostat
+            instead of measuring the pools. It is restarted if it stopped. Defaults to None.
+
+    Returns:
+        list[str]: A list of errors if any.
+    """
+    if sampler is None:
+        samples = sample_zpool_iostat(pool_names, interval_secs)
+    elif not sampler.running:
+        logging.warning("zpool iostat sampler is not running, restarting it")
+        sampler.start()
+        return ["zpool iostat sampler was not running, restarted it"]
+    else:
+        samples = sampler.latest
+
+    if metrics:
+        record_iostat_metrics(metrics, samples)
+    return mirror_latency_errors(samples, max_latency_ratio)
+
+
+def record_zpool_metrics(metrics: TextfileMetrics, pool: Zpool) -> None:
+    """Record the health, capacity and fragmentation of a pool.
+
+    Args:
+        metrics (TextfileMetrics): The metrics.
+        pool (Zpool): The pool, loaded with health, capacity and fragmentation.
+    """
+    labels = {"pool": pool.name}
+    metrics.add("zpool_capacity_percent", pool.capacity, "How full the pool is.", labels)
+    metrics.add("zpool_fragmentation_percent", pool.fragmentation, "The free space fragmentation of the pool.", labels)
+    metrics.add("zpool_health", 1, "The health of the pool.", labels | {"health": pool.health})
+
+
+SERVICE_PROPERTIES = ("Id", "LoadState", "ActiveState", "SubState", "NRestarts")
+
+
+@dataclass(frozen=True)
+class ServiceState:
+    """The state of a systemd service from `systemctl show`."""
+
+    name: str
+    load_state: str
+    active_state: str
+    sub_state: str
+    restarts: int
+
+    def __str__(self) -> str:
+        """The state for error messages, for example `failed (failed) after 3 restarts`."""
+        state = f"{self.active_state} ({self.sub_state})"
+        if self.load_state not in ("", "loaded"):
+            state = f"{state} {self.load_state}"
+        if self.restarts:
+            state = f"{state} after {self.restarts} restarts"
+        return state
+
+
+def _systemctl_show_command(service_names: Sequence[str]) -> str:
+    return f"systemctl show -p {','.join(SERVICE_PROPERTIES)} {' '.join(service_names)}"
+
+
+def parse_service_states(output: str, service_names: Sequence[str]) -> dict[str, ServiceState]:
+    """Parse the output of `systemctl show` for several services.
+
+    systemctl prints a block of properties for each unit, in the order they were given, separated by blank lines.
+
+    Args:
+        output (str): The output of systemctl show.
+        service_names (Sequence[str]): The services systemctl show was called with.
+
+    Returns:
+        dict[str, ServiceState]: The state of each service.
+    """
+    blocks = [block for block in output.strip().split("\n\n") if block.strip()]
+    if len(blocks) != len(service_names):
+        error = f"systemctl show returned {len(blocks)} units for {len(service_names)} services: {output.strip()}"
+        raise RuntimeError(error)
+
+    service_states: dict[str, ServiceState] = {}
+    for service_name, block in zip(service_names, blocks, strict=True):
+        properties = dict(line.partition("=")[::2] for line in block.splitlines())
+        if "ActiveState" not in properties:
+            error = f"systemctl show returned no state for {service_name}: {block}"
+            raise RuntimeError(error)
+
+        restarts = properties.get("NRestarts", "")
+        service_states[service_name] = ServiceState(
+            name=service_name,
+            load_state=properties.get("LoadState", ""),
+            active_state=properties["ActiveState"],
+            sub_state=properties.get("SubState", ""),
+            restarts=int(restarts) if restarts.isdigit() else 0,
+        )
+    return service_states
+
+
+def get_service_states(service_names: Sequence[str]) -> dict[str, ServiceState]:
+    """Get the state of several services with a single systemctl call.
+
+    Args:
+        service_names (Sequence[str]): The names of the services.
+
+    Returns:
+        dict[str, ServiceState]: The state of each service.
+    """
+    if not service_names:
+        return {}
+
+    return _service_states(run_command(_systemctl_show_command(service_names)), service_names)
+
+
+async def async_get_service_states(service_names: Sequence[str]) -> dict[str, ServiceState]:
+    """Get the state of several services with a single systemctl call without blocking the event loop.
+
+    Args:
+        service_names (Sequence[str]): The names of the services.
+
+    Returns:
+        dict[str, ServiceState]: The state of each service.
+    """
+    if not service_names:
+        return {}
+
+    return _service_states(await async_run_command(_systemctl_show_command(service_names)), service_names)
+
+
+def _service_states(result: CommandResult, service_names: Sequence[str]) -> dict[str, ServiceState]:
+    """Parse the stdout of systemctl show, its warnings on stderr only fail the check if stdout is unusable."""
+    if result.stderr:
+        logging.warning(f"{result.command} stderr={result.stderr.strip()!r}")
+    return parse_service_states(result.stdout, service_names)
+
+
+def record_service_metric(
+    metrics: TextfileMetrics, service_state: ServiceState, valid_statuses: Collection[str]
+) -> None:
+    """Record the state and restart count of a service.
+
+    Args:
+        metrics (TextfileMetrics): The metrics.
+        service_state (ServiceState): The last state of the service.
+        valid_statuses (Collection[str]): The active states of a healthy service.
+    """
+    labels = {"service": service_state.name}
+    metrics.add(
+        "systemd_service_up",
+        int(service_state.active_state in valid_statuses),
+        "1 if the service is in a valid state.",
+        labels | {"state": service_state.active_state, "sub_state": service_state.sub_state},
+    )
+    metrics.add(
+        "systemd_service_restarts", service_state.restarts, "How many times systemd restarted the service.", labels
+    )
+
+
+class _ServiceCheck:
+    """The retry state shared by systemd_tests and async_systemd_tests."""
+
+    def __init__(
+        self,
+        service_names: Sequence[str],
+        max_retries: int,
+        retryable_statuses: Sequence[str] | None,
+        valid_statuses: Sequence[str] | None,
+    ) -> None:
+        self.max_retries = max(max_retries, 1)
+        # Older configurations pass the `systemctl is-active` output, with its newline
+        self.retryable_statuses = {status.strip() for status in retryable_statuses or ("inactive", "activating")}
+        self.valid_statuses = {status.strip() for status in valid_statuses or ("active",)}
+        self.pending = sorted(set(service_names))
+        self.service_states: dict[str, ServiceState] = {}
+        self.errors: list[str] = []
+
+    def update(self, retry: int, service_states: dict[str, ServiceState]) -> None:
+        """Keep the services that are still settling pending and record the errors of the ones that failed."""
+        self.service_states.update(service_states)
+        last_try = retry >= self.max_retries - 1
+
+        pending: list[str] = []
+        for service_name in self.pending:
+            service_state = service_states[service_name]
+            if service_state.active_state in self.valid_statuses:
+                continue
+            if service_state.active_state in self.retryable_statuses and not last_try:
+                pending.append(service_name)
+                continue
+            self.errors.append(f"{service_name} is {service_state}")
+        self.pending = pending
+
+    def fail(self, error: RuntimeError) -> None:
+        """Record an error for every pending service when their state can not be read."""
+        logging.error(f"Failed to get the state of {self.pending}: {error}")
+        self.errors.extend(f"{service_name} is unknown" for service_name in self.pending)
+        self.pending = []
+
+    def record_metrics(self, metrics: TextfileMetrics | None) -> None:
+        """Record the last state of each service."""
+        if metrics:
+            for service_state in self.service_states.values():
+                record_service_metric(metrics, service_state, self.valid_statuses)
+
+
 def systemd_tests(
     service_names: Sequence[str],
     max_retries: int = 30,
     retry_delay_secs: int = 1,
     retryable_statuses: Sequence[str] | None = None,
     valid_statuses: Sequence[str] | None = None,
+    metrics: TextfileMetrics | None = None,
 ) -> list[str] | None:
     """Tests a systemd services.
 
+    Every retry reads the state of all the services that are still settling with a single `systemctl show`,
+    and the test returns as soon as no service is left settling.
+
     Args:
         service_names (Sequence[str]): A list of service names to test.
         max_retries (int, optional): The maximum number of retries. Defaults to 30.
             minimum value is 1.
         retry_delay_secs (int, optional): The delay between retries in seconds. Defaults to 1.
             minimum value is 1.
-        retryable_statuses (Sequence[str] | None, optional): A list of retryable statuses. Defaults to None.
-        valid_statuses (Sequence[str] | None, optional): A list of valid statuses. Defaults to None.
+        retryable_statuses (Sequence[str] | None, optional): The active states to retry. Defaults to None.
+        valid_statuses (Sequence[str] | None, optional): The active states of a healthy service. Defaults to None.
+        metrics (TextfileMetrics | None, optional): Records the last state of each service. Defaults to None.
 
     Returns:
         list[str] | None: A list of errors if any.
     """
     logging.info("Testing systemd service")
 
-    max_retries = max(max_retries, 1)
-    retry_delay_secs = max(retry_delay_secs, 1)
-    last_try = max_retries - 1
+    check = _ServiceCheck(service_names, max_retries, retryable_statuses, valid_statuses)
+    for retry in range(check.max_retries):
+        if not check.pending:
+            break
+        if retry:
+            sleep(max(retry_delay_secs, 1))
 
-    if retryable_statuses is None:
-        retryable_statuses = ("inactive\n", "activating\n")
+        logging.info(f"Testing systemd service in {retry + 1} of {check.max_retries}")
+        try:
+            check.update(retry, get_service_states(check.pending))
+        except RuntimeError as error:
+            check.fail(error)
 
-    if valid_statuses is None:
-        valid_statuses = ("active\n",)
+    check.record_metrics(metrics)
+    return check.errors
 
-    service_names_set = set(service_names)
 
-    errors: set[str] = set()
-    for retry in range(max_retries):
-        if not service_names_set:
+async def async_systemd_tests(
+    service_names: Sequence[str],
+    max_retries: int = 30,
+    retry_delay_secs: int = 1,
+    retryable_statuses: Sequence[str] | None = None,
+    valid_statuses: Sequence[str] | None = None,
+    metrics: TextfileMetrics | None = None,
+) -> list[str] | None:
+    """Tests systemd services without blocking the event loop.
+
+    Args:
+        service_names (Sequence[str]): A list of service names to test.
+        max_retries (int, optional): The maximum number of retries. Defaults to 30.
+            minimum value is 1.
+        retry_delay_secs (int, optional): The delay between retries in seconds. Defaults to 1.
+            minimum value is 1.
+        retryable_statuses (Sequence[str] | None, optional): The active states to retry. Defaults to None.
+        valid_statuses (Sequence[str] | None, optional): The active states of a healthy service. Defaults to None.
+        metrics (TextfileMetrics | None, optional): Records the last state of each service. Defaults to None.
+
+    Returns:
+        list[str] | None: A list of errors if any.
+    """
+    import asyncio
+
+    logging.info("Testing systemd service")
+
+    check = _ServiceCheck(service_names, max_retries, retryable_statuses, valid_statuses)
+    for retry in range(check.max_retries):
+        if not check.pending:
             break
-        logging.info(f"Testing systemd service in {retry + 1} of {max_retries}")
-        service_names_to_test = copy(service_names_set)
-        for service_name in service_names_to_test:
-            service_status, _ = bash_wrapper(f"systemctl is-active {service_name}")
-            if service_status in valid_statuses:
-                service_names_set.remove(service_name)
-                continue
-            if service_status in retryable_statuses and retry < last_try:
-                continue
-            errors.add(f"{service_name} is {service_status.strip()}")
+        if retry:
+            await asyncio.sleep(max(retry_delay_secs, 1))
 
-        sleep(retry_delay_secs)
+        logging.info(f"Testing systemd service in {retry + 1} of {check.max_retries}")
+        try:
+            check.update(retry, await async_get_service_states(check.pending))
+        except RuntimeError as error:
+            check.fail(error)
 
-    return list(errors)
+    check.record_metrics(metrics)
+    return check.errors
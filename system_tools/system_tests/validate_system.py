@@ -3,18 +3,42 @@
 import logging
 import sys
 import tomllib
+from collections.abc import Callable
+from datetime import UTC
+from functools import partial
 from os import environ
 from pathlib import Path
+from signal import SIGINT, SIGTERM, Signals, signal
 from socket import gethostname
+from threading import Lock
+from time import perf_counter
+from types import FrameType
+from typing import Any
 
-import typer
+from system_tools.common import (
+    CommandStats,
+    TextfileMetrics,
+    add_command_hook,
+    configure_logger,
+    remove_command_hook,
+    run_cli,
+)
+from system_tools.common.lib import set_default_timeout, signal_alert, utcnow
+from system_tools.system_tests.checks import CheckResult, CheckRunner, CheckStateStore, record_check_metrics
+from system_tools.system_tests.components import systemd_tests, zpool_iostat_tests, zpool_tests
+from system_tools.zfs import ZpoolIostatSampler
 
-from system_tools.common import configure_logger
-from system_tools.common.lib import signal_alert
-from system_tools.system_tests.components import systemd_tests, zpool_tests
+ZPOOL_CHECK_TIMEOUT_SECS = 120.0
+# systemd_tests retries settling services for up to 30 seconds
+SYSTEMD_CHECK_TIMEOUT_SECS = 90.0
+# zpool_iostat_tests measures the pools for 5 seconds
+ZPOOL_IOSTAT_CHECK_TIMEOUT_SECS = 60.0
+# A check that times out leaves its thread behind, the command timeout makes sure that thread ends
+DAEMON_COMMAND_TIMEOUT_SECS = 60.0
+IOSTAT_SAMPLER_INTERVAL_SECS = 5
 
 
-def load_config_data(config_file: Path) -> dict[str, list[str]]:
+def load_config_data(config_file: Path) -> dict[str, Any]:
     """Load a TOML configuration file.
 
     Args:
@@ -26,26 +50,105 @@ def load_config_data(config_file: Path) -> dict[str, list[str]]:
     return tomllib.loads(config_file.read_text())
 
 
-def main(config_file: Path) -> None:
-    """Main."""
+def get_check_runner(
+    config_data: dict[str, list[str]],
+    metrics_by_check: dict[str, TextfileMetrics],
+    upgrade_cache_file: Path | None = None,
+    iostat_sampler: ZpoolIostatSampler | None = None,
+) -> CheckRunner:
+    """Register the checks the configuration asks for.
+
+    Every check records into its own metrics, so a check that times out and keeps running
+    can not change the metrics of the others while they are written.
+
+    Args:
+        config_data (dict[str, list[str]]): The configuration data.
+        metrics_by_check (dict[str, TextfileMetrics]): Filled with the metrics of each check.
+        upgrade_cache_file (Path | None, optional): Caches a passed `zpool upgrade` check. Defaults to None.
+        iostat_sampler (ZpoolIostatSampler | None, optional): The zpool iostat check reads the last interval
+            of this sampler instead of running zpool iostat. Defaults to None.
+
+    Returns:
+        CheckRunner: The check runner.
+    """
+    check_runner = CheckRunner()
+
+    def register(name: str, func: Callable[..., list[str] | None], timeout_secs: float) -> None:
+        metrics_by_check[name] = TextfileMetrics()
+        check_runner.register(name, partial(func, metrics=metrics_by_check[name]), timeout_secs=timeout_secs)
+
+    if config_data.get("zpools"):
+        register(
+            "zpool",
+            partial(zpool_tests, config_data["zpools"], upgrade_cache_file=upgrade_cache_file),
+            ZPOOL_CHECK_TIMEOUT_SECS,
+        )
+    if config_data.get("iostat_zpools"):
+        register(
+            "zpool_iostat",
+            partial(zpool_iostat_tests, config_data["iostat_zpools"], sampler=iostat_sampler),
+            ZPOOL_IOSTAT_CHECK_TIMEOUT_SECS,
+        )
+    if config_data.get("services"):
+        register("systemd", partial(systemd_tests, config_data["services"]), SYSTEMD_CHECK_TIMEOUT_SECS)
+    return check_runner
+
+
+def main(
+    config_file: Path,
+    stats_file: Path | None = None,
+    textfile: Path | None = None,
+    upgrade_cache_file: Path | None = None,
+) -> None:
+    """Main.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+        stats_file (Path | None, optional): Write the latency and output size of the commands run to this JSON file.
+            Defaults to None.
+        textfile (Path | None, optional): Write the pool, service and run metrics to this
+            node_exporter textfile collector `.prom` file. Defaults to None.
+        upgrade_cache_file (Path | None, optional): Remember a passed `zpool upgrade` check in this JSON file
+            until the pools or the zfs module change. Defaults to None.
+    """
     configure_logger(level=environ.get("LOG_LEVEL", "INFO"))
 
     server_name = gethostname()
     logging.info(f"Starting {server_name} validation")
 
+    start = perf_counter()
+    metrics = TextfileMetrics()
+    command_stats = CommandStats()
+    add_command_hook(command_stats.record)
+
     config_data = load_config_data(config_file)
 
     errors: list[str] = []
     try:
-        if config_data.get("zpools") and (zpool_errors := zpool_tests(config_data["zpools"])):
-            errors.extend(zpool_errors)
-
-        if config_data.get("services") and (systemd_errors := systemd_tests(config_data["services"])):
-            errors.extend(systemd_errors)
+        # The checks run concurrently, so the run takes as long as the slowest check
+        metrics_by_check: dict[str, TextfileMetrics] = {}
+        check_results = get_check_runner(config_data, metrics_by_check, upgrade_cache_file).run()
+        for check_result in check_results:
+            errors.extend(check_result.errors)
+            # A check that timed out may still be recording
+            if not check_result.timed_out:
+                metrics.extend(metrics_by_check[check_result.name])
+        record_check_metrics(metrics, check_results)
 
     except Exception as error:
         logging.exception(f"{server_name} validation failed")
         errors.append(f"{server_name} validation failed: {error}")
+    finally:
+        remove_command_hook(command_stats.record)
+        command_stats.report(stats_file)
+
+    if textfile:
+        metrics.add("validate_system_last_run_timestamp_seconds", utcnow().timestamp(), "When validation last ran.")
+        metrics.add("validate_system_run_duration_seconds", perf_counter() - start, "How long the last run took.")
+        metrics.add("validate_system_success", int(not errors), "1 if the last validation passed, 0 if it failed.")
+        metrics.add("validate_system_errors", len(errors), "The errors found by the last validation.")
+        metrics.add_command_stats(command_stats)
+        metrics.write(textfile)
 
     if errors:
         logging.error(f"{server_name} validation failed: \n{'\n'.join(errors)}")
@@ -56,9 +159,155 @@ def main(config_file: Path) -> None:
     logging.info(f"{server_name} validation passed")
 
 
+class ValidationDaemon:
+    """Run each check on its own schedule and alert only when a check starts failing or recovers."""
+
+    def __init__(
+        self,
+        config_data: dict[str, Any],
+        state_store: CheckStateStore,
+        textfile: Path | None = None,
+        upgrade_cache_file: Path | None = None,
+        iostat_sampler: ZpoolIostatSampler | None = None,
+    ) -> None:
+        """__init__.
+
+        Args:
+            config_data (dict[str, Any]): The configuration data.
+            state_store (CheckStateStore): The last known outcome of each check.
+            textfile (Path | None, optional): Write the metrics of the last run of each check to this
+                node_exporter textfile collector `.prom` file. Defaults to None.
+            upgrade_cache_file (Path | None, optional): Caches a passed `zpool upgrade` check. Defaults to None.
+            iostat_sampler (ZpoolIostatSampler | None, optional): The running zpool iostat the zpool iostat check
+                reads. Defaults to None.
+        """
+        self.config_data = config_data
+        self.state_store = state_store
+        self.textfile = textfile
+        self.upgrade_cache_file = upgrade_cache_file
+        self.iostat_sampler = iostat_sampler
+        self.server_name = gethostname()
+
+        self._metrics_by_check: dict[str, TextfileMetrics] = {}
+        self._metrics_lock = Lock()
+
+    @property
+    def check_names(self) -> list[str]:
+        """The checks the configuration asks for."""
+        return list(get_check_runner(self.config_data, {}).checks)
+
+    def run_check(self, name: str) -> CheckResult:
+        """Run a check, alert if it changed state and write the metrics.
+
+        Args:
+            name (str): The name of the check.
+
+        Returns:
+            CheckResult: The result of the check.
+        """
+        metrics_by_check: dict[str, TextfileMetrics] = {}
+        (result,) = get_check_runner(
+            self.config_data, metrics_by_check, self.upgrade_cache_file, self.iostat_sampler
+        ).run([name])
+        # A check that timed out may still be recording
+        metrics = TextfileMetrics() if result.timed_out else metrics_by_check[name]
+        record_check_metrics(metrics, [result])
+        metrics.add(
+            "validate_system_check_last_run_timestamp_seconds",
+            utcnow().timestamp(),
+            "When the check last ran.",
+            {"check": name},
+        )
+
+        if alert := self.state_store.update(result):
+            logging.warning(f"{self.server_name} {alert}")
+            signal_alert(f"{self.server_name} {alert}")
+
+        if self.textfile:
+            with self._metrics_lock:
+                self._metrics_by_check[name] = metrics
+                all_metrics = TextfileMetrics()
+                for check_metrics in self._metrics_by_check.values():
+                    all_metrics.extend(check_metrics)
+                all_metrics.write(self.textfile)
+
+        return result
+
+
+def daemon(
+    config_file: Path,
+    interval_secs: int = 15,
+    state_file: Path | None = None,
+    textfile: Path | None = None,
+    upgrade_cache_file: Path | None = None,
+) -> None:
+    """Stay resident and run each check on its own schedule, alerting only when a check fails or recovers.
+
+    Every check runs every interval_secs unless the `check_intervals` table of the configuration sets its own,
+    `check_intervals = {zpool = 60}` for example. A slow check never delays the others.
+    With `iostat_zpools` one zpool iostat keeps running and the zpool iostat check reads its last interval.
+    SIGTERM and SIGINT stop the daemon.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+        interval_secs (int, optional): How often to run each check in seconds. Defaults to 15.
+        state_file (Path | None, optional): Keep the last known outcome of each check in this JSON file, so a restart
+            neither repeats nor misses an alert. Defaults to memory only.
+        textfile (Path | None, optional): Write the check metrics to this node_exporter textfile collector
+            `.prom` file. Defaults to None.
+        upgrade_cache_file (Path | None, optional): Remember a passed `zpool upgrade` check in this JSON file
+            until the pools or the zfs module change. Defaults to None.
+    """
+    from apscheduler.schedulers.blocking import BlockingScheduler  # type: ignore[import-untyped]
+    from apscheduler.triggers.interval import IntervalTrigger  # type: ignore[import-untyped]
+
+    configure_logger(level=environ.get("LOG_LEVEL", "INFO"))
+    if not environ.get("SYSTEM_TOOLS_COMMAND_TIMEOUT"):
+        set_default_timeout(DAEMON_COMMAND_TIMEOUT_SECS)
+
+    config_data = load_config_data(config_file)
+    check_intervals: dict[str, int] = config_data.get("check_intervals", {})
+    # zpool iostat keeps running, so the iostat check reads the last interval instead of measuring for seconds
+    iostat_sampler = None
+    if config_data.get("iostat_zpools"):
+        iostat_sampler = ZpoolIostatSampler(config_data["iostat_zpools"], IOSTAT_SAMPLER_INTERVAL_SECS)
+        iostat_sampler.start()
+    validation_daemon = ValidationDaemon(
+        config_data, CheckStateStore(state_file), textfile, upgrade_cache_file, iostat_sampler
+    )
+    scheduler = BlockingScheduler(timezone=UTC)
+
+    def stop(signal_number: int, _: FrameType | None) -> None:
+        logging.info(f"Received {Signals(signal_number).name}, stopping")
+        scheduler.shutdown(wait=False)
+
+    signal(SIGTERM, stop)
+    signal(SIGINT, stop)
+
+    for name in validation_daemon.check_names:
+        check_interval = check_intervals.get(name, interval_secs)
+        scheduler.add_job(
+            validation_daemon.run_check,
+            IntervalTrigger(seconds=check_interval, timezone=UTC),
+            args=(name,),
+            id=name,
+            max_instances=1,
+            coalesce=True,
+            next_run_time=utcnow(),
+        )
+        logging.info(f"Running the {name} check every {check_interval}s")
+
+    logging.info(f"Starting {validation_daemon.server_name} validation daemon")
+    try:
+        scheduler.start()
+    finally:
+        if iostat_sampler:
+            iostat_sampler.stop()
+
+
 def cli() -> None:
-    """CLI."""
-    typer.run(main)
+    """CLI, `validate_system daemon ...` runs the daemon."""
+    run_cli(main, daemon)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,312 @@
+"""retention."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from enum import StrEnum
+from functools import lru_cache
+from re import compile as re_compile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Iterable, Mapping, Sequence
+
+    from system_tools.zfs import Snapshot
+
+AUTO_SNAPSHOT = re_compile(r"auto_(\d{12})")
+CUSTOM_TIER = re_compile(r"(\d+)_(min|hour|day)")
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+def _is_midnight(time_stamp: datetime) -> bool:
+    return time_stamp.hour == 0 and time_stamp.minute == 0
+
+
+NAMED_TIERS: dict[str, tuple[int, Callable[[datetime], bool], Callable[[datetime], Hashable]]] = {
+    "hourly": (
+        HOUR,
+        lambda time_stamp: time_stamp.minute == 0,
+        lambda time_stamp: (time_stamp.toordinal(), time_stamp.hour),
+    ),
+    "daily": (DAY, _is_midnight, lambda time_stamp: time_stamp.toordinal()),
+    "weekly": (
+        7 * DAY,
+        lambda time_stamp: _is_midnight(time_stamp) and time_stamp.weekday() == 0,
+        lambda time_stamp: time_stamp.isocalendar()[:2],
+    ),
+    "monthly": (
+        31 * DAY,
+        lambda time_stamp: _is_midnight(time_stamp) and time_stamp.day == 1,
+        lambda time_stamp: (time_stamp.year, time_stamp.month),
+    ),
+    "yearly": (
+        366 * DAY,
+        lambda time_stamp: _is_midnight(time_stamp) and time_stamp.day == 1 and time_stamp.month == 1,
+        lambda time_stamp: time_stamp.year,
+    ),
+}
+
+
+@dataclass(frozen=True)
+class RetentionTier:
+    """A retention tier and how many of its snapshots to keep.
+
+    `matches` tells if a snapshot name was taken on the tier boundary,
+    `period_of` gives the period of the tier a creation time falls in.
+    """
+
+    name: str
+    period: int
+    matches: Callable[[datetime], bool]
+    period_of: Callable[[datetime], Hashable]
+    keep: int
+
+
+def get_tier(name: str, keep: int) -> RetentionTier:
+    """Get a retention tier by name.
+
+    Named tiers are hourly, daily, weekly (Monday), monthly and yearly.
+    Custom tiers are `<N>_min`, `<N>_hour` or `<N>_day`, for example 15_min or 6_hour.
+
+    Args:
+        name (str): The name of the tier.
+        keep (int): The number of snapshots to keep.
+
+    Returns:
+        RetentionTier: The retention tier.
+    """
+    if name in NAMED_TIERS:
+        period, matches, period_of = NAMED_TIERS[name]
+        return RetentionTier(name, period, matches, period_of, keep)
+
+    if not (custom_tier := CUSTOM_TIER.fullmatch(name)):
+        error = f"Unknown retention tier {name=}"
+        raise ValueError(error)
+
+    count = int(custom_tier.group(1))
+    unit = custom_tier.group(2)
+    if unit == "min":
+        return RetentionTier(
+            name,
+            count * MINUTE,
+            lambda time_stamp: (time_stamp.hour * 60 + time_stamp.minute) % count == 0,
+            lambda time_stamp: int(time_stamp.timestamp()) // (count * MINUTE),
+            keep,
+        )
+    if unit == "hour":
+        return RetentionTier(
+            name,
+            count * HOUR,
+            lambda time_stamp: time_stamp.minute == 0 and time_stamp.hour % count == 0,
+            lambda time_stamp: int(time_stamp.timestamp()) // (count * HOUR),
+            keep,
+        )
+    return RetentionTier(
+        name,
+        count * DAY,
+        lambda time_stamp: _is_midnight(time_stamp) and time_stamp.toordinal() % count == 0,
+        lambda time_stamp: time_stamp.toordinal() // count,
+        keep,
+    )
+
+
+def get_tiers(count_lookup: Mapping[str, int]) -> tuple[RetentionTier, ...]:
+    """Get the retention tiers of a count lookup, longest period first.
+
+    Args:
+        count_lookup (Mapping[str, int]): The number of snapshots to keep for each tier.
+
+    Returns:
+        tuple[RetentionTier, ...]: The retention tiers.
+    """
+    tiers = (get_tier(name, keep) for name, keep in count_lookup.items())
+    return tuple(sorted(tiers, key=lambda tier: tier.period, reverse=True))
+
+
+def get_unmatched_times(count_lookup: Mapping[str, int], interval_minutes: int) -> list[str]:
+    """Get the times of day of snapshots taken every interval_minutes that match no retention tier.
+
+    Name retention never deletes those snapshots.
+
+    Args:
+        count_lookup (Mapping[str, int]): The number of snapshots to keep for each tier.
+        interval_minutes (int): How often snapshots are taken, it must divide an hour.
+
+    Returns:
+        list[str]: The unmatched times as HH:MM.
+    """
+    tiers = get_tiers(count_lookup)
+    midnight = datetime(2024, 1, 1, tzinfo=UTC)
+    time_stamps = (midnight + timedelta(minutes=minutes) for minutes in range(0, DAY // MINUTE, interval_minutes))
+    return [f"{time_stamp:%H:%M}" for time_stamp in time_stamps if not any(tier.matches(time_stamp) for tier in tiers)]
+
+
+@lru_cache(maxsize=1 << 18)
+def parse_snapshot_name(snapshot_name: str) -> datetime | None:
+    """Get the time stamp of an `auto_YYYYmmddHHMM` snapshot name.
+
+    Args:
+        snapshot_name (str): The snapshot name.
+
+    Returns:
+        datetime | None: The time stamp, None if the name is not an auto snapshot.
+    """
+    if not (auto_snapshot := AUTO_SNAPSHOT.search(snapshot_name)):
+        return None
+
+    try:
+        return datetime.strptime(auto_snapshot.group(1), "%Y%m%d%H%M").replace(tzinfo=UTC)
+    except ValueError:
+        return None
+
+
+def classify_snapshots(snapshot_names: Iterable[str], tiers: Iterable[RetentionTier]) -> dict[str, list[str]]:
+    """Sort auto snapshots into retention tiers.
+
+    Each snapshot goes to the longest tier whose boundary it was taken on.
+    Snapshots that match no tier are left out.
+
+    Args:
+        snapshot_names (Iterable[str]): The snapshot names.
+        tiers (Iterable[RetentionTier]): The retention tiers, longest period first.
+
+    Returns:
+        dict[str, list[str]]: The snapshot names of each tier, oldest first.
+    """
+    tiers = tuple(tiers)
+    buckets: dict[str, list[str]] = {tier.name: [] for tier in tiers}
+    for snapshot_name in sorted(snapshot_names):
+        if (time_stamp := parse_snapshot_name(snapshot_name)) is None:
+            continue
+
+        for tier in tiers:
+            if tier.matches(time_stamp):
+                buckets[tier.name].append(snapshot_name)
+                break
+
+    return buckets
+
+
+def get_expired_snapshots(snapshot_names: Iterable[str], count_lookup: Mapping[str, int]) -> list[str]:
+    """Get the auto snapshots that are beyond the retention of their tier.
+
+    Args:
+        snapshot_names (Iterable[str]): The snapshot names.
+        count_lookup (Mapping[str, int]): The number of snapshots to keep for each tier.
+
+    Returns:
+        list[str]: The expired snapshot names.
+    """
+    tiers = get_tiers(count_lookup)
+    buckets = classify_snapshots(snapshot_names, tiers)
+
+    expired: list[str] = []
+    for tier in tiers:
+        bucket = buckets[tier.name]
+        logging.debug(f"{tier.name=} {bucket=}")
+        expired.extend(bucket[: -tier.keep] if tier.keep > 0 else bucket)
+
+    return expired
+
+
+class RetentionEngine(StrEnum):
+    """How snapshots are matched to retention tiers."""
+
+    NAME = "name"
+    CREATION = "creation"
+
+
+@dataclass
+class RetentionPlan:
+    """The snapshots of a dataset to keep and to delete, oldest first."""
+
+    keep: list[str]
+    delete: list[str]
+
+
+def name_retention_plan(snapshots: Sequence[Snapshot], count_lookup: Mapping[str, int]) -> RetentionPlan:
+    """Plan retention from `auto_YYYYmmddHHMM` snapshot names, other snapshots are kept.
+
+    Args:
+        snapshots (Sequence[Snapshot]): The snapshots of a dataset.
+        count_lookup (Mapping[str, int]): The number of snapshots to keep for each tier.
+
+    Returns:
+        RetentionPlan: The retention plan.
+    """
+    snapshot_names = sorted(snapshot.name for snapshot in snapshots)
+    expired = get_expired_snapshots(snapshot_names, count_lookup)
+    expired_names = set(expired)
+
+    return RetentionPlan(
+        keep=[snapshot_name for snapshot_name in snapshot_names if snapshot_name not in expired_names],
+        delete=expired,
+    )
+
+
+def creation_retention_plan(snapshots: Sequence[Snapshot], count_lookup: Mapping[str, int]) -> RetentionPlan:
+    """Plan grandfather-father-son retention from snapshot creation times, whatever the snapshots are named.
+
+    Each tier keeps the newest snapshot of each of its last `keep` periods that have a snapshot,
+    for example hourly = 12 keeps the newest snapshot of each of the last 12 hours with snapshots.
+    A snapshot kept by any tier is kept.
+
+    Args:
+        snapshots (Sequence[Snapshot]): The snapshots of a dataset, loaded with the creation property.
+        count_lookup (Mapping[str, int]): The number of snapshots to keep for each tier.
+
+    Returns:
+        RetentionPlan: The retention plan.
+    """
+    newest_first = sorted(snapshots, key=lambda snapshot: (snapshot.creation, snapshot.createtxg), reverse=True)
+
+    keep: set[str] = set()
+    for tier in get_tiers(count_lookup):
+        if tier.keep <= 0:
+            continue
+
+        periods: set[Hashable] = set()
+        for snapshot in newest_first:
+            period = tier.period_of(snapshot.creation)
+            if period in periods:
+                continue
+
+            periods.add(period)
+            keep.add(snapshot.name)
+            if len(periods) >= tier.keep:
+                break
+
+    oldest_first = [snapshot.name for snapshot in reversed(newest_first)]
+    return RetentionPlan(
+        keep=[snapshot_name for snapshot_name in oldest_first if snapshot_name in keep],
+        delete=[snapshot_name for snapshot_name in oldest_first if snapshot_name not in keep],
+    )
+
+
+RETENTION_ENGINES: dict[RetentionEngine, Callable[[Sequence[Snapshot], Mapping[str, int]], RetentionPlan]] = {
+    RetentionEngine.NAME: name_retention_plan,
+    RetentionEngine.CREATION: creation_retention_plan,
+}
+
+
+def plan_retention(
+    snapshots: Sequence[Snapshot],
+    count_lookup: Mapping[str, int],
+    engine: RetentionEngine = RetentionEngine.NAME,
+) -> RetentionPlan:
+    """Plan which snapshots of a dataset to keep and delete.
+
+    Args:
+        snapshots (Sequence[Snapshot]): The snapshots of a dataset.
+        count_lookup (Mapping[str, int]): The number of snapshots to keep for each tier.
+        engine (RetentionEngine, optional): The retention engine. Defaults to RetentionEngine.NAME.
+
+    Returns:
+        RetentionPlan: The retention plan.
+    """
+    return RETENTION_ENGINES[engine](snapshots, count_lookup)
@@ -5,42 +5,341 @@ from __future__ import annotations
 import logging
 import sys
 import tomllib
+from dataclasses import dataclass, field
+from datetime import UTC
 from functools import cache
-from pathlib import Path  # noqa: TC003 This is required for the typer CLI
-from re import compile as re_compile
-from re import search
+from pathlib import Path
+from signal import SIGHUP, SIGINT, SIGTERM, Signals, signal
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from system_tools.common import (
+    CommandStats,
+    TextfileMetrics,
+    add_command_hook,
+    configure_logger,
+    iter_parallel,
+    remove_command_hook,
+    run_cli,
+    signal_alert,
+)
+from system_tools.common.lib import utcnow
+from system_tools.tools.retention import RetentionEngine, get_unmatched_times, plan_retention
+from system_tools.zfs import Dataset, SnapshotInventory, create_snapshots, get_datasets, get_snapshots_by_dataset
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from types import FrameType
+
+    from system_tools.zfs import Snapshot
+
+
+@dataclass
+class SnapshotMetrics:
+    """The counts of a snapshot_manager run."""
+
+    datasets: int = 0
+    created: int = 0
+    create_failed: int = 0
+    deleted: int = 0
+    delete_failed: int = 0
+    _lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    def add_deleted(self, deleted: int, delete_failed: int) -> None:
+        """Count the snapshots deleted from a dataset, datasets are pruned concurrently.
+
+        Args:
+            deleted (int): The snapshots deleted.
+            delete_failed (int): The snapshots that failed to delete.
+        """
+        with self._lock:
+            self.deleted += deleted
+            self.delete_failed += delete_failed
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """How snapshot_manager runs."""
+
+    jobs: int = 1
+    pool_jobs: int | None = None
+    retention: RetentionEngine = RetentionEngine.NAME
+    dry_run: bool = False
+    stats_file: Path | None = None
+    textfile: Path | None = None
+    interval_minutes: int = 15
+
+
+def main(
+    config_file: Path,
+    jobs: int = 1,
+    pool_jobs: int | None = None,
+    retention: RetentionEngine = RetentionEngine.NAME,
+    dry_run: bool = False,  # noqa: FBT001, FBT002 This is required for the typer CLI
+    inventory: Path | None = None,
+    stats_file: Path | None = None,
+    textfile: Path | None = None,
+) -> None:
+    """Main.
 
-import typer
+    Args:
+        config_file (Path): The path to the configuration file.
+        jobs (int, optional): The number of datasets to prune at once. Defaults to 1.
+        pool_jobs (int | None, optional): The number of datasets to prune at once on each pool. Defaults to jobs.
+        retention (RetentionEngine, optional): Match snapshots to retention tiers by name or by creation time.
+            Defaults to name.
+        dry_run (bool, optional): Log the retention plan without creating or deleting snapshots. Defaults to False.
+        inventory (Path | None, optional): Keep the snapshot inventory in this SQLite cache
+            and only fetch the snapshots it has not seen. Defaults to None.
+        stats_file (Path | None, optional): Write the latency and output size of the commands run to this JSON file.
+            Defaults to None.
+        textfile (Path | None, optional): Write the run metrics to this node_exporter textfile collector `.prom` file.
+            Defaults to None.
+    """
+    configure_logger(level="DEBUG")
 
-from system_tools.common import configure_logger, signal_alert
-from system_tools.common.lib import utcnow
-from system_tools.zfs import Dataset, get_datasets
+    options = RunOptions(jobs, pool_jobs, retention, dry_run, stats_file, textfile)
+    if inventory:
+        with SnapshotInventory(inventory) as snapshot_inventory:
+            succeeded = run_snapshot_manager(config_file, options, snapshot_inventory)
+    else:
+        succeeded = run_snapshot_manager(config_file, options)
+
+    if not succeeded:
+        sys.exit(1)
 
 
-def main(config_file: Path) -> None:
-    """Main."""
-    configure_logger(level="DEBUG")
+def run_snapshot_manager(
+    config_file: Path,
+    options: RunOptions,
+    snapshot_inventory: SnapshotInventory | None = None,
+) -> bool:
+    """Snapshot every dataset and prune the expired snapshots.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+        options (RunOptions): How to run.
+        snapshot_inventory (SnapshotInventory | None, optional): Read the snapshots from this inventory
+            instead of listing all of them. Defaults to None.
+
+    Returns:
+        bool: True if the run completed.
+    """
     logging.info("Starting snapshot_manager")
 
-    try:
-        time_stamp = get_time_stamp()
+    start = perf_counter()
+    succeeded = False
+    metrics = SnapshotMetrics()
+    command_stats = CommandStats()
+    add_command_hook(command_stats.record)
 
-        for dataset in get_datasets():
-            status = dataset.create_snapshot(time_stamp)
-            logging.debug(f"{status=}")
+    try:
+        time_stamp = get_time_stamp(options.interval_minutes)
+
+        excluded_datasets = get_excluded_datasets(config_file)
+        datasets = [dataset for dataset in get_datasets(fields=()) if dataset.name not in excluded_datasets]
+        if options.dry_run:
+            statuses = dict.fromkeys((dataset.name for dataset in datasets), "snapshot created")
+        else:
+            statuses = create_snapshots(datasets, time_stamp)
+
+        errors: list[str] = []
+        snapshotted_datasets: list[Dataset] = []
+        for dataset in datasets:
+            status = statuses[dataset.name]
+            logging.debug(f"{dataset.name} {status=}")
             if status != "snapshot created":
                 msg = f"{dataset.name} failed to create snapshot {time_stamp}"
                 logging.error(msg)
-                signal_alert(msg)
+                errors.append(msg)
                 continue
 
-            get_snapshots_to_delete(dataset, get_count_lookup(config_file, dataset.name))
+            snapshotted_datasets.append(dataset)
+
+        metrics.datasets = len(datasets)
+        metrics.created = 0 if options.dry_run else len(snapshotted_datasets)
+        metrics.create_failed = len(datasets) - len(snapshotted_datasets)
+
+        if snapshot_inventory:
+            snapshots_by_dataset = snapshot_inventory.load(
+                sorted({dataset.name.split("/")[0] for dataset in snapshotted_datasets})
+            )
+        else:
+            snapshots_by_dataset = get_snapshots_by_dataset(fields=("creation",))
+        errors.extend(
+            prune_datasets(
+                config_file,
+                snapshotted_datasets,
+                snapshots_by_dataset,
+                options.jobs,
+                options.pool_jobs,
+                options.retention,
+                options.dry_run,
+                metrics,
+            )
+        )
+
+        if errors:
+            signal_alert("\n".join(errors))
     except Exception:
         logging.exception("snapshot_manager failed")
         signal_alert("snapshot_manager failed")
-        sys.exit(1)
     else:
+        succeeded = True
         logging.info("snapshot_manager completed")
+    finally:
+        remove_command_hook(command_stats.record)
+        command_stats.report(options.stats_file)
+        if options.textfile:
+            write_textfile(options.textfile, metrics, command_stats, perf_counter() - start, succeeded=succeeded)
+
+    return succeeded
+
+
+def daemon(
+    config_file: Path,
+    interval_minutes: int = 15,
+    jobs: int = 1,
+    pool_jobs: int | None = None,
+    retention: RetentionEngine = RetentionEngine.NAME,
+    inventory: Path | None = None,
+    textfile: Path | None = None,
+) -> None:
+    """Stay resident and run snapshot_manager every interval_minutes.
+
+    The snapshot inventory stays open between runs, in memory unless inventory is given.
+    SIGHUP reloads the configuration, SIGTERM and SIGINT stop the daemon once the current run finishes.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+        interval_minutes (int, optional): How often to snapshot, it must divide an hour. Defaults to 15.
+        jobs (int, optional): The number of datasets to prune at once. Defaults to 1.
+        pool_jobs (int | None, optional): The number of datasets to prune at once on each pool. Defaults to jobs.
+        retention (RetentionEngine, optional): Match snapshots to retention tiers by name or by creation time.
+            Defaults to name.
+        inventory (Path | None, optional): Keep the snapshot inventory in this SQLite cache. Defaults to None.
+        textfile (Path | None, optional): Write the run metrics to this node_exporter textfile collector `.prom` file.
+            Defaults to None.
+    """
+    from apscheduler.schedulers.blocking import BlockingScheduler  # type: ignore[import-untyped]
+    from apscheduler.triggers.cron import CronTrigger  # type: ignore[import-untyped]
+
+    configure_logger(level="DEBUG")
+
+    if interval_minutes < 1 or 60 % interval_minutes:
+        error = f"{interval_minutes=} must divide an hour"
+        raise ValueError(error)
+
+    if retention == RetentionEngine.NAME:
+        check_retention_tiers(config_file, interval_minutes)
+
+    options = RunOptions(jobs, pool_jobs, retention, textfile=textfile, interval_minutes=interval_minutes)
+    scheduler = BlockingScheduler(timezone=UTC)
+
+    def reload_config(signal_number: int, _: FrameType | None) -> None:
+        logging.info(f"Received {Signals(signal_number).name}, reloading {config_file}")
+        load_config_data.cache_clear()
+
+    def stop(signal_number: int, _: FrameType | None) -> None:
+        logging.info(f"Received {Signals(signal_number).name}, stopping once the current run finishes")
+        # Waiting for the running job keeps the snapshot inventory open until it is done with it
+        scheduler.shutdown(wait=True)
+
+    signal(SIGHUP, reload_config)
+    signal(SIGTERM, stop)
+    signal(SIGINT, stop)
+
+    with SnapshotInventory(inventory or Path(":memory:")) as snapshot_inventory:
+        scheduler.add_job(
+            run_snapshot_manager,
+            CronTrigger(minute=f"*/{interval_minutes}", timezone=UTC),
+            args=(config_file, options, snapshot_inventory),
+            id="snapshot_manager",
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=interval_minutes * 30,
+        )
+        logging.info(f"Starting snapshot_manager daemon every {interval_minutes} minutes")
+        scheduler.start()
+
+
+def prune_datasets(
+    config_file: Path,
+    datasets: Sequence[Dataset],
+    snapshots_by_dataset: dict[str, list[Snapshot]],
+    jobs: int = 1,
+    pool_jobs: int | None = None,
+    retention: RetentionEngine = RetentionEngine.NAME,
+    dry_run: bool = False,  # noqa: FBT001, FBT002
+    metrics: SnapshotMetrics | None = None,
+) -> list[str]:
+    """Delete the expired snapshots of many datasets concurrently.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+        datasets (Sequence[Dataset]): The datasets to prune.
+        snapshots_by_dataset (dict[str, list[Snapshot]]): The snapshots keyed by dataset name.
+        jobs (int, optional): The number of datasets to prune at once. Defaults to 1.
+        pool_jobs (int | None, optional): The number of datasets to prune at once on each pool. Defaults to jobs.
+        retention (RetentionEngine, optional): The retention engine. Defaults to name.
+        dry_run (bool, optional): Log the retention plan without deleting snapshots. Defaults to False.
+        metrics (SnapshotMetrics | None, optional): Counts the deleted snapshots. Defaults to None.
+
+    Returns:
+        list[str]: The errors of every dataset.
+    """
+    jobs = max(jobs, 1)
+    pool_semaphores: dict[str, BoundedSemaphore] = {}
+    for dataset in datasets:
+        pool_semaphores.setdefault(dataset.name.split("/")[0], BoundedSemaphore(max(pool_jobs or jobs, 1)))
+
+    errors_by_index: dict[int, list[str]] = {}
+    exceptions: list[BaseException] = []
+    for outcome in iter_parallel(
+        func=_prune_dataset,
+        kwargs_list=[
+            {
+                "dataset": dataset,
+                "count_lookup": get_count_lookup(config_file, dataset.name),
+                "snapshots": snapshots_by_dataset.get(dataset.name, []),
+                "pool_semaphore": pool_semaphores[dataset.name.split("/")[0]],
+                "retention": retention,
+                "dry_run": dry_run,
+                "metrics": metrics,
+            }
+            for dataset in datasets
+        ],
+        max_workers=jobs,
+        progress_tracker=100,
+    ):
+        if outcome.exception is not None:
+            exceptions.append(outcome.exception)
+        elif outcome.result:
+            logging.error(f"{outcome.kwargs['dataset'].name} failed to delete {len(outcome.result)} snapshots")
+            errors_by_index[outcome.index] = outcome.result
+
+    if exceptions:
+        error = "Failed to prune datasets"
+        raise BaseExceptionGroup(error, exceptions)
+
+    return [error for _, errors in sorted(errors_by_index.items()) for error in errors]
+
+
+def _prune_dataset(
+    dataset: Dataset,
+    count_lookup: dict[str, int],
+    snapshots: Sequence[Snapshot],
+    pool_semaphore: BoundedSemaphore,
+    retention: RetentionEngine,
+    dry_run: bool,  # noqa: FBT001
+    metrics: SnapshotMetrics | None,
+) -> list[str]:
+    """Delete the expired snapshots of a dataset once its pool has a free slot."""
+    with pool_semaphore:
+        return get_snapshots_to_delete(
+            dataset, count_lookup, snapshots, retention=retention, dry_run=dry_run, metrics=metrics
+        )
 
 
 def get_count_lookup(config_file: Path, dataset_name: str) -> dict[str, int]:
@@ -58,11 +357,50 @@ def get_count_lookup(config_file: Path, dataset_name: str) -> dict[str, int]:
     return config_data.get(dataset_name, get_default_config(config_data))
 
 
-def get_default_config(config_data: dict[str, dict[str, int]]) -> dict[str, int]:
+def check_retention_tiers(config_file: Path, interval_minutes: int) -> None:
+    """Check the retention tiers of every dataset match each snapshot taken every interval_minutes.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+        interval_minutes (int): How often snapshots are taken.
+
+    Raises:
+        ValueError: If a dataset would keep snapshots that match none of its tiers forever.
+    """
+    config_data = load_config_data(config_file)
+    count_lookups = {name: value for name, value in config_data.items() if isinstance(value, dict)}
+    count_lookups["default"] = get_default_config(config_data)
+
+    errors: list[str] = []
+    for name, count_lookup in count_lookups.items():
+        if unmatched_times := get_unmatched_times(count_lookup, interval_minutes):
+            errors.append(f"{name} tiers {sorted(count_lookup)} match no snapshot taken at {unmatched_times[0]}")
+
+    if errors:
+        error = (
+            f"Snapshots every {interval_minutes} minutes would never be deleted, "
+            f"add a {interval_minutes}_min tier or raise interval_minutes: {'; '.join(errors)}"
+        )
+        raise ValueError(error)
+
+
+def get_excluded_datasets(config_file: Path) -> set[str]:
+    """Get the datasets that should not be snapshotted.
+
+    Args:
+        config_file (Path): The path to the configuration file.
+
+    Returns:
+        set[str]: The names of the excluded datasets.
+    """
+    return set(load_config_data(config_file).get("exclude", []))
+
+
+def get_default_config(config_data: dict[str, Any]) -> dict[str, int]:
     """Get the default configuration.
 
     Args:
-        config_data (dict[str, dict[str, int]]): The configuration data.
+        config_data (dict[str, Any]): The configuration data.
 
     Returns:
         dict[str, int]: The default configuration.
@@ -74,7 +412,7 @@ def get_default_config(config_data: dict[str, dict[str, int]]) -> dict[str, int]
 
 
 @cache
-def load_config_data(config_file: Path) -> dict[str, dict[str, int]]:
+def load_config_data(config_file: Path) -> dict[str, Any]:
     """Load a TOML configuration file.
 
     Args:
@@ -89,54 +427,114 @@ def load_config_data(config_file: Path) -> dict[str, dict[str, int]]:
 def get_snapshots_to_delete(
     dataset: Dataset,
     count_lookup: dict[str, int],
-) -> None:
+    snapshots: Sequence[Snapshot] | None = None,
+    retention: RetentionEngine = RetentionEngine.NAME,
+    dry_run: bool = False,  # noqa: FBT001, FBT002
+    metrics: SnapshotMetrics | None = None,
+) -> list[str]:
     """Get snapshots to delete.
 
     Args:
         dataset (Dataset): the dataset
         count_lookup (dict[str, int]): the count lookup
+        snapshots (Sequence[Snapshot] | None, optional): the snapshots of the dataset.
+            Fetched from the dataset when not provided. Defaults to None.
+        retention (RetentionEngine, optional): the retention engine. Defaults to name.
+        dry_run (bool, optional): only log the retention plan. Defaults to False.
+        metrics (SnapshotMetrics | None, optional): counts the deleted snapshots. Defaults to None.
+
+    Returns:
+        list[str]: the snapshots that failed to delete
     """
-    snapshots = dataset.get_snapshots()
+    if snapshots is None:
+        snapshots = dataset.get_snapshots(fields=("creation",))
 
     if not snapshots:
         logging.info(f"{dataset.name} has no snapshots")
-        return
+        return []
 
-    filters = (
-        ("15_min", re_compile(r"auto_\d{10}(?:15|30|45)")),
-        ("hourly", re_compile(r"auto_\d{8}(?!00)\d{2}00")),
-        ("daily", re_compile(r"auto_\d{6}(?!01)\d{2}0000")),
-        ("monthly", re_compile(r"auto_\d{6}010000")),
-    )
+    plan = plan_retention(snapshots, count_lookup, retention)
+    if dry_run:
+        logging.info(f"{dataset.name} would keep {plan.keep}")
+        logging.info(f"{dataset.name} would delete {plan.delete}")
+        return []
 
-    for filter_name, snapshot_filter in filters:
-        logging.debug(f"{filter_name=}\n{snapshot_filter=}")
+    snapshots_to_delete = plan.delete
+    logging.info(f"{snapshots_to_delete} are being deleted")
 
-        filtered_snapshots = sorted(snapshot.name for snapshot in snapshots if search(snapshot_filter, snapshot.name))
+    if not snapshots_to_delete:
+        return []
 
-        logging.debug(f"{filtered_snapshots=}")
+    errors: list[str] = []
+    for snapshot, error in dataset.delete_snapshots(snapshots_to_delete).items():
+        if error:
+            error_message = f"{dataset.name}@{snapshot} failed to delete: {error}"
+            logging.error(error_message)
+            errors.append(error_message)
 
-        snapshots_wanted = count_lookup[filter_name]
-        snapshots_being_deleted = filtered_snapshots[:-snapshots_wanted] if snapshots_wanted > 0 else filtered_snapshots
+    if metrics:
+        metrics.add_deleted(len(snapshots_to_delete) - len(errors), len(errors))
 
-        logging.info(f"{snapshots_being_deleted} are being deleted")
-        for snapshot in snapshots_being_deleted:
-            if error := dataset.delete_snapshot(snapshot):
-                error_message = f"{dataset.name}@{snapshot} failed to delete: {error}"
-                signal_alert(error_message)
-                logging.error(error_message)
+    return errors
 
 
-def get_time_stamp() -> str:
-    """Get the time stamp."""
+def write_textfile(
+    textfile: Path,
+    metrics: SnapshotMetrics,
+    command_stats: CommandStats,
+    duration: float,
+    *,
+    succeeded: bool,
+) -> None:
+    """Write the metrics of a run for the node_exporter textfile collector.
+
+    Args:
+        textfile (Path): The `.prom` file.
+        metrics (SnapshotMetrics): The counts of the run.
+        command_stats (CommandStats): The commands of the run.
+        duration (float): How long the run took in seconds.
+        succeeded (bool): If the run completed.
+    """
+    textfile_metrics = TextfileMetrics()
+    textfile_metrics.add(
+        "snapshot_manager_last_run_timestamp_seconds", utcnow().timestamp(), "When snapshot_manager last ran."
+    )
+    textfile_metrics.add("snapshot_manager_run_duration_seconds", duration, "How long the last run took.")
+    textfile_metrics.add("snapshot_manager_success", int(succeeded), "1 if the last run completed, 0 if it failed.")
+    textfile_metrics.add("snapshot_manager_datasets", metrics.datasets, "The datasets processed by the last run.")
+    for result, count in (
+        ("created", metrics.created),
+        ("create_failed", metrics.create_failed),
+        ("deleted", metrics.deleted),
+        ("delete_failed", metrics.delete_failed),
+    ):
+        textfile_metrics.add(
+            "snapshot_manager_snapshots",
+            count,
+            "The snapshots created, deleted or failed by the last run.",
+            {"result": result},
+        )
+    textfile_metrics.add_command_stats(command_stats)
+    textfile_metrics.write(textfile)
+
+
+def get_time_stamp(interval_minutes: int = 15) -> str:
+    """Get the time stamp.
+
+    Args:
+        interval_minutes (int, optional): Round the time down to this many minutes. Defaults to 15.
+
+    Returns:
+        str: The snapshot name.
+    """
     now = utcnow()
-    nearest_15_min = now.replace(minute=(now.minute - (now.minute % 15)))
-    return nearest_15_min.strftime("auto_%Y%m%d%H%M")
+    nearest_interval = now.replace(minute=(now.minute - (now.minute % interval_minutes)))
+    return nearest_interval.strftime("auto_%Y%m%d%H%M")
 
 
 def cli() -> None:
-    """CLI."""
-    typer.run(main)
+    """CLI, `snapshot_manager daemon ...` runs the daemon."""
+    run_cli(main, daemon)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,54 @@
 """init."""
 
-from system_tools.zfs.dataset import Dataset, Snapshot, get_datasets
-from system_tools.zfs.zpool import Zpool
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from system_tools.zfs.dataset import (
+    Dataset,
+    Snapshot,
+    async_get_datasets,
+    create_snapshots,
+    get_datasets,
+    get_snapshots_by_dataset,
+    iter_datasets,
+    iter_snapshot_properties,
+    iter_snapshots,
+)
+from system_tools.zfs.inventory import SnapshotInventory
+from system_tools.zfs.iostat import VdevIostat, ZpoolIostatSampler, sample_zpool_iostat
+from system_tools.zfs.zpool import Zpool, async_get_zpools, get_zpools
+
+if TYPE_CHECKING:
+    from system_tools.zfs.snapshot_table import SnapshotTable  # noqa: TC004
 
 __all__ = [
     "Dataset",
     "Snapshot",
+    "SnapshotInventory",
+    "SnapshotTable",
+    "VdevIostat",
     "Zpool",
+    "ZpoolIostatSampler",
+    "async_get_datasets",
+    "async_get_zpools",
+    "create_snapshots",
     "get_datasets",
+    "get_snapshots_by_dataset",
+    "get_zpools",
+    "iter_datasets",
+    "iter_snapshot_properties",
+    "iter_snapshots",
+    "sample_zpool_iostat",
 ]
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    """Import SnapshotTable on first use, polars is slow to import and only the bulk paths need it."""
+    if name == "SnapshotTable":
+        from system_tools.zfs.snapshot_table import SnapshotTable
+
+        return SnapshotTable
+
+    error = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(error)
@@ -4,10 +4,48 @@ from __future__ import annotations
 
 import json
 import logging
-from datetime import UTC, datetime
-from typing import Any
-
-from system_tools.common import bash_wrapper
+from collections import defaultdict
+from sys import intern
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from system_tools.common import async_bash_wrapper, bash_stream, bash_wrapper, iter_json_members
+from system_tools.zfs.properties import ZfsProperty, projection, property_slots, to_datetime
+
+if TYPE_CHECKING:
+    from asyncio import Semaphore
+    from collections.abc import Callable, Iterator, Sequence
+    from datetime import datetime
+
+# Linux limits a single argument to 128 KiB and all arguments to 2 MiB, stay well below both
+MAX_ARGUMENT_LENGTH = 100_000
+MAX_COMMAND_LENGTH = 1_000_000
+
+
+def _batches(items: Sequence[str], max_length: int) -> Iterator[list[str]]:
+    """Split items into batches whose joined length, with a separator each, fits in max_length."""
+    batch: list[str] = []
+    batch_length = 0
+    for item in items:
+        if batch and batch_length + len(item) + 1 > max_length:
+            yield batch
+            batch = []
+            batch_length = 0
+        batch.append(item)
+        batch_length += len(item) + 1
+
+    if batch:
+        yield batch
+
+
+def _check_output_version(output_version: dict[str, Any], expected_command: str = "zfs list") -> None:
+    """Check the version of the zfs json output."""
+    vers_major = output_version["vers_major"]
+    vers_minor = output_version["vers_minor"]
+    command = output_version["command"]
+
+    if vers_major != 0 or vers_minor != 1 or command != expected_command:
+        error = f"Datasets are not in the correct format {vers_major=} {vers_minor=} {command=}"
+        raise RuntimeError(error)
 
 
 def _zfs_list(zfs_list: str) -> dict[str, Any]:
@@ -16,99 +54,185 @@ def _zfs_list(zfs_list: str) -> dict[str, Any]:
 
     zfs_list_data = json.loads(raw_zfs_list_data)
 
-    vers_major = zfs_list_data["output_version"]["vers_major"]
-    vers_minor = zfs_list_data["output_version"]["vers_minor"]
-    command = zfs_list_data["output_version"]["command"]
-
-    if vers_major != 0 or vers_minor != 1 or command != "zfs list":
-        error = f"Datasets are not in the correct format {vers_major=} {vers_minor=} {command=}"
-        raise RuntimeError(error)
+    _check_output_version(zfs_list_data["output_version"])
 
     return zfs_list_data
 
 
+def _zfs_list_stream(
+    zfs_list: str,
+    expected_command: str = "zfs list",
+    check: bool = True,  # noqa: FBT001, FBT002
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield each dataset of a zfs list or zfs get as it is read from the command output.
+
+    A command that fails raises once its output is parsed, unless check is False, then its stderr is logged.
+    """
+    header: dict[str, Any] = {}
+    chunks = iter(bash_stream(zfs_list, check=check))
+    datasets = iter_json_members(chunks, "datasets", header)
+    first_dataset = next(datasets, None)
+
+    _check_output_version(header["output_version"], expected_command)
+
+    if first_dataset is not None:
+        yield first_dataset
+        yield from datasets
+
+    # The JSON ends before the command does, read to the end so its exit status and stderr are checked
+    for _ in chunks:
+        pass
+
+
 class Snapshot:
-    """Snapshot."""
+    """Snapshot.
+
+    Snapshots are held in bulk, so the requested properties are converted up front
+    and the raw `zfs list` data is not kept.
+    """
+
+    __slots__ = (
+        "createtxg",
+        "creation",
+        "dataset",
+        "defer_destroy",
+        "guid",
+        "name",
+        "objsetid",
+        "referenced",
+        "used",
+        "userrefs",
+        "version",
+        "written",
+    )
+
+    PROPERTIES: ClassVar[dict[str, Callable[[str], Any]]] = {
+        "creation": to_datetime,
+        "defer_destroy": str,
+        "guid": int,
+        "objsetid": int,
+        "referenced": int,
+        "used": int,
+        "userrefs": int,
+        "version": int,
+        "written": int,
+    }
+
+    createtxg: int
+    creation: datetime
+    dataset: str
+    defer_destroy: str
+    guid: int
+    name: str
+    objsetid: int
+    referenced: int
+    used: int
+    userrefs: int
+    version: int
+    written: int
 
     def __init__(self, snapshot_data: dict[str, Any]) -> None:
-        """__init__."""
-        properties = snapshot_data["properties"]
+        """__init__.
+
+        Args:
+            snapshot_data (dict[str, Any]): The snapshot data from `zfs list -j`.
+        """
         self.createtxg = int(snapshot_data["createtxg"])
-        self.creation = datetime.fromtimestamp(int(properties["creation"]["value"]), tz=UTC)
-        self.defer_destroy = properties["defer_destroy"]["value"]
-        self.guid = int(properties["guid"]["value"])
-        self.name = snapshot_data["name"].split("@")[1]
-        self.objsetid = int(properties["objsetid"]["value"])
-        self.referenced = int(properties["referenced"]["value"])
-        self.used = int(properties["used"]["value"])
-        self.userrefs = int(properties["userrefs"]["value"])
-        self.version = int(properties["version"]["value"])
-        self.written = int(properties["written"]["value"])
+        dataset, self.name = snapshot_data["name"].split("@")
+        self.dataset = intern(dataset)
+
+        for property_name, raw_property in snapshot_data["properties"].items():
+            if converter := self.PROPERTIES.get(property_name):
+                setattr(self, property_name, converter(raw_property["value"]))
 
     def __repr__(self) -> str:
         """__repr__."""
-        return f"name={self.name} used={self.used} refer={self.referenced}"
+        representation = f"name={self.name}"
+        if hasattr(self, "used"):
+            representation += f" used={self.used}"
+        if hasattr(self, "referenced"):
+            representation += f" refer={self.referenced}"
+        return representation
 
 
 class Dataset:
     """Dataset."""
 
-    def __init__(self, name: str) -> None:
-        """__init__."""
-        dataset_data = _zfs_list(f"zfs list {name} -pHj -o all")
-
-        properties = dataset_data["datasets"][name]["properties"]
-
-        self.aclinherit = properties["aclinherit"]["value"]
-        self.aclmode = properties["aclmode"]["value"]
-        self.acltype = properties["acltype"]["value"]
-        self.available = int(properties["available"]["value"])
-        self.canmount = properties["canmount"]["value"]
-        self.checksum = properties["checksum"]["value"]
-        self.clones = properties["clones"]["value"]
-        self.compression = properties["compression"]["value"]
-        self.copies = int(properties["copies"]["value"])
-        self.createtxg = int(properties["createtxg"]["value"])
-        self.creation = datetime.fromtimestamp(int(properties["creation"]["value"]), tz=UTC)
-        self.dedup = properties["dedup"]["value"]
-        self.devices = properties["devices"]["value"]
-        self.encryption = properties["encryption"]["value"]
-        self.exec = properties["exec"]["value"]
-        self.filesystem_limit = properties["filesystem_limit"]["value"]
-        self.guid = int(properties["guid"]["value"])
-        self.keystatus = properties["keystatus"]["value"]
-        self.logbias = properties["logbias"]["value"]
-        self.mlslabel = properties["mlslabel"]["value"]
-        self.mounted = properties["mounted"]["value"]
-        self.mountpoint = properties["mountpoint"]["value"]
+    aclinherit = ZfsProperty(str)
+    aclmode = ZfsProperty(str)
+    acltype = ZfsProperty(str)
+    available = ZfsProperty(int)
+    canmount = ZfsProperty(str)
+    checksum = ZfsProperty(str)
+    clones = ZfsProperty(str)
+    compression = ZfsProperty(str)
+    copies = ZfsProperty(int)
+    createtxg = ZfsProperty(int)
+    creation = ZfsProperty(to_datetime)
+    dedup = ZfsProperty(str)
+    devices = ZfsProperty(str)
+    encryption = ZfsProperty(str)
+    exec = ZfsProperty(str)
+    filesystem_limit = ZfsProperty(str)
+    guid = ZfsProperty(int)
+    keystatus = ZfsProperty(str)
+    logbias = ZfsProperty(str)
+    mlslabel = ZfsProperty(str)
+    mounted = ZfsProperty(str)
+    mountpoint = ZfsProperty(str)
+    quota = ZfsProperty(int)
+    readonly = ZfsProperty(str)
+    recordsize = ZfsProperty(int)
+    redundant_metadata = ZfsProperty(str)
+    referenced = ZfsProperty(int)
+    refquota = ZfsProperty(int)
+    refreservation = ZfsProperty(int)
+    reservation = ZfsProperty(int)
+    setuid = ZfsProperty(str)
+    sharenfs = ZfsProperty(str)
+    snapdir = ZfsProperty(str)
+    snapshot_limit = ZfsProperty(str)
+    sync = ZfsProperty(str)
+    used = ZfsProperty(int)
+    usedbychildren = ZfsProperty(int)
+    usedbydataset = ZfsProperty(int)
+    usedbysnapshots = ZfsProperty(int)
+    version = ZfsProperty(int)
+    volmode = ZfsProperty(str)
+    volsize = ZfsProperty(str)
+    vscan = ZfsProperty(str)
+    written = ZfsProperty(int)
+    xattr = ZfsProperty(str)
+
+    __slots__ = ("_properties", "name", *property_slots(vars()))
+
+    def __init__(
+        self, name: str, properties: dict[str, Any] | None = None, fields: Sequence[str] | None = None
+    ) -> None:
+        """__init__.
+
+        Args:
+            name (str): The name of the dataset.
+            properties (dict[str, Any] | None, optional): The dataset properties from `zfs list -j`.
+                Fetched with `zfs list` when not provided. Defaults to None.
+            fields (Sequence[str] | None, optional): The properties to fetch when properties is not provided.
+                None fetches all of them. Defaults to None.
+        """
+        if properties is None:
+            dataset_data = _zfs_list(f"zfs list {name} -pHj -o {projection(fields)}")
+            properties = dataset_data["datasets"][name]["properties"]
+
+        self._properties: dict[str, Any] = properties
         self.name = name
-        self.quota = int(properties["quota"]["value"])
-        self.readonly = properties["readonly"]["value"]
-        self.recordsize = int(properties["recordsize"]["value"])
-        self.redundant_metadata = properties["redundant_metadata"]["value"]
-        self.referenced = int(properties["referenced"]["value"])
-        self.refquota = int(properties["refquota"]["value"])
-        self.refreservation = int(properties["refreservation"]["value"])
-        self.reservation = int(properties["reservation"]["value"])
-        self.setuid = properties["setuid"]["value"]
-        self.sharenfs = properties["sharenfs"]["value"]
-        self.snapdir = properties["snapdir"]["value"]
-        self.snapshot_limit = properties["snapshot_limit"]["value"]
-        self.sync = properties["sync"]["value"]
-        self.used = int(properties["used"]["value"])
-        self.usedbychildren = int(properties["usedbychildren"]["value"])
-        self.usedbydataset = int(properties["usedbydataset"]["value"])
-        self.usedbysnapshots = int(properties["usedbysnapshots"]["value"])
-        self.version = int(properties["version"]["value"])
-        self.volmode = properties["volmode"]["value"]
-        self.volsize = properties["volsize"]["value"]
-        self.vscan = properties["vscan"]["value"]
-        self.written = int(properties["written"]["value"])
-        self.xattr = properties["xattr"]["value"]
-
-    def get_snapshots(self) -> list[Snapshot] | None:
-        """Get all snapshots from zfs and process then is test dicts of sets."""
-        snapshots_data = _zfs_list(f"zfs list -t snapshot -pHj {self.name} -o all")
+
+    def get_snapshots(self, fields: Sequence[str] | None = None) -> list[Snapshot] | None:
+        """Get all snapshots from zfs and process then is test dicts of sets.
+
+        Args:
+            fields (Sequence[str] | None, optional): The snapshot properties to fetch.
+                None fetches all of them. Defaults to None.
+        """
+        snapshots_data = _zfs_list(f"zfs list -t snapshot -pHj {self.name} -o {projection(fields)}")
 
         return [Snapshot(properties) for properties in snapshots_data["datasets"].values()]
 
@@ -145,68 +269,205 @@ class Dataset:
             raise RuntimeError(error)
         return None
 
+    def delete_snapshots(self, snapshot_names: Sequence[str]) -> dict[str, str | None]:
+        """Deletes zfs snapshots with as few `zfs destroy` calls as possible.
+
+        Snapshots are destroyed in comma separated batches, `zfs destroy dataset@a,b,c`.
+        zfs destroys a batch all or nothing, so a failed batch is retried one snapshot at a time.
+
+        Args:
+            snapshot_names (Sequence[str]): the snapshot names
+
+        Returns:
+            dict[str, str | None]: The error for each snapshot, None if it was deleted.
+        """
+        outcomes: dict[str, str | None] = {}
+        for batch in _batches(snapshot_names, MAX_ARGUMENT_LENGTH - len(self.name) - 1):
+            logging.debug(f"deleting {self.name}@{','.join(batch)}")
+            _, return_code = bash_wrapper(f"zfs destroy {self.name}@{','.join(batch)}")
+            if return_code == 0:
+                outcomes.update(dict.fromkeys(batch))
+                continue
+
+            for snapshot_name in batch:
+                try:
+                    outcomes[snapshot_name] = self.delete_snapshot(snapshot_name)
+                except RuntimeError as error:
+                    outcomes[snapshot_name] = str(error)
+
+        return outcomes
+
     def __repr__(self) -> str:
         """__repr__."""
-        return (
-            f"{self.aclinherit=}\n"
-            f"{self.aclmode=}\n"
-            f"{self.acltype=}\n"
-            f"{self.available=}\n"
-            f"{self.canmount=}\n"
-            f"{self.checksum=}\n"
-            f"{self.clones=}\n"
-            f"{self.compression=}\n"
-            f"{self.copies=}\n"
-            f"{self.createtxg=}\n"
-            f"{self.creation=}\n"
-            f"{self.dedup=}\n"
-            f"{self.devices=}\n"
-            f"{self.encryption=}\n"
-            f"{self.exec=}\n"
-            f"{self.filesystem_limit=}\n"
-            f"{self.guid=}\n"
-            f"{self.keystatus=}\n"
-            f"{self.logbias=}\n"
-            f"{self.mlslabel=}\n"
-            f"{self.mounted=}\n"
-            f"{self.mountpoint=}\n"
-            f"{self.name=}\n"
-            f"{self.quota=}\n"
-            f"{self.readonly=}\n"
-            f"{self.recordsize=}\n"
-            f"{self.redundant_metadata=}\n"
-            f"{self.referenced=}\n"
-            f"{self.refquota=}\n"
-            f"{self.refreservation=}\n"
-            f"{self.reservation=}\n"
-            f"{self.setuid=}\n"
-            f"{self.sharenfs=}\n"
-            f"{self.snapdir=}\n"
-            f"{self.snapshot_limit=}\n"
-            f"{self.sync=}\n"
-            f"{self.used=}\n"
-            f"{self.usedbychildren=}\n"
-            f"{self.usedbydataset=}\n"
-            f"{self.usedbysnapshots=}\n"
-            f"{self.version=}\n"
-            f"{self.volmode=}\n"
-            f"{self.volsize=}\n"
-            f"{self.vscan=}\n"
-            f"{self.written=}\n"
-            f"{self.xattr=}\n"
+        return f"self.name={self.name!r}\n" + "".join(
+            f"self.{property_name}={getattr(self, property_name)!r}\n"
+            for property_name, attribute in vars(Dataset).items()
+            if isinstance(attribute, ZfsProperty) and property_name in self._properties
         )
 
 
-def get_datasets() -> list[Dataset]:
+def create_snapshots(datasets: Sequence[Dataset], snapshot_name: str) -> dict[str, str]:
+    """Creates a zfs snapshot of every dataset with one call per pool.
+
+    `zfs snapshot a@name b@name ...` creates all of the snapshots in one transaction group, or none of them.
+    A single call can not span pools, so the datasets of each pool are snapshotted separately.
+    If the command fails each dataset falls back to Dataset.create_snapshot.
+
+    Args:
+        datasets (Sequence[Dataset]): the datasets to snapshot
+        snapshot_name (str): a snapshot name
+
+    Returns:
+        dict[str, str]: The status of each dataset, "snapshot created" if it succeeded.
+    """
+    datasets_by_snapshot = {f"{dataset.name}@{snapshot_name}": dataset for dataset in datasets}
+    snapshots_by_pool: dict[str, list[str]] = {}
+    for snapshot, dataset in datasets_by_snapshot.items():
+        snapshots_by_pool.setdefault(dataset.name.split("/")[0], []).append(snapshot)
+
+    statuses: dict[str, str] = {}
+    batches = (batch for snapshots in snapshots_by_pool.values() for batch in _batches(snapshots, MAX_COMMAND_LENGTH))
+    for batch in batches:
+        logging.debug(f"Creating {len(batch)} snapshots {snapshot_name}")
+        _, return_code = bash_wrapper(f"zfs snapshot {' '.join(batch)}")
+        if return_code == 0:
+            statuses.update({datasets_by_snapshot[snapshot].name: "snapshot created" for snapshot in batch})
+            continue
+
+        logging.warning(f"Failed to create {len(batch)} snapshots at once, creating them one at a time")
+        for snapshot in batch:
+            dataset = datasets_by_snapshot[snapshot]
+            statuses[dataset.name] = dataset.create_snapshot(snapshot_name)
+
+    return statuses
+
+
+def iter_datasets(root: str | None = None, fields: Sequence[str] | None = None) -> Iterator[Dataset]:
+    """Yield each dataset as it is parsed from a single `zfs list` call.
+
+    Args:
+        root (str | None, optional): Only list this pool or dataset and its children. Defaults to None.
+        fields (Sequence[str] | None, optional): The dataset properties to fetch.
+            None fetches all of them. Defaults to None.
+
+    Yields:
+        Dataset: The zfs datasets, pools are skipped.
+    """
+    command = f"zfs list -t filesystem -pHj -o {projection(fields)}"
+    if root:
+        command += f" -r {root}"
+
+    for dataset_name, dataset_data in _zfs_list_stream(command):
+        if "/" in dataset_name:
+            yield Dataset(dataset_name, dataset_data["properties"])
+
+
+def get_datasets(root: str | None = None, fields: Sequence[str] | None = None) -> list[Dataset]:
     """Get zfs list.
 
+    All datasets are loaded with a single `zfs list` call.
+
+    Args:
+        root (str | None, optional): Only list this pool or dataset and its children. Defaults to None.
+        fields (Sequence[str] | None, optional): The dataset properties to fetch.
+            None fetches all of them. Defaults to None.
+
     Returns:
         list[Dataset]: A list of zfs datasets.
     """
     logging.info("Getting zfs list")
 
-    dataset_names, _ = bash_wrapper("zfs list -Hp -t filesystem -o name")
+    return list(iter_datasets(root, fields))
+
+
+async def async_get_datasets(
+    root: str | None = None,
+    fields: Sequence[str] | None = None,
+    semaphore: Semaphore | None = None,
+) -> list[Dataset]:
+    """Get zfs list without blocking the event loop.
+
+    All datasets are loaded with a single `zfs list` call.
+
+    Args:
+        root (str | None, optional): Only list this pool or dataset and its children. Defaults to None.
+        fields (Sequence[str] | None, optional): The dataset properties to fetch.
+            None fetches all of them. Defaults to None.
+        semaphore (Semaphore | None, optional): Limits how many commands run at once. Defaults to None.
+
+    Returns:
+        list[Dataset]: A list of zfs datasets, pools are skipped.
+    """
+    command = f"zfs list -t filesystem -pHj -o {projection(fields)}"
+    if root:
+        command += f" -r {root}"
+
+    raw_zfs_list_data, _ = await async_bash_wrapper(command, semaphore)
+    zfs_list_data = json.loads(raw_zfs_list_data)
+    _check_output_version(zfs_list_data["output_version"])
+
+    return [
+        Dataset(dataset_name, dataset_data["properties"])
+        for dataset_name, dataset_data in zfs_list_data["datasets"].items()
+        if "/" in dataset_name
+    ]
+
+
+def iter_snapshots(root: str | None = None, fields: Sequence[str] | None = None) -> Iterator[Snapshot]:
+    """Yield each snapshot as it is parsed from a single `zfs list` call.
+
+    Args:
+        root (str | None, optional): Only list snapshots of this pool or dataset and its children. Defaults to None.
+        fields (Sequence[str] | None, optional): The snapshot properties to fetch.
+            None fetches all of them. Defaults to None.
+
+    Yields:
+        Snapshot: The zfs snapshots.
+    """
+    command = f"zfs list -t snapshot -pHj -o {projection(fields)}"
+    if root:
+        command += f" -r {root}"
+
+    for _, snapshot_data in _zfs_list_stream(command):
+        yield Snapshot(snapshot_data)
+
+
+def iter_snapshot_properties(snapshot_names: Sequence[str], fields: Sequence[str]) -> Iterator[Snapshot]:
+    """Yield the properties of named snapshots with as few `zfs get` calls as the command length allows.
+
+    Snapshots that no longer exist are logged by zfs and skipped.
+
+    Args:
+        snapshot_names (Sequence[str]): The full names of the snapshots, `dataset@snapshot`.
+        fields (Sequence[str]): The snapshot properties to fetch.
+
+    Yields:
+        Snapshot: The zfs snapshots.
+    """
+    for batch in _batches(snapshot_names, MAX_COMMAND_LENGTH):
+        command = f"zfs get -pHj {','.join(fields)} {' '.join(batch)}"
+        for _, snapshot_data in _zfs_list_stream(command, "zfs get", check=False):
+            yield Snapshot(snapshot_data)
+
+
+def get_snapshots_by_dataset(
+    root: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> dict[str, list[Snapshot]]:
+    """Get all snapshots with a single `zfs list` call.
+
+    Args:
+        root (str | None, optional): Only list snapshots of this pool or dataset and its children. Defaults to None.
+        fields (Sequence[str] | None, optional): The snapshot properties to fetch.
+            None fetches all of them. Defaults to None.
+
+    Returns:
+        dict[str, list[Snapshot]]: The snapshots keyed by the name of the dataset they belong to.
+    """
+    logging.info("Getting zfs snapshot list")
 
-    cleaned_datasets = dataset_names.strip().split("\n")
+    snapshots_by_dataset: dict[str, list[Snapshot]] = defaultdict(list)
+    for snapshot in iter_snapshots(root, fields):
+        snapshots_by_dataset[snapshot.dataset].append(snapshot)
 
-    return [Dataset(dataset_name) for dataset_name in cleaned_datasets if "/" in dataset_name]
+    return dict(snapshots_by_dataset)
@@ -0,0 +1,171 @@
+"""inventory."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections import defaultdict
+from typing import TYPE_CHECKING, Self
+
+from system_tools.zfs.dataset import Snapshot, iter_snapshot_properties, iter_snapshots
+from system_tools.zfs.zpool import Zpool
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+    from types import TracebackType
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    name TEXT PRIMARY KEY,
+    guid TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    pool TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    name TEXT NOT NULL,
+    createtxg INTEGER NOT NULL,
+    creation INTEGER NOT NULL,
+    PRIMARY KEY (pool, guid)
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_dataset ON snapshots (pool, dataset, createtxg);
+"""
+
+
+class SnapshotInventory:
+    """Snapshot inventory cached in SQLite and refreshed incrementally.
+
+    Snapshots never change once they are taken, so a refresh only lists the guid and createtxg of each snapshot.
+    Snapshots the cache has not seen get their creation time fetched, snapshots that are gone are dropped.
+    A pool whose guid changed, because it was recreated or replaced by another pool of the same name, is reloaded.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """__init__.
+
+        Args:
+            path (Path): The path to the SQLite database, created if it does not exist.
+        """
+        self.path = path
+        # The snapshot_manager daemon opens the inventory once and uses it from one scheduler job at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        (user_version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if user_version != SCHEMA_VERSION:
+            logging.info(f"Creating snapshot inventory {path} {user_version=}")
+            with self.connection:
+                self.connection.execute("DROP TABLE IF EXISTS snapshots")
+                self.connection.execute("DROP TABLE IF EXISTS pools")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def refresh(self, pool: str) -> None:
+        """Bring the cached snapshots of a pool up to date.
+
+        Args:
+            pool (str): The name of the pool.
+        """
+        pool_guid = str(Zpool(pool, fields=("guid",)).guid)
+
+        with self.connection:
+            row = self.connection.execute("SELECT guid FROM pools WHERE name = ?", (pool,)).fetchone()
+            if row is None or row[0] != pool_guid:
+                if row is not None:
+                    logging.warning(f"{pool} guid changed from {row[0]} to {pool_guid}, reloading its snapshots")
+                self.connection.execute("DELETE FROM snapshots WHERE pool = ?", (pool,))
+                self.connection.execute("INSERT OR REPLACE INTO pools VALUES (?, ?)", (pool, pool_guid))
+
+            cached_guids = {
+                guid for (guid,) in self.connection.execute("SELECT guid FROM snapshots WHERE pool = ?", (pool,))
+            }
+
+            listed_guids: set[str] = set()
+            new_snapshots: list[str] = []
+            for snapshot in iter_snapshots(pool, fields=("guid",)):
+                guid = str(snapshot.guid)
+                listed_guids.add(guid)
+                if guid not in cached_guids:
+                    new_snapshots.append(f"{snapshot.dataset}@{snapshot.name}")
+
+            removed_guids = cached_guids - listed_guids
+            self.connection.executemany(
+                "DELETE FROM snapshots WHERE pool = ? AND guid = ?",
+                ((pool, guid) for guid in removed_guids),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        pool,
+                        str(snapshot.guid),
+                        snapshot.dataset,
+                        snapshot.name,
+                        snapshot.createtxg,
+                        int(snapshot.creation.timestamp()),
+                    )
+                    for snapshot in iter_snapshot_properties(new_snapshots, ("guid", "creation"))
+                ),
+            )
+
+        logging.info(f"{pool} snapshot inventory {len(new_snapshots)} added {len(removed_guids)} removed")
+
+    def snapshots_by_dataset(self, pool: str) -> dict[str, list[Snapshot]]:
+        """Get the cached snapshots of a pool, oldest first.
+
+        Args:
+            pool (str): The name of the pool.
+
+        Returns:
+            dict[str, list[Snapshot]]: The snapshots keyed by the name of the dataset they belong to.
+        """
+        snapshots_by_dataset: dict[str, list[Snapshot]] = defaultdict(list)
+        for dataset, name, guid, createtxg, creation in self.connection.execute(
+            "SELECT dataset, name, guid, createtxg, creation FROM snapshots WHERE pool = ? ORDER BY dataset, createtxg",
+            (pool,),
+        ):
+            snapshot = Snapshot(
+                {
+                    "name": f"{dataset}@{name}",
+                    "createtxg": createtxg,
+                    "properties": {"guid": {"value": guid}, "creation": {"value": creation}},
+                }
+            )
+            snapshots_by_dataset[snapshot.dataset].append(snapshot)
+
+        return dict(snapshots_by_dataset)
+
+    def load(self, pools: Iterable[str]) -> dict[str, list[Snapshot]]:
+        """Refresh the pools and get their snapshots.
+
+        Args:
+            pools (Iterable[str]): The names of the pools.
+
+        Returns:
+            dict[str, list[Snapshot]]: The snapshots keyed by the name of the dataset they belong to.
+        """
+        snapshots_by_dataset: dict[str, list[Snapshot]] = {}
+        for pool in pools:
+            self.refresh(pool)
+            snapshots_by_dataset.update(self.snapshots_by_dataset(pool))
+
+        return snapshots_by_dataset
+
+    def close(self) -> None:
+        """Close the database."""
+        self.connection.close()
+
+    def __enter__(self) -> Self:
+        """__enter__."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """__exit__."""
+        self.close()
@@ -0,0 +1,375 @@
+"""iostat."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from re import compile as re_compile
+from statistics import median
+from subprocess import PIPE, Popen, TimeoutExpired
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Self
+
+from system_tools.common import run_command
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+    from types import TracebackType
+
+    from system_tools.common import TextfileMetrics
+
+# Top level vdevs group the disks listed after them, `zpool iostat -H` does not indent the vdev tree
+GROUP_VDEV = re_compile(r"(mirror|raidz[1-3]?|draid[1-3]?\S*|replacing|spare)-\d+")
+# Allocation classes, the vdevs listed after them are top level vdevs of their own
+VDEV_CLASSES = frozenset(("logs", "cache", "spares", "special", "dedup"))
+
+NANOSECONDS = 1_000_000_000
+
+
+def _value(field: str) -> int | None:
+    """Parse a `zpool iostat -p` field, `-` when there is nothing to report."""
+    return None if field == "-" else int(field)
+
+
+@dataclass(frozen=True)
+class VdevIostat:
+    """The I/O of a pool or vdev over one interval, latencies are the average total wait in nanoseconds.
+
+    `parent` is the top level vdev, mirror-0 for example, a disk belongs to.
+    It is None for the pool itself, its top level vdevs and single disk vdevs.
+    """
+
+    pool: str
+    name: str
+    parent: str | None
+    read_ops: int
+    write_ops: int
+    read_bytes: int
+    write_bytes: int
+    read_wait: int | None
+    write_wait: int | None
+    read_disk_wait: int | None
+    write_disk_wait: int | None
+
+    @property
+    def is_pool(self) -> bool:
+        """The row of the pool itself."""
+        return self.name == self.pool and self.parent is None
+
+
+class ZpoolIostatParser:
+    """Parse `zpool iostat -Hpvl` output line by line into intervals."""
+
+    def __init__(self, pool_names: Sequence[str]) -> None:
+        """__init__.
+
+        Args:
+            pool_names (Sequence[str]): The pools zpool iostat was called with.
+        """
+        self.pool_names = frozenset(pool_names)
+        self._interval: list[VdevIostat] = []
+        self._seen_pools: set[str] = set()
+        self._pool: str | None = None
+        self._parent: str | None = None
+
+    def feed(self, line: str) -> list[VdevIostat] | None:
+        """Parse a line.
+
+        Args:
+            line (str): A line of zpool iostat output.
+
+        Returns:
+            list[VdevIostat] | None: The previous interval once the line starts a new one.
+        """
+        fields = line.split("\t")
+        # name, alloc, free, read and write ops, read and write bandwidth, total_wait and disk_wait read and write
+        if len(fields) < 11:  # noqa: PLR2004
+            return None
+
+        name = fields[0].strip()
+        completed = None
+        if name in self.pool_names:
+            if name in self._seen_pools:
+                completed = self.flush()
+            self._seen_pools.add(name)
+            self._pool = name
+            self._parent = None
+        elif self._pool is None:
+            return None
+        elif name in VDEV_CLASSES:
+            self._parent = None
+            return None
+
+        parent = self._parent
+        if GROUP_VDEV.fullmatch(name):
+            parent = None
+            self._parent = name
+
+        read_ops, write_ops, read_bytes, write_bytes = (_value(field) or 0 for field in fields[3:7])
+        self._interval.append(
+            VdevIostat(
+                self._pool,
+                name,
+                parent,
+                read_ops,
+                write_ops,
+                read_bytes,
+                write_bytes,
+                *(_value(field) for field in fields[7:11]),
+            )
+        )
+        return completed
+
+    def flush(self) -> list[VdevIostat] | None:
+        """End the current interval.
+
+        Returns:
+            list[VdevIostat] | None: The interval, None if it is empty.
+        """
+        interval = self._interval
+        self._interval = []
+        self._seen_pools = set()
+        self._pool = None
+        self._parent = None
+        return interval or None
+
+
+def _iostat_command(pool_names: Sequence[str], interval_secs: int, count: int | None = None) -> str:
+    return f"zpool iostat -Hpvl {' '.join(pool_names)} {interval_secs}" + (f" {count}" if count else "")
+
+
+def sample_zpool_iostat(pool_names: Sequence[str], interval_secs: int = 1) -> list[VdevIostat]:
+    """Measure the I/O of pools over one interval.
+
+    The first report of zpool iostat averages everything since the pool was imported, so two are read
+    and the second is returned.
+
+    Args:
+        pool_names (Sequence[str]): The names of the pools.
+        interval_secs (int, optional): The length of the interval in seconds. Defaults to 1.
+
+    Returns:
+        list[VdevIostat]: The I/O of each pool and vdev.
+    """
+    parser = ZpoolIostatParser(pool_names)
+    intervals: list[list[VdevIostat]] = []
+
+    def on_line(line: str) -> None:
+        if interval := parser.feed(line.rstrip("\n")):
+            intervals.append(interval)
+
+    command = _iostat_command(pool_names, interval_secs, 2)
+    result = run_command(command, timeout=interval_secs * 2 + 30, on_stdout=on_line)
+    if interval := parser.flush():
+        intervals.append(interval)
+
+    if result.returncode != 0 or len(intervals) < 2:  # noqa: PLR2004
+        error = f"zpool iostat returned {len(intervals)} intervals: {result.stderr.strip()}"
+        raise RuntimeError(error)
+
+    return intervals[-1]
+
+
+class ZpoolIostatSampler:
+    """Keep a `zpool iostat` child running and parse each interval as it is printed.
+
+    The report averaged since the pools were imported is skipped.
+    """
+
+    def __init__(
+        self,
+        pool_names: Sequence[str],
+        interval_secs: int = 1,
+        on_interval: Callable[[list[VdevIostat]], None] | None = None,
+    ) -> None:
+        """__init__.
+
+        Args:
+            pool_names (Sequence[str]): The names of the pools.
+            interval_secs (int, optional): The length of each interval in seconds. Defaults to 1.
+            on_interval (Callable[[list[VdevIostat]], None] | None, optional): Called with each interval
+                from the reader thread. Defaults to None.
+        """
+        self.pool_names = tuple(pool_names)
+        self.interval_secs = interval_secs
+        self.on_interval = on_interval
+        self.intervals = 0
+
+        self._latest: list[VdevIostat] = []
+        self._lock = Lock()
+        self._process: Popen[str] | None = None
+        self._reader: Thread | None = None
+        self._stopping = False
+
+    @property
+    def latest(self) -> list[VdevIostat]:
+        """The last complete interval, empty until one was read."""
+        with self._lock:
+            return self._latest
+
+    @property
+    def running(self) -> bool:
+        """Whether zpool iostat is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """Start zpool iostat, a restart skips the report since the pools were imported again."""
+        self.intervals = 0
+        self._stopping = False
+        with self._lock:
+            self._latest = []
+        # This is a acceptable risk
+        self._process = Popen(
+            _iostat_command(self.pool_names, self.interval_secs).split(),
+            stdout=PIPE,
+            stderr=PIPE,
+            text=True,
+        )
+        self._reader = Thread(target=self._read, name="zpool-iostat", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        """Parse the output of zpool iostat until it exits."""
+        if self._process is None or self._process.stdout is None or self._process.stderr is None:
+            return
+
+        parser = ZpoolIostatParser(self.pool_names)
+        for line in self._process.stdout:
+            if interval := parser.feed(line.rstrip("\n")):
+                self._add_interval(interval)
+
+        stderr = self._process.stderr.read()
+        returncode = self._process.wait()
+        if self._stopping:
+            return
+        # The last interval is only known to be complete when zpool iostat exits by itself
+        if returncode == 0 and (interval := parser.flush()):
+            self._add_interval(interval)
+        if returncode != 0:
+            logging.error(f"zpool iostat exited with {returncode}: {stderr.strip()}")
+
+    def _add_interval(self, interval: list[VdevIostat]) -> None:
+        self.intervals += 1
+        if self.intervals == 1:
+            return
+
+        with self._lock:
+            self._latest = interval
+        if self.on_interval:
+            try:
+                self.on_interval(interval)
+            except Exception:
+                logging.exception("zpool iostat interval callback failed")
+
+    def stop(self, kill_after: float = 5) -> None:
+        """Stop zpool iostat.
+
+        Args:
+            kill_after (float, optional): The seconds between SIGTERM and SIGKILL. Defaults to 5.
+        """
+        if self._process is None:
+            return
+
+        self._stopping = True
+        self._process.terminate()
+        try:
+            self._process.wait(kill_after)
+        except TimeoutExpired:
+            self._process.kill()
+        if self._reader:
+            self._reader.join(kill_after)
+
+    def __enter__(self) -> Self:
+        """__enter__."""
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """__exit__."""
+        self.stop()
+
+
+def mirror_latency_errors(
+    samples: Sequence[VdevIostat],
+    max_ratio: float = 5.0,
+    min_wait_secs: float = 0.01,
+) -> list[str]:
+    """Find disks that are much slower than the other disks of their mirror.
+
+    A disk is flagged when its read or write wait is more than max_ratio times the median of its partners
+    and above min_wait_secs, so idle disks with near zero waits are not compared.
+    Partners without operations in that direction have no wait to compare with and are left out.
+
+    Args:
+        samples (Sequence[VdevIostat]): One interval of zpool iostat.
+        max_ratio (float, optional): How many times slower than its partners a disk may be. Defaults to 5.0.
+        min_wait_secs (float, optional): The wait below which a disk is never flagged. Defaults to 0.01.
+
+    Returns:
+        list[str]: A list of errors if any.
+    """
+    mirrors: dict[tuple[str, str], list[VdevIostat]] = {}
+    for sample in samples:
+        if sample.parent and sample.parent.startswith("mirror-"):
+            mirrors.setdefault((sample.pool, sample.parent), []).append(sample)
+
+    errors: list[str] = []
+    for (pool, mirror), disks in mirrors.items():
+        for disk in disks:
+            partners = [partner for partner in disks if partner is not disk]
+            for direction in ("read", "write"):
+                wait = getattr(disk, f"{direction}_wait")
+                partner_waits = [
+                    partner_wait
+                    for partner in partners
+                    if getattr(partner, f"{direction}_ops")
+                    and (partner_wait := getattr(partner, f"{direction}_wait")) is not None
+                ]
+                if wait is None or not partner_waits or wait < min_wait_secs * NANOSECONDS:
+                    continue
+
+                partner_wait = median(partner_waits)
+                if wait > max_ratio * partner_wait:
+                    ratio = f"{wait / partner_wait:.1f}x" if partner_wait else "above"
+                    errors.append(
+                        f"{pool} {mirror} {disk.name} {direction} latency {wait / 1_000_000:.1f}ms "
+                        f"is {ratio} the {partner_wait / 1_000_000:.1f}ms of its mirror partners"
+                    )
+    return errors
+
+
+def record_iostat_metrics(metrics: TextfileMetrics, samples: Sequence[VdevIostat]) -> None:
+    """Record the operations, bandwidth and latency of each pool and vdev.
+
+    Args:
+        metrics (TextfileMetrics): The metrics.
+        samples (Sequence[VdevIostat]): One interval of zpool iostat.
+    """
+    for sample in samples:
+        labels = {"pool": sample.pool, "vdev": sample.name, "parent": sample.parent or ""}
+        for direction in ("read", "write"):
+            direction_labels = labels | {"direction": direction}
+            metrics.add(
+                "zpool_vdev_operations_per_second",
+                getattr(sample, f"{direction}_ops"),
+                "The operations per second of the vdev.",
+                direction_labels,
+            )
+            metrics.add(
+                "zpool_vdev_bytes_per_second",
+                getattr(sample, f"{direction}_bytes"),
+                "The bandwidth of the vdev.",
+                direction_labels,
+            )
+            if (wait := getattr(sample, f"{direction}_wait")) is not None:
+                metrics.add(
+                    "zpool_vdev_wait_seconds",
+                    wait / NANOSECONDS,
+                    "The average total wait of the operations of the vdev.",
+                    direction_labels,
+                )
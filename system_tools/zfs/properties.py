@@ -0,0 +1,97 @@
+"""properties."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any, Generic, Self, TypeVar, overload
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+T = TypeVar("T")
+
+
+def to_datetime(value: str) -> datetime:
+    """Convert a zfs timestamp to a datetime.
+
+    Args:
+        value (str): The timestamp in seconds since the epoch.
+
+    Returns:
+        datetime: The timestamp as a UTC datetime.
+    """
+    return datetime.fromtimestamp(int(value), tz=UTC)
+
+
+def projection(properties: Sequence[str] | None) -> str:
+    """Get the `-o` argument for a zfs or zpool list command.
+
+    Args:
+        properties (Sequence[str] | None): The properties to fetch. None fetches all of them.
+
+    Returns:
+        str: The comma separated list of properties.
+    """
+    if properties is None:
+        return "all"
+
+    return ",".join(dict.fromkeys(("name", *properties)))
+
+
+def property_slots(namespace: dict[str, Any]) -> tuple[str, ...]:
+    """Get the slots that cache the ZfsProperty values of a class.
+
+    Args:
+        namespace (dict[str, Any]): The namespace of the class body, `vars()`.
+
+    Returns:
+        tuple[str, ...]: A slot for each ZfsProperty.
+    """
+    return tuple(f"_{name}" for name, attribute in namespace.items() if isinstance(attribute, ZfsProperty))
+
+
+class ZfsProperty(Generic[T]):
+    """A zfs property that is converted from the raw `-j` output on first access.
+
+    The converted value is cached in the `_<name>` slot of the instance.
+    """
+
+    def __init__(self, converter: Callable[[str], T]) -> None:
+        """__init__.
+
+        Args:
+            converter (Callable[[str], T]): Converts the raw value of the property.
+        """
+        self.converter = converter
+        self.name = ""
+        self.slot = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        """__set_name__."""
+        self.name = name
+        self.slot = f"_{name}"
+
+    @overload
+    def __get__(self, instance: None, owner: type) -> Self: ...
+
+    @overload
+    def __get__(self, instance: object, owner: type) -> T: ...
+
+    def __get__(self, instance: object | None, owner: type) -> Self | T:
+        """Convert the raw property and cache it on the instance."""
+        if instance is None:
+            return self
+
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            pass
+
+        raw_properties: dict[str, Any] = instance._properties  # type: ignore[attr-defined]  # noqa: SLF001
+        if self.name not in raw_properties:
+            error = f"{self.name} was not loaded, add it to the requested properties"
+            raise AttributeError(error)
+
+        value = self.converter(raw_properties[self.name]["value"])
+        setattr(instance, self.slot, value)
+        return value
@@ -0,0 +1,121 @@
+"""snapshot_table."""
+
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+from system_tools.zfs.dataset import iter_snapshots
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from system_tools.zfs.dataset import Snapshot
+
+
+class SnapshotTable:
+    """Columnar snapshot inventory backed by a polars DataFrame.
+
+    One row per snapshot with the columns dataset, name, createtxg, creation, guid, used, referenced and written.
+    """
+
+    FIELDS = ("creation", "guid", "referenced", "used", "written")
+
+    def __init__(self, frame: pl.DataFrame) -> None:
+        """__init__.
+
+        Args:
+            frame (pl.DataFrame): The snapshot inventory.
+        """
+        self.frame = frame
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Iterable[Snapshot]) -> SnapshotTable:
+        """Build a SnapshotTable from snapshots.
+
+        Only the columns are kept, so the snapshots can be a generator that is never held in memory.
+
+        Args:
+            snapshots (Iterable[Snapshot]): Snapshots loaded with at least the FIELDS properties.
+
+        Returns:
+            SnapshotTable: The snapshot inventory.
+        """
+        datasets: list[str] = []
+        names: list[str] = []
+        createtxgs = array("q")
+        creations = array("q")
+        guids = array("Q")
+        used = array("q")
+        referenced = array("q")
+        written = array("q")
+
+        for snapshot in snapshots:
+            datasets.append(snapshot.dataset)
+            names.append(snapshot.name)
+            createtxgs.append(snapshot.createtxg)
+            creations.append(int(snapshot.creation.timestamp()))
+            guids.append(snapshot.guid)
+            used.append(snapshot.used)
+            referenced.append(snapshot.referenced)
+            written.append(snapshot.written)
+
+        frame = pl.DataFrame(
+            {
+                "dataset": pl.Series(datasets, dtype=pl.Categorical),
+                "name": pl.Series(names, dtype=pl.String),
+                "createtxg": pl.Series(createtxgs, dtype=pl.Int64),
+                "creation": pl.from_epoch(pl.Series(creations, dtype=pl.Int64), time_unit="s").dt.replace_time_zone(
+                    "UTC"
+                ),
+                "guid": pl.Series(guids, dtype=pl.UInt64),
+                "used": pl.Series(used, dtype=pl.Int64),
+                "referenced": pl.Series(referenced, dtype=pl.Int64),
+                "written": pl.Series(written, dtype=pl.Int64),
+            }
+        )
+        return cls(frame)
+
+    @classmethod
+    def load(cls, root: str | None = None) -> SnapshotTable:
+        """Load every snapshot with a single streamed `zfs list` call.
+
+        Args:
+            root (str | None, optional): Only list snapshots of this pool or dataset and its children. Defaults to None.
+
+        Returns:
+            SnapshotTable: The snapshot inventory.
+        """
+        return cls.from_snapshots(iter_snapshots(root, cls.FIELDS))
+
+    def for_dataset(self, dataset_name: str) -> pl.DataFrame:
+        """Get the snapshots of one dataset ordered by createtxg.
+
+        Args:
+            dataset_name (str): The name of the dataset.
+
+        Returns:
+            pl.DataFrame: The snapshots of the dataset.
+        """
+        return self.frame.filter(pl.col("dataset") == dataset_name).sort("createtxg")
+
+    def by_dataset(self) -> dict[str, pl.DataFrame]:
+        """Split the inventory by dataset.
+
+        Returns:
+            dict[str, pl.DataFrame]: The snapshots keyed by the name of the dataset they belong to.
+        """
+        return {
+            str(dataset_name): frame
+            for (dataset_name,), frame in self.frame.sort("createtxg").partition_by("dataset", as_dict=True).items()
+        }
+
+    def __len__(self) -> int:
+        """__len__."""
+        return self.frame.height
+
+    def __repr__(self) -> str:
+        """__repr__."""
+        return f"SnapshotTable(snapshots={len(self)} datasets={self.frame['dataset'].n_unique()})"
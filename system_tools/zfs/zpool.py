@@ -3,15 +3,25 @@
 from __future__ import annotations
 
 import json
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from system_tools.common import bash_wrapper
+from system_tools.common import async_bash_wrapper, bash_wrapper
+from system_tools.zfs.properties import ZfsProperty, projection, property_slots
+
+if TYPE_CHECKING:
+    from asyncio import Semaphore
+    from collections.abc import Sequence
 
 
 def _zpool_list(zfs_list: str) -> dict[str, Any]:
     """Check the version of zfs."""
     raw_zfs_list_data, _ = bash_wrapper(zfs_list)
 
+    return _check_zpool_list(raw_zfs_list_data)
+
+
+def _check_zpool_list(raw_zfs_list_data: str) -> dict[str, Any]:
+    """Parse the zpool list json output and check its version."""
     zfs_list_data = json.loads(raw_zfs_list_data)
 
     vers_major = zfs_list_data["output_version"]["vers_major"]
@@ -28,59 +38,101 @@ def _zpool_list(zfs_list: str) -> dict[str, Any]:
 class Zpool:
     """Zpool."""
 
+    allocated = ZfsProperty(int)
+    altroot = ZfsProperty(str)
+    ashift = ZfsProperty(int)
+    autoexpand = ZfsProperty(str)
+    autoreplace = ZfsProperty(str)
+    autotrim = ZfsProperty(str)
+    capacity = ZfsProperty(int)
+    comment = ZfsProperty(str)
+    dedupratio = ZfsProperty(str)
+    delegation = ZfsProperty(str)
+    expandsize = ZfsProperty(str)
+    failmode = ZfsProperty(str)
+    fragmentation = ZfsProperty(int)
+    free = ZfsProperty(str)
+    freeing = ZfsProperty(int)
+    guid = ZfsProperty(int)
+    health = ZfsProperty(str)
+    leaked = ZfsProperty(int)
+    readonly = ZfsProperty(str)
+    size = ZfsProperty(int)
+
+    __slots__ = ("_properties", "name", *property_slots(vars()))
+
     def __init__(
         self,
         name: str,
+        properties: dict[str, Any] | None = None,
+        fields: Sequence[str] | None = None,
     ) -> None:
-        """__init__."""
-        zpool_data = _zpool_list(f"zpool list {name} -pHj -o all")
-
-        properties = zpool_data["pools"][name]["properties"]
-
+        """__init__.
+
+        Args:
+            name (str): The name of the zpool.
+            properties (dict[str, Any] | None, optional): The zpool properties from `zpool list -j`.
+                Fetched with `zpool list` when not provided. Defaults to None.
+            fields (Sequence[str] | None, optional): The zpool properties to fetch when properties is not provided.
+                None fetches all of them. Defaults to None.
+        """
+        if properties is None:
+            zpool_data = _zpool_list(f"zpool list {name} -pHj -o {projection(fields)}")
+            properties = zpool_data["pools"][name]["properties"]
+
+        self._properties: dict[str, Any] = properties
         self.name = name
 
-        self.allocated = int(properties["allocated"]["value"])
-        self.altroot = properties["altroot"]["value"]
-        self.ashift = int(properties["ashift"]["value"])
-        self.autoexpand = properties["autoexpand"]["value"]
-        self.autoreplace = properties["autoreplace"]["value"]
-        self.autotrim = properties["autotrim"]["value"]
-        self.capacity = int(properties["capacity"]["value"])
-        self.comment = properties["comment"]["value"]
-        self.dedupratio = properties["dedupratio"]["value"]
-        self.delegation = properties["delegation"]["value"]
-        self.expandsize = properties["expandsize"]["value"]
-        self.failmode = properties["failmode"]["value"]
-        self.fragmentation = int(properties["fragmentation"]["value"])
-        self.free = properties["free"]["value"]
-        self.freeing = int(properties["freeing"]["value"])
-        self.guid = int(properties["guid"]["value"])
-        self.health = properties["health"]["value"]
-        self.leaked = int(properties["leaked"]["value"])
-        self.readonly = properties["readonly"]["value"]
-        self.size = int(properties["size"]["value"])
-
     def __repr__(self) -> str:
         """__repr__."""
-        return (
-            f"{self.name=}\n"
-            f"{self.allocated=}\n"
-            f"{self.altroot=}\n"
-            f"{self.ashift=}\n"
-            f"{self.autoexpand=}\n"
-            f"{self.autoreplace=}\n"
-            f"{self.autotrim=}\n"
-            f"{self.capacity=}\n"
-            f"{self.comment=}\n"
-            f"{self.dedupratio=}\n"
-            f"{self.delegation=}\n"
-            f"{self.expandsize=}\n"
-            f"{self.failmode=}\n"
-            f"{self.fragmentation=}\n"
-            f"{self.freeing=}\n"
-            f"{self.guid=}\n"
-            f"{self.health=}\n"
-            f"{self.leaked=}\n"
-            f"{self.readonly=}\n"
-            f"{self.size=}"
+        return f"self.name={self.name!r}\n" + "\n".join(
+            f"self.{property_name}={getattr(self, property_name)!r}"
+            for property_name, attribute in vars(Zpool).items()
+            if isinstance(attribute, ZfsProperty) and property_name in self._properties
         )
+
+
+def get_zpools(pool_names: Sequence[str], fields: Sequence[str] | None = None) -> list[Zpool]:
+    """Get zpools with a single `zpool list` call.
+
+    Args:
+        pool_names (Sequence[str]): The names of the zpools.
+        fields (Sequence[str] | None, optional): The zpool properties to fetch. None fetches all of them.
+            Defaults to None.
+
+    Returns:
+        list[Zpool]: The zpools in the order of pool_names.
+    """
+    if not pool_names:
+        return []
+
+    zpool_data = _zpool_list(f"zpool list {' '.join(pool_names)} -pHj -o {projection(fields)}")
+
+    return [Zpool(name, properties=zpool_data["pools"][name]["properties"]) for name in pool_names]
+
+
+async def async_get_zpools(
+    pool_names: Sequence[str],
+    fields: Sequence[str] | None = None,
+    semaphore: Semaphore | None = None,
+) -> list[Zpool]:
+    """Get zpools without blocking the event loop.
+
+    All pools are loaded with a single `zpool list` call.
+
+    Args:
+        pool_names (Sequence[str]): The names of the zpools.
+        fields (Sequence[str] | None, optional): The zpool properties to fetch. None fetches all of them.
+            Defaults to None.
+        semaphore (Semaphore | None, optional): Limits how many commands run at once. Defaults to None.
+
+    Returns:
+        list[Zpool]: The zpools in the order of pool_names.
+    """
+    raw_zpool_data, _ = await async_bash_wrapper(
+        f"zpool list {' '.join(pool_names)} -pHj -o {projection(fields)}",
+        semaphore,
+    )
+    zpool_data = _check_zpool_list(raw_zpool_data)
+
+    return [Zpool(name, properties=zpool_data["pools"][name]["properties"]) for name in pool_names]
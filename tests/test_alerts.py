@@ -0,0 +1,150 @@
+"""test_alerts."""
+
+from __future__ import annotations
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from system_tools.common.alerts import AlertDispatcher, format_digest, get_alert_dispatcher
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pytest_mock import MockerFixture
+
+
+class SignalGateway(ThreadingHTTPServer):
+    """Stub signal-cli REST API that records the messages it is sent."""
+
+    def __init__(self) -> None:
+        """__init__."""
+        super().__init__(("127.0.0.1", 0), SignalHandler)
+        self.messages: list[dict[str, Any]] = []
+        self.delay = 0.0
+
+    @property
+    def host(self) -> str:
+        """The host and port of the gateway."""
+        host, port = self.server_address[:2]
+        return f"{host!s}:{port}"
+
+
+class SignalHandler(BaseHTTPRequestHandler):
+    """Record posted messages."""
+
+    server: SignalGateway
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Handle a send."""
+        sleep(self.server.delay)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.messages.append({"path": self.path, **json.loads(body)})
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """Keep the test output quiet."""
+
+
+@pytest.fixture
+def signal_gateway() -> Iterator[SignalGateway]:
+    """Run a stub signal gateway."""
+    gateway = SignalGateway()
+    thread = Thread(target=gateway.serve_forever, daemon=True)
+    thread.start()
+    yield gateway
+    gateway.shutdown()
+    gateway.server_close()
+
+
+def test_alert_dispatcher_digest(signal_gateway: SignalGateway) -> None:
+    """Test alerts within the window are deduplicated and sent as one message."""
+    dispatcher = AlertDispatcher(f"signal://{signal_gateway.host}/1234567890/0987654321", window_secs=0.2)
+
+    dispatcher.send("pool is DEGRADED")
+    dispatcher.send("docker is failed", title="systemd")
+    dispatcher.send("pool is DEGRADED")
+    assert signal_gateway.messages == []
+
+    assert dispatcher.flush(timeout=10)
+    dispatcher.close()
+
+    assert len(signal_gateway.messages) == 1
+    message = signal_gateway.messages[0]
+    assert message["path"] == "/v2/send"
+    assert message["number"] == "+1234567890"
+    assert message["recipients"] == ["+0987654321"]
+    assert "3 alerts" in message["message"]
+    assert "pool is DEGRADED (x2)" in message["message"]
+    assert "systemd: docker is failed" in message["message"]
+
+
+def test_alert_dispatcher_send_does_not_block(signal_gateway: SignalGateway) -> None:
+    """Test send returns while the gateway is slow and digests are rate limited."""
+    signal_gateway.delay = 0.5
+    dispatcher = AlertDispatcher(
+        f"signal://{signal_gateway.host}/1234567890/0987654321",
+        window_secs=0,
+        min_interval_secs=60,
+    )
+
+    start = monotonic()
+    dispatcher.send("first")
+    sleep(0.1)
+    dispatcher.send("second")
+    dispatcher.send("third")
+    assert monotonic() - start < 0.4  # noqa: PLR2004
+
+    deadline = monotonic() + 10
+    while not signal_gateway.messages and monotonic() < deadline:
+        sleep(0.05)
+    sleep(0.5)
+    # The rate limit holds the second digest back until it is flushed
+    assert [message["message"] for message in signal_gateway.messages] == ["first"]
+
+    dispatcher.close()
+    assert len(signal_gateway.messages) == 2  # noqa: PLR2004
+    assert "second\nthird" in signal_gateway.messages[1]["message"]
+
+
+def test_alert_dispatcher_closed(mocker: MockerFixture) -> None:
+    """Test alerts sent after close are dropped."""
+    mock_apprise = mocker.patch("apprise.Apprise")
+    dispatcher = AlertDispatcher("signal://localhost:8989/1234567890/0987654321")
+    dispatcher.close()
+
+    dispatcher.send("late")
+
+    assert dispatcher.flush(timeout=1)
+    mock_apprise.assert_not_called()
+
+
+def test_format_digest() -> None:
+    """Test format_digest."""
+    assert format_digest({("", "only"): 1}) == ("", "only")
+    assert format_digest({("title", "only"): 3}) == ("title", "only (x3)")
+    assert format_digest({("", "a"): 1, ("", "b"): 2, ("", "c"): 1}, max_alerts=2) == (
+        "4 alerts",
+        "a\nb (x2)\n... and 1 more",
+    )
+
+
+def test_get_alert_dispatcher(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the dispatcher is built from the environment once and closed at exit."""
+    mocker.patch.dict("system_tools.common.alerts._dispatchers", clear=True)
+    mock_register = mocker.patch("system_tools.common.alerts.atexit.register")
+    monkeypatch.delenv("SIGNAL_ALERT_FROM_PHONE", raising=False)
+    monkeypatch.setenv("SIGNAL_ALERT_TO_PHONE", "0987654321")
+    assert get_alert_dispatcher() is None
+
+    monkeypatch.setenv("SIGNAL_ALERT_FROM_PHONE", "1234567890")
+    dispatcher = get_alert_dispatcher()
+    assert dispatcher is not None
+    assert dispatcher.url == "signal://localhost:8989/1234567890/0987654321"
+    assert get_alert_dispatcher() is dispatcher
+    mock_register.assert_called_once_with(dispatcher.close)
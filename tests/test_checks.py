@@ -0,0 +1,135 @@
+"""test_checks."""
+
+from __future__ import annotations
+
+import json
+from threading import Event
+from time import perf_counter, sleep
+from typing import TYPE_CHECKING
+
+import pytest
+
+from system_tools.common import TextfileMetrics
+from system_tools.system_tests.checks import CheckResult, CheckRunner, CheckStateStore, record_check_metrics
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_check_runner_concurrent() -> None:
+    """Test the checks run at once, so the run takes as long as the slowest check."""
+
+    def slow_check(errors: list[str]) -> list[str]:
+        sleep(0.3)
+        return errors
+
+    check_runner = CheckRunner()
+    check_runner.register("zpool", lambda: slow_check(["pool is DEGRADED"]))
+    check_runner.register("systemd", lambda: slow_check([]))
+    check_runner.register("empty", lambda: None)
+
+    start = perf_counter()
+    results = check_runner.run()
+
+    assert perf_counter() - start < 0.55  # noqa: PLR2004
+    assert [(result.name, result.errors, result.timed_out) for result in results] == [
+        ("zpool", ["pool is DEGRADED"], False),
+        ("systemd", [], False),
+        ("empty", [], False),
+    ]
+    assert results[0].duration >= 0.3  # noqa: PLR2004
+
+
+def test_check_runner_timeout() -> None:
+    """Test a hung check is reported as timed out without holding back the other checks."""
+    release = Event()
+    check_runner = CheckRunner()
+    check_runner.register("zpool", lambda: ["late"] if release.wait(10) else [], timeout_secs=0.2)
+    check_runner.register("systemd", lambda: ["docker is failed (failed)"])
+
+    start = perf_counter()
+    zpool, systemd = check_runner.run()
+    release.set()
+
+    assert perf_counter() - start < 1
+    assert zpool.timed_out
+    assert zpool.errors == ["zpool check timed out after 0.2s"]
+    assert systemd.errors == ["docker is failed (failed)"]
+
+
+def test_check_runner_exception() -> None:
+    """Test a check that raises is reported with its error."""
+
+    def broken_check() -> list[str]:
+        error = "zpool command not found"
+        raise RuntimeError(error)
+
+    check_runner = CheckRunner()
+    check_runner.register("zpool", broken_check)
+
+    (result,) = check_runner.run()
+
+    assert result.errors == ["zpool check failed: zpool command not found"]
+
+
+def test_check_runner_register_twice() -> None:
+    """Test a check name can only be registered once."""
+    check_runner = CheckRunner()
+    check_runner.register("zpool", lambda: None)
+
+    with pytest.raises(ValueError, match="Check zpool is already registered"):
+        check_runner.register("zpool", lambda: None)
+
+
+def test_record_check_metrics() -> None:
+    """test_record_check_metrics."""
+    metrics = TextfileMetrics()
+    record_check_metrics(metrics, [CheckResult("zpool", ["late"], 1.5, timed_out=True)])
+
+    lines = metrics.render().splitlines()
+    assert 'validate_system_check_duration_seconds{check="zpool"} 1.5' in lines
+    assert 'validate_system_check_success{check="zpool"} 0' in lines
+    assert 'validate_system_check_timed_out{check="zpool"} 1' in lines
+
+
+def test_check_runner_run_names() -> None:
+    """Test only the named checks run."""
+    check_runner = CheckRunner()
+    check_runner.register("zpool", lambda: ["pool is DEGRADED"])
+    check_runner.register("systemd", lambda: pytest.fail("systemd should not run"))
+
+    assert [result.name for result in check_runner.run(["zpool"])] == ["zpool"]
+
+
+def test_check_state_store_transitions(tmp_path: Path) -> None:
+    """Test only failing and recovering are alerted on and the state survives a restart."""
+    state_file = tmp_path / "state" / "validate_system.json"
+    store = CheckStateStore(state_file)
+
+    assert store.update(CheckResult("systemd")) is None
+    assert store.update(CheckResult("zpool", ["storage is DEGRADED"])) == "zpool check failed: storage is DEGRADED"
+    assert store.update(CheckResult("zpool", ["storage is DEGRADED"])) is None
+    assert store.update(CheckResult("zpool", ["storage is FAULTED"])) is None
+
+    restarted = CheckStateStore(state_file)
+    assert restarted.states["zpool"].ok is False
+    assert restarted.update(CheckResult("zpool", ["storage is DEGRADED"])) is None
+    alert = restarted.update(CheckResult("zpool"))
+    assert alert is not None
+    assert alert.startswith("zpool check recovered after ")
+    assert alert.endswith("it failed with: storage is DEGRADED")
+    assert restarted.update(CheckResult("zpool")) is None
+    assert restarted.update(CheckResult("systemd", ["docker is failed (failed)"])) is not None
+
+    assert json.loads(state_file.read_text())["systemd"]["errors"] == ["docker is failed (failed)"]
+
+
+def test_check_state_store_corrupt(tmp_path: Path) -> None:
+    """Test a corrupt state file is ignored."""
+    state_file = tmp_path / "validate_system.json"
+    state_file.write_text('{"zpool": {"ok": tru')
+
+    store = CheckStateStore(state_file)
+
+    assert store.states == {}
+    assert store.update(CheckResult("zpool", ["storage is DEGRADED"])) is not None
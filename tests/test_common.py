@@ -2,14 +2,29 @@
 
 from __future__ import annotations
 
+import asyncio
 from os import environ
+from time import perf_counter
 from typing import TYPE_CHECKING
 
+import pytest
 from apprise import Apprise
 
-from system_tools.common.lib import bash_wrapper, signal_alert, utcnow
+from system_tools.common.alerts import get_alert_dispatcher
+from system_tools.common.lib import (
+    async_bash_wrapper,
+    async_run_command,
+    bash_stream,
+    bash_wrapper,
+    run_command,
+    set_default_timeout,
+    signal_alert,
+    utcnow,
+)
 
 if TYPE_CHECKING:
+    from pathlib import Path
+
     from pytest_mock import MockerFixture
 
 
@@ -24,10 +39,16 @@ def test_signal_alert(mocker: MockerFixture) -> None:
     environ["SIGNAL_ALERT_TO_PHONE"] = "0987654321"
 
     mock_logger = mocker.patch("system_tools.common.lib.logger")
+    mocker.patch.dict("system_tools.common.alerts._dispatchers", clear=True)
+    mocker.patch("system_tools.common.alerts.atexit.register")
     mock_apprise_client = mocker.MagicMock(spec=Apprise)
-    mocker.patch("system_tools.common.lib.Apprise", return_value=mock_apprise_client)
+    mocker.patch("apprise.Apprise", return_value=mock_apprise_client)
 
     signal_alert("test")
+    dispatcher = get_alert_dispatcher()
+    assert dispatcher is not None
+    assert dispatcher.flush(timeout=10)
+    dispatcher.close()
 
     mock_logger.info.assert_not_called()
     mock_apprise_client.add.assert_called_once_with("signal://localhost:8989/1234567890/0987654321")
@@ -59,3 +80,131 @@ def test_test_bash_wrapper_error() -> None:
     stdout, returncode = bash_wrapper("ls /this/path/does/not/exist")
     assert stdout == "ls: cannot access '/this/path/does/not/exist': No such file or directory\n"
     assert returncode == expected_error
+
+
+def test_bash_stream() -> None:
+    """test_bash_stream."""
+    assert "".join(bash_stream("seq 1 5000", chunk_size=100)) == "".join(f"{index}\n" for index in range(1, 5001))
+
+
+def test_bash_stream_error() -> None:
+    """test_bash_stream_error raises with the stderr of a failed command."""
+    with pytest.raises(RuntimeError, match="returned 2: ls: cannot access '/this/path/does/not/exist'"):
+        list(bash_stream("ls /this/path/does/not/exist"))
+
+
+def test_bash_stream_stderr_does_not_block(tmp_path: Path) -> None:
+    """test_bash_stream keeps reading a command that writes more to stderr than the pipe holds."""
+    script = tmp_path / "noisy.sh"
+    script.write_text("#!/bin/sh\nseq 1 100000 >&2\necho done\n")
+    script.chmod(0o755)
+
+    assert "".join(bash_stream(str(script), timeout=10)) == "done\n"
+
+
+def test_async_bash_wrapper() -> None:
+    """test_async_bash_wrapper."""
+    assert asyncio.run(async_bash_wrapper("echo test")) == ("test\n", 0)
+    assert asyncio.run(async_bash_wrapper("ls /this/path/does/not/exist")) == (
+        "ls: cannot access '/this/path/does/not/exist': No such file or directory\n",
+        2,
+    )
+
+
+def test_async_run_command() -> None:
+    """test_async_run_command keeps stdout and stderr apart."""
+    result = asyncio.run(async_run_command("ls / /this/path/does/not/exist"))
+
+    assert "tmp\n" in result.stdout
+    assert "No such file or directory" in result.stderr
+    assert result.returncode == 2  # noqa: PLR2004
+
+
+def test_async_bash_wrapper_concurrency() -> None:
+    """test_async_bash_wrapper runs commands at once up to the semaphore limit."""
+
+    async def run(limit: int) -> float:
+        semaphore = asyncio.Semaphore(limit)
+        start = perf_counter()
+        await asyncio.gather(*(async_bash_wrapper("sleep 0.2", semaphore) for _ in range(4)))
+        return perf_counter() - start
+
+    assert asyncio.run(run(4)) < 0.6  # noqa: PLR2004
+    assert asyncio.run(run(1)) >= 0.8  # noqa: PLR2004
+
+
+def test_async_bash_wrapper_timeout() -> None:
+    """test_async_bash_wrapper kills the command when it times out."""
+
+    async def run() -> None:
+        async with asyncio.timeout(0.1):
+            await async_bash_wrapper("sleep 10")
+
+    start = perf_counter()
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
+    assert perf_counter() - start < 5  # noqa: PLR2004
+
+
+def test_run_command() -> None:
+    """test_run_command keeps stdout and stderr apart."""
+    result = run_command("ls /proc/self /this/path/does/not/exist")
+
+    assert "status" in result.stdout
+    assert result.stderr == "ls: cannot access '/this/path/does/not/exist': No such file or directory\n"
+    assert result.returncode == 2  # noqa: PLR2004
+    assert result.duration > 0
+
+
+def test_run_command_on_stdout() -> None:
+    """test_run_command passes each line of stdout to on_stdout."""
+    lines: list[str] = []
+
+    result = run_command("seq 1 3", on_stdout=lines.append)
+
+    assert lines == ["1\n", "2\n", "3\n"]
+    assert result.stdout == "1\n2\n3\n"
+    assert result.returncode == 0
+
+
+def test_run_command_timeout() -> None:
+    """test_run_command stops a command that times out."""
+    start = perf_counter()
+    with pytest.raises(TimeoutError, match="timed out after 0.2s"):
+        run_command("sleep 10", timeout=0.2)
+    assert perf_counter() - start < 5  # noqa: PLR2004
+
+
+def test_run_command_kill_escalation(tmp_path: Path) -> None:
+    """test_run_command kills a command that ignores SIGTERM."""
+    script = tmp_path / "ignore_term.sh"
+    script.write_text('#!/bin/sh\ntrap "" TERM\nsleep 10\n')
+    script.chmod(0o755)
+
+    lines: list[str] = []
+    start = perf_counter()
+    with pytest.raises(TimeoutError):
+        run_command(str(script), timeout=0.2, on_stdout=lines.append, kill_after=0.2)
+    assert perf_counter() - start < 5  # noqa: PLR2004
+    assert lines == []
+
+
+def test_run_command_zero_timeout() -> None:
+    """test_run_command treats an explicit zero timeout as a timeout, not as the default."""
+    set_default_timeout(None)
+    with pytest.raises(TimeoutError):
+        run_command("sleep 10", timeout=0)
+
+
+def test_set_default_timeout() -> None:
+    """test_set_default_timeout applies to bash_wrapper and bash_stream."""
+    set_default_timeout(0.2)
+    try:
+        with pytest.raises(TimeoutError):
+            bash_wrapper("sleep 10")
+        with pytest.raises(TimeoutError):
+            list(bash_stream("sleep 10"))
+    finally:
+        set_default_timeout(None)
+
+    assert bash_wrapper("echo test") == ("test\n", 0)
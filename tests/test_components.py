@@ -1,12 +1,49 @@
 """test_components."""
 
+import asyncio
+from pathlib import Path
+
+import pytest
 from pytest_mock import MockerFixture
 
-from system_tools.system_tests.components import systemd_tests, zpool_tests
+from system_tools.common import CommandResult, TextfileMetrics
+from system_tools.system_tests.components import (
+    ServiceState,
+    async_systemd_tests,
+    parse_service_states,
+    parse_zpool_upgrade,
+    systemd_tests,
+    zpool_tests,
+    zpool_upgrade_tests,
+)
 from system_tools.zfs import Zpool
 
 temp = "Every feature flags pool has all supported and requested features enabled.\n"
 
+ZPOOL_UPGRADE_OUT_OF_DATE = """This system supports ZFS pool feature flags.
+
+All pools are formatted using feature flags.
+
+
+Some supported features are not enabled on the following pools. Once a
+feature is enabled the pool may become incompatible with software
+that does not support the feature. See zpool-features(7) for details.
+
+POOL  FEATURE
+---------------
+backup
+      zilsaxattr
+      head_errlog
+Main
+      zilsaxattr
+
+The following pools are formatted with legacy version numbers and can be upgraded to use feature flags.
+
+VER  POOL
+---  ------------
+28   old_pool
+"""
+
 SYSTEM_TESTS_COMPONENTS = "system_tools.system_tests.components"
 
 
@@ -16,7 +53,7 @@ def test_zpool_tests(mocker: MockerFixture) -> None:
     mock_zpool.health = "ONLINE"
     mock_zpool.capacity = 70
     mock_zpool.name = "Main"
-    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.Zpool", return_value=mock_zpool)
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.get_zpools", return_value=[mock_zpool])
     mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=(temp, ""))
     errors = zpool_tests(("Main",))
     assert errors == []
@@ -28,7 +65,7 @@ def test_zpool_tests_out_of_date(mocker: MockerFixture) -> None:
     mock_zpool.health = "ONLINE"
     mock_zpool.capacity = 70
     mock_zpool.name = "Main"
-    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.Zpool", return_value=mock_zpool)
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.get_zpools", return_value=[mock_zpool])
     mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=("", ""))
     errors = zpool_tests(("Main",))
     assert errors == ["ZPool out of date run `sudo zpool upgrade -a`"]
@@ -40,7 +77,7 @@ def test_zpool_tests_out_of_space(mocker: MockerFixture) -> None:
     mock_zpool.health = "ONLINE"
     mock_zpool.capacity = 100
     mock_zpool.name = "Main"
-    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.Zpool", return_value=mock_zpool)
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.get_zpools", return_value=[mock_zpool])
     mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=(temp, ""))
     errors = zpool_tests(("Main",))
     assert errors == ["Main is low on space"]
@@ -52,12 +89,32 @@ def test_zpool_tests_offline(mocker: MockerFixture) -> None:
     mock_zpool.health = "OFFLINE"
     mock_zpool.capacity = 70
     mock_zpool.name = "Main"
-    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.Zpool", return_value=mock_zpool)
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.get_zpools", return_value=[mock_zpool])
     mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=(temp, ""))
     errors = zpool_tests(("Main",))
     assert errors == ["Main is OFFLINE"]
 
 
+def test_zpool_tests_metrics(mocker: MockerFixture) -> None:
+    """test_zpool_tests_metrics."""
+    mock_zpool = mocker.MagicMock(spec=Zpool)
+    mock_zpool.health = "DEGRADED"
+    mock_zpool.capacity = 70
+    mock_zpool.fragmentation = 12
+    mock_zpool.name = "Main"
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.get_zpools", return_value=[mock_zpool])
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=(temp, ""))
+    metrics = TextfileMetrics()
+
+    errors = zpool_tests(("Main",), metrics=metrics)
+
+    assert errors == ["Main is DEGRADED"]
+    lines = metrics.render().splitlines()
+    assert 'zpool_capacity_percent{pool="Main"} 70' in lines
+    assert 'zpool_fragmentation_percent{pool="Main"} 12' in lines
+    assert 'zpool_health{pool="Main",health="DEGRADED"} 1' in lines
+
+
 def test_systemd_tests() -> None:
     """test_systemd_tests."""
     errors = systemd_tests(("docker",))
@@ -70,26 +127,212 @@ def test_systemd_tests_multiple_negative_retries() -> None:
     assert errors == []
 
 
+def systemctl_show(*states: tuple[str, str, int]) -> str:
+    """Build the output of `systemctl show` for services in the given active state, sub state and restarts."""
+    return "\n".join(
+        f"Id={name}.service\nLoadState=loaded\nActiveState={active}\nSubState={sub}\nNRestarts={restarts}\n"
+        for name, (active, sub, restarts) in zip(("docker", "nginx", "postgres"), states, strict=False)
+    )
+
+
+def systemctl_result(stdout: str, returncode: int = 0, stderr: str = "") -> CommandResult:
+    """Build the result of `systemctl show`."""
+    return CommandResult("systemctl show", stdout, stderr, returncode, 0.1)
+
+
+def test_zpool_tests_upgrade_cache(mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test a passed zpool upgrade check is cached until the pools or the zfs module change."""
+    zfs_version = tmp_path / "version"
+    zfs_version.write_text("2.2.4-1\n")
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.ZFS_MODULE_VERSION", zfs_version)
+    mock_zpool = mocker.MagicMock(spec=Zpool, guid=1, health="ONLINE", capacity=70)
+    mock_zpool.name = "Main"
+    mock_get_zpools = mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.get_zpools", return_value=[mock_zpool])
+    mock_bash_wrapper = mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=(temp, 0))
+    cache_file = tmp_path / "cache" / "zpool_upgrade.json"
+
+    assert zpool_tests(("Main",), upgrade_cache_file=cache_file) == []
+    assert zpool_tests(("Main",), upgrade_cache_file=cache_file) == []
+    mock_get_zpools.assert_called_with(("Main",), fields=("guid", "health", "capacity", "fragmentation"))
+    assert mock_bash_wrapper.call_count == 1
+
+    zfs_version.write_text("2.2.5-1\n")
+    assert zpool_tests(("Main",), upgrade_cache_file=cache_file) == []
+    assert mock_bash_wrapper.call_count == 2  # noqa: PLR2004
+
+    mock_zpool.guid = 2
+    mock_bash_wrapper.return_value = (ZPOOL_UPGRADE_OUT_OF_DATE, 0)
+    assert zpool_tests(("Main",), upgrade_cache_file=cache_file) == [
+        "Main is out of date run `sudo zpool upgrade Main`"
+    ]
+    assert zpool_tests(("Main",), upgrade_cache_file=cache_file) == [
+        "Main is out of date run `sudo zpool upgrade Main`"
+    ]
+    assert mock_bash_wrapper.call_count == 4  # noqa: PLR2004
+
+
+def test_zpool_upgrade_tests_other_pools(mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test pools that are not checked do not fail the check or keep it from being cached."""
+    zfs_version = tmp_path / "version"
+    zfs_version.write_text("2.2.4-1\n")
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.ZFS_MODULE_VERSION", zfs_version)
+    mock_zpool = mocker.MagicMock(spec=Zpool, guid=1)
+    mock_zpool.name = "storage"
+    mock_bash_wrapper = mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=(ZPOOL_UPGRADE_OUT_OF_DATE, 0)
+    )
+    cache_file = tmp_path / "zpool_upgrade.json"
+
+    assert zpool_upgrade_tests([mock_zpool], cache_file) == []
+    assert zpool_upgrade_tests([mock_zpool], cache_file) == []
+    assert mock_bash_wrapper.call_count == 1
+
+
+def test_parse_zpool_upgrade() -> None:
+    """test_parse_zpool_upgrade."""
+    assert parse_zpool_upgrade(ZPOOL_UPGRADE_OUT_OF_DATE) == {"backup", "Main", "old_pool"}
+    assert parse_zpool_upgrade(temp) == set()
+    assert parse_zpool_upgrade("") is None
+    assert parse_zpool_upgrade("cannot open /dev/zfs: Permission denied\n") is None
+
+
+def test_parse_service_states() -> None:
+    """test_parse_service_states."""
+    output = (
+        "Id=docker.service\nLoadState=loaded\nActiveState=failed\nSubState=failed\nNRestarts=3\n\n"
+        "Id=missing.service\nLoadState=not-found\nActiveState=inactive\nSubState=dead\nNRestarts=[not set]\n"
+    )
+    service_states = parse_service_states(output, ["docker", "missing"])
+
+    assert service_states["docker"] == ServiceState("docker", "loaded", "failed", "failed", 3)
+    assert str(service_states["docker"]) == "failed (failed) after 3 restarts"
+    assert str(service_states["missing"]) == "inactive (dead) not-found"
+
+    with pytest.raises(RuntimeError, match="returned 2 units for 1 services"):
+        parse_service_states(output, ["docker"])
+    with pytest.raises(RuntimeError, match="no state for docker"):
+        parse_service_states("System has not been booted with systemd as init system (PID 1).", ["docker"])
+
+
 def test_systemd_tests_multiple_pass(mocker: MockerFixture) -> None:
     """test_systemd_tests_fail."""
-    mocker.patch(
-        f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper",
+    mock_run_command = mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.run_command",
         side_effect=[
-            ("inactive\n", ""),
-            ("activating\n", ""),
-            ("active\n", ""),
+            systemctl_result(systemctl_show(("inactive", "dead", 0))),
+            systemctl_result(systemctl_show(("activating", "start", 0))),
+            systemctl_result(systemctl_show(("active", "running", 0))),
         ],
     )
+    mock_sleep = mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.sleep")
     errors = systemd_tests(
         ("docker",),
         retryable_statuses=("inactive\n", "activating\n"),
         valid_statuses=("active\n",),
     )
     assert errors == []
+    mock_run_command.assert_called_with("systemctl show -p Id,LoadState,ActiveState,SubState,NRestarts docker")
+    # No sleep once every service settled
+    assert mock_sleep.call_count == 2  # noqa: PLR2004
+
+
+def test_systemd_tests_batched(mocker: MockerFixture) -> None:
+    """Test every retry checks the services that are still settling with one systemctl call."""
+    mock_run_command = mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.run_command",
+        side_effect=[
+            systemctl_result(
+                systemctl_show(("activating", "start", 0), ("active", "running", 0), ("failed", "failed", 5)), 0
+            ),
+            systemctl_result(systemctl_show(("active", "running", 1))),
+        ],
+    )
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.sleep")
+
+    metrics = TextfileMetrics()
+    errors = systemd_tests(("postgres", "docker", "nginx"), metrics=metrics)
+
+    assert errors == ["postgres is failed (failed) after 5 restarts"]
+    assert [call.args[0] for call in mock_run_command.call_args_list] == [
+        "systemctl show -p Id,LoadState,ActiveState,SubState,NRestarts docker nginx postgres",
+        "systemctl show -p Id,LoadState,ActiveState,SubState,NRestarts docker",
+    ]
+    lines = metrics.render().splitlines()
+    assert 'systemd_service_up{service="docker",state="active",sub_state="running"} 1' in lines
+    assert 'systemd_service_restarts{service="docker"} 1' in lines
+    assert 'systemd_service_up{service="postgres",state="failed",sub_state="failed"} 0' in lines
 
 
 def test_systemd_tests_fail(mocker: MockerFixture) -> None:
     """test_systemd_tests_fail."""
-    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.bash_wrapper", return_value=("inactive\n", ""))
-    errors = systemd_tests(("docker",), max_retries=5)
-    assert errors == ["docker is inactive"]
+    mock_run_command = mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.run_command",
+        return_value=systemctl_result(systemctl_show(("inactive", "dead", 0))),
+    )
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.sleep")
+    metrics = TextfileMetrics()
+    errors = systemd_tests(("docker",), max_retries=5, metrics=metrics)
+    assert errors == ["docker is inactive (dead)"]
+    assert mock_run_command.call_count == 5  # noqa: PLR2004
+    assert 'systemd_service_up{service="docker",state="inactive",sub_state="dead"} 0' in metrics.render().splitlines()
+
+
+def test_systemd_tests_unreadable(mocker: MockerFixture) -> None:
+    """Test every service fails when systemctl does not return their state."""
+    mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.run_command", return_value=systemctl_result("", 1, "Failed to connect to bus")
+    )
+    errors = systemd_tests(("docker", "nginx"))
+    assert errors == ["docker is unknown", "nginx is unknown"]
+
+
+def test_systemd_tests_stderr(mocker: MockerFixture, caplog: pytest.LogCaptureFixture) -> None:
+    """Test a warning of systemctl on stderr is logged and the states are read from stdout."""
+    mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.run_command",
+        return_value=systemctl_result(
+            systemctl_show(("active", "running", 0)), 0, "Warning: The unit file changed on disk.\n"
+        ),
+    )
+
+    assert systemd_tests(("docker",)) == []
+    assert "stderr='Warning: The unit file changed on disk.'" in caplog.text
+
+
+def test_async_systemd_tests(mocker: MockerFixture) -> None:
+    """test_async_systemd_tests."""
+    outputs = iter(
+        [
+            systemctl_show(("activating", "start", 0), ("active", "running", 0), ("failed", "failed", 0)),
+            systemctl_show(("active", "running", 0)),
+        ]
+    )
+
+    async def fake_async_run_command(command: str) -> CommandResult:
+        assert command.startswith("systemctl show")
+        return systemctl_result(next(outputs))
+
+    mock_async_run_command = mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.async_run_command",
+        side_effect=fake_async_run_command,
+    )
+    mock_sleep = mocker.patch("asyncio.sleep")
+
+    errors = asyncio.run(async_systemd_tests(("docker", "nginx", "postgres")))
+
+    assert errors == ["postgres is failed (failed)"]
+    assert mock_async_run_command.call_count == 2  # noqa: PLR2004
+    mock_sleep.assert_called_once_with(1)
+
+
+def test_async_systemd_tests_fail(mocker: MockerFixture) -> None:
+    """test_async_systemd_tests_fail."""
+    mocker.patch(
+        f"{SYSTEM_TESTS_COMPONENTS}.async_run_command",
+        return_value=systemctl_result(systemctl_show(("inactive", "dead", 0)), 3),
+    )
+    mocker.patch("asyncio.sleep")
+
+    errors = asyncio.run(async_systemd_tests(("docker",), max_retries=5))
+
+    assert errors == ["docker is inactive (dead)"]
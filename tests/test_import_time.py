@@ -0,0 +1,79 @@
+"""test_import_time."""
+
+from __future__ import annotations
+
+import sys
+from subprocess import run
+
+import pytest
+
+LAZY_MODULES = ("apprise", "apscheduler", "polars", "typer")
+# How many times as long as the imports of an empty interpreter a CLI may take, they take 12 to 15 times as long
+IMPORT_BUDGET = 25
+
+
+def import_time(module: str | None) -> tuple[set[str], float]:
+    """Import a module in a fresh interpreter.
+
+    Args:
+        module (str | None): The module to import, None for the imports of an empty interpreter.
+
+    Returns:
+        tuple[set[str], float]: The top level packages that were imported and the total import time in seconds.
+    """
+    process = run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}" if module else "pass"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    packages: set[str] = set()
+    total_secs = 0.0
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        packages.add(name.strip().split(".")[0])
+        # Nested imports are indented under the module that imported them and already counted in its cumulative time
+        if not name.removeprefix(" ").startswith(" "):
+            total_secs += int(cumulative) / 1_000_000
+    return packages, total_secs
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["system_tools.tools.snapshot_manager", "system_tools.system_tests.validate_system"],
+)
+def test_cli_import_time(module: str) -> None:
+    """Test the CLIs import without their heavy dependencies and within the budget.
+
+    The budget is relative to the imports of an empty interpreter, so a loaded machine slows both down alike.
+    """
+    # The fastest of a few runs, a busy moment would otherwise decide the outcome
+    packages, total_secs = min((import_time(module) for _ in range(3)), key=lambda result: result[1])
+    _, empty_secs = min((import_time(None) for _ in range(3)), key=lambda result: result[1])
+
+    assert packages.isdisjoint(LAZY_MODULES)
+    assert total_secs < IMPORT_BUDGET * empty_secs
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["system_tools.tools.snapshot_manager", "system_tools.system_tests.validate_system"],
+)
+def test_cli_without_typer(module: str) -> None:
+    """Test a run with only a configuration file does not import typer."""
+    process = run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys; import {module} as cli; cli.main = print; sys.argv = ['cli', '/config.toml']; cli.cli(); "
+            "print('typer' in sys.modules)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert process.stdout.splitlines() == ["/config.toml", "False"]
@@ -0,0 +1,96 @@
+"""test_instrumentation."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from system_tools.common import (
+    CommandStats,
+    add_command_hook,
+    async_bash_wrapper,
+    bash_stream,
+    bash_wrapper,
+    command_verb,
+    remove_command_hook,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.mark.parametrize(
+    ("command", "verb"),
+    [
+        ("zfs list -t snapshot -pHj -o name", "zfs list"),
+        ("zpool list tank -pHj", "zpool list"),
+        ("systemctl is-active docker", "systemctl is-active"),
+        ("/usr/bin/zfs destroy tank/data@a,b", "zfs destroy"),
+        ("sleep 10", "sleep"),
+        ("ls /proc", "ls"),
+    ],
+)
+def test_command_verb(command: str, verb: str) -> None:
+    """test_command_verb."""
+    assert command_verb(command) == verb
+
+
+def test_command_stats() -> None:
+    """test_command_stats."""
+    command_stats = CommandStats()
+    for index in range(1, 21):
+        command_stats.record(f"zfs destroy tank/data@{index}", index / 10, 10)
+    command_stats.record("zfs list -pHj", 0.004, 1000)
+
+    summary = command_stats.summary()
+
+    assert list(summary) == ["zfs destroy", "zfs list"]
+    assert summary["zfs destroy"] == {
+        "count": 20,
+        "total_secs": pytest.approx(21),
+        "avg_secs": pytest.approx(1.05),
+        "p95_secs": 1.9,
+        "max_secs": 2.0,
+        "output_bytes": 200,
+    }
+    assert summary["zfs list"]["count"] == 1
+    assert command_stats.histogram("zfs destroy")[7:10] == [(1.0, 10), (2.5, 20), (5.0, 20)]
+    assert command_stats.histogram("zfs list")[0] == (0.005, 1)
+    assert command_stats.histogram("zpool list")[-1] == (float("inf"), 0)
+
+
+def test_command_hook(tmp_path: Path) -> None:
+    """test_command_hook records the commands run through bash_wrapper."""
+    command_stats = CommandStats()
+    add_command_hook(command_stats.record)
+    try:
+        bash_wrapper("echo test")
+        bash_wrapper("echo again")
+    finally:
+        remove_command_hook(command_stats.record)
+    bash_wrapper("echo ignored")
+
+    stats_file = tmp_path / "stats.json"
+    command_stats.report(stats_file)
+
+    stats = json.loads(stats_file.read_text())
+    assert sorted(stats) == ["echo again", "echo test"]
+    assert stats["echo test"]["count"] == 1
+    assert stats["echo test"]["output_bytes"] == len("test\n")
+
+
+def test_command_hook_output_bytes() -> None:
+    """test_command_hook records the output size in bytes whichever way the command is run."""
+    command_stats = CommandStats()
+    add_command_hook(command_stats.record)
+    try:
+        bash_wrapper("echo héllo")
+        "".join(bash_stream("echo héllo"))
+        asyncio.run(async_bash_wrapper("echo héllo"))
+    finally:
+        remove_command_hook(command_stats.record)
+
+    assert sum(command_stats.output_bytes.values()) == 3 * len("héllo\n".encode())
@@ -0,0 +1,113 @@
+"""test_inventory."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING
+
+from system_tools.zfs import Snapshot, SnapshotInventory
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from pathlib import Path
+    from unittest.mock import MagicMock
+
+    from pytest_mock import MockerFixture
+
+INVENTORY = "system_tools.zfs.inventory"
+
+# guid, createtxg and creation of each snapshot on the pool
+SNAPSHOTS = {
+    "pool/data@snap1": (1, 10, 1_700_000_000),
+    "pool/data@snap2": (2, 11, 1_700_000_900),
+    "pool@snap3": (3, 12, 1_700_001_800),
+}
+
+
+def create_snapshot(name: str, fields: Sequence[str]) -> Snapshot:
+    """Build a snapshot the way zfs lists it."""
+    guid, createtxg, creation = SNAPSHOTS[name]
+    properties = {"guid": {"value": str(guid)}, "creation": {"value": str(creation)}}
+    return Snapshot(
+        {
+            "name": name,
+            "createtxg": str(createtxg),
+            "properties": {field: properties[field] for field in fields},
+        }
+    )
+
+
+def mock_pool(mocker: MockerFixture, pool_guid: int, snapshot_names: list[str]) -> tuple[MagicMock, MagicMock]:
+    """Mock the zfs commands of a pool with the given snapshots."""
+    mock_zpool = mocker.patch(f"{INVENTORY}.Zpool")
+    mock_zpool.return_value.guid = pool_guid
+
+    def fake_iter_snapshots(root: str, fields: Sequence[str]) -> Iterator[Snapshot]:
+        assert root == "pool"
+        for name in snapshot_names:
+            yield create_snapshot(name, fields)
+
+    def fake_iter_snapshot_properties(names: Sequence[str], fields: Sequence[str]) -> Iterator[Snapshot]:
+        for name in names:
+            yield create_snapshot(name, fields)
+
+    mock_iter_snapshots = mocker.patch(f"{INVENTORY}.iter_snapshots", side_effect=fake_iter_snapshots)
+    mock_iter_snapshot_properties = mocker.patch(
+        f"{INVENTORY}.iter_snapshot_properties",
+        side_effect=fake_iter_snapshot_properties,
+    )
+    return mock_iter_snapshots, mock_iter_snapshot_properties
+
+
+def snapshot_names(snapshots_by_dataset: dict[str, list[Snapshot]]) -> dict[str, list[str]]:
+    """Get the snapshot names of each dataset."""
+    return {dataset: [snapshot.name for snapshot in snapshots] for dataset, snapshots in snapshots_by_dataset.items()}
+
+
+def test_snapshot_inventory_load(mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test the first load fetches every snapshot."""
+    mock_iter_snapshots, mock_iter_snapshot_properties = mock_pool(
+        mocker, 100, ["pool/data@snap1", "pool/data@snap2", "pool@snap3"]
+    )
+
+    with SnapshotInventory(tmp_path / "inventory.sqlite") as inventory:
+        snapshots_by_dataset = inventory.load(["pool"])
+
+    mock_iter_snapshots.assert_called_once_with("pool", fields=("guid",))
+    mock_iter_snapshot_properties.assert_called_once_with(
+        ["pool/data@snap1", "pool/data@snap2", "pool@snap3"], ("guid", "creation")
+    )
+    assert snapshot_names(snapshots_by_dataset) == {"pool": ["snap3"], "pool/data": ["snap1", "snap2"]}
+
+    snapshot = snapshots_by_dataset["pool/data"][1]
+    assert snapshot.guid == 2  # noqa: PLR2004
+    assert snapshot.createtxg == 11  # noqa: PLR2004
+    assert snapshot.creation == datetime(2023, 11, 14, 22, 28, 20, tzinfo=UTC)
+
+
+def test_snapshot_inventory_incremental_refresh(mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test a refresh only fetches new snapshots and drops the ones that are gone."""
+    mock_pool(mocker, 100, ["pool/data@snap1", "pool/data@snap2"])
+    with SnapshotInventory(tmp_path / "inventory.sqlite") as inventory:
+        inventory.load(["pool"])
+
+    _, mock_iter_snapshot_properties = mock_pool(mocker, 100, ["pool/data@snap2", "pool@snap3"])
+    with SnapshotInventory(tmp_path / "inventory.sqlite") as inventory:
+        snapshots_by_dataset = inventory.load(["pool"])
+
+    mock_iter_snapshot_properties.assert_called_once_with(["pool@snap3"], ("guid", "creation"))
+    assert snapshot_names(snapshots_by_dataset) == {"pool": ["snap3"], "pool/data": ["snap2"]}
+
+
+def test_snapshot_inventory_pool_guid_changed(mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test a pool with a new guid is reloaded from scratch."""
+    mock_pool(mocker, 100, ["pool/data@snap1", "pool/data@snap2"])
+    with SnapshotInventory(tmp_path / "inventory.sqlite") as inventory:
+        inventory.load(["pool"])
+
+    _, mock_iter_snapshot_properties = mock_pool(mocker, 200, ["pool/data@snap1", "pool/data@snap2"])
+    with SnapshotInventory(tmp_path / "inventory.sqlite") as inventory:
+        snapshots_by_dataset = inventory.load(["pool"])
+
+    mock_iter_snapshot_properties.assert_called_once_with(["pool/data@snap1", "pool/data@snap2"], ("guid", "creation"))
+    assert snapshot_names(snapshots_by_dataset) == {"pool/data": ["snap1", "snap2"]}
@@ -0,0 +1,226 @@
+"""test_iostat."""
+
+from __future__ import annotations
+
+from threading import Event
+from typing import TYPE_CHECKING
+
+import pytest
+
+from system_tools.common import CommandResult, TextfileMetrics
+from system_tools.system_tests.components import zpool_iostat_tests
+from system_tools.zfs.iostat import (
+    VdevIostat,
+    ZpoolIostatParser,
+    ZpoolIostatSampler,
+    mirror_latency_errors,
+    sample_zpool_iostat,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+ZFS_IOSTAT = "system_tools.zfs.iostat"
+SYSTEM_TESTS_COMPONENTS = "system_tools.system_tests.components"
+
+
+def iostat_row(name: str, ops: tuple[int, int] = (10, 20), wait: tuple[str, str] = ("100000", "200000")) -> str:
+    """Build a `zpool iostat -Hpvl` row."""
+    read_wait, write_wait = wait
+    return "\t".join(
+        (
+            name,
+            "1000",
+            "2000",
+            str(ops[0]),
+            str(ops[1]),
+            "4096",
+            "8192",
+            read_wait,
+            write_wait,
+            read_wait,
+            write_wait,
+            "-",
+            "-",
+            "-",
+            "-",
+            "-",
+            "-",
+        )
+    )
+
+
+def iostat_interval(slow_write_wait: str = "200000") -> list[str]:
+    """Build one interval of two pools, a mirror with a log and a single disk pool."""
+    return [
+        iostat_row("storage"),
+        iostat_row("mirror-0"),
+        iostat_row("sda"),
+        iostat_row("sdb", wait=("100000", slow_write_wait)),
+        iostat_row("mirror-1"),
+        iostat_row("sdc"),
+        iostat_row("sdd"),
+        "logs\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-\t-",
+        iostat_row("nvme0n1", wait=("-", "-")),
+        iostat_row("root_pool"),
+        iostat_row("nvme1n1"),
+    ]
+
+
+def test_zpool_iostat_parser() -> None:
+    """Test disks are grouped under the vdev they follow and each interval is returned when the next starts."""
+    parser = ZpoolIostatParser(("storage", "root_pool"))
+
+    first = [parser.feed(line) for line in iostat_interval()]
+    assert first == [None] * len(first)
+
+    interval = parser.feed(iostat_row("storage"))
+    assert interval is not None
+    assert [(sample.pool, sample.name, sample.parent) for sample in interval] == [
+        ("storage", "storage", None),
+        ("storage", "mirror-0", None),
+        ("storage", "sda", "mirror-0"),
+        ("storage", "sdb", "mirror-0"),
+        ("storage", "mirror-1", None),
+        ("storage", "sdc", "mirror-1"),
+        ("storage", "sdd", "mirror-1"),
+        ("storage", "nvme0n1", None),
+        ("root_pool", "root_pool", None),
+        ("root_pool", "nvme1n1", None),
+    ]
+    assert interval[0].is_pool
+    assert interval[2] == VdevIostat("storage", "sda", "mirror-0", 10, 20, 4096, 8192, 100000, 200000, 100000, 200000)
+    assert interval[7].read_wait is None
+
+    assert parser.flush() == [VdevIostat("storage", "storage", None, 10, 20, 4096, 8192, *[100000, 200000] * 2)]
+    assert parser.flush() is None
+
+
+def test_zpool_iostat_parser_ignores_other_lines() -> None:
+    """Test lines before the first pool and lines that are not rows are skipped."""
+    parser = ZpoolIostatParser(("storage",))
+
+    assert parser.feed(iostat_row("sda")) is None
+    assert parser.feed("no pools available") is None
+    assert parser.flush() is None
+
+
+def test_sample_zpool_iostat(mocker: MockerFixture) -> None:
+    """Test the report since the pools were imported is skipped."""
+
+    def fake_run_command(command: str, on_stdout: Callable[[str], None], **_: object) -> CommandResult:
+        for line in [*iostat_interval("9000000000"), *iostat_interval()]:
+            on_stdout(f"{line}\n")
+        return CommandResult(command, "", "", 0, 2.0)
+
+    mock_run_command = mocker.patch(f"{ZFS_IOSTAT}.run_command", side_effect=fake_run_command)
+
+    samples = sample_zpool_iostat(("storage", "root_pool"), interval_secs=1)
+
+    assert mock_run_command.call_args.args[0] == "zpool iostat -Hpvl storage root_pool 1 2"
+    assert len(samples) == 10  # noqa: PLR2004
+    assert mirror_latency_errors(samples) == []
+
+
+def test_sample_zpool_iostat_error(mocker: MockerFixture) -> None:
+    """Test a failed zpool iostat raises with its stderr."""
+    mocker.patch(
+        f"{ZFS_IOSTAT}.run_command",
+        return_value=CommandResult("zpool iostat", "", "cannot open 'tank': no such pool\n", 1, 0.1),
+    )
+
+    with pytest.raises(RuntimeError, match="zpool iostat returned 0 intervals: cannot open 'tank': no such pool"):
+        sample_zpool_iostat(("tank",))
+
+
+def test_mirror_latency_errors() -> None:
+    """Test a disk much slower than its mirror partner is flagged, idle disks are not."""
+    parser = ZpoolIostatParser(("storage", "root_pool"))
+    for line in iostat_interval("50000000"):
+        parser.feed(line)
+    samples = parser.flush()
+    assert samples is not None
+
+    assert mirror_latency_errors(samples) == [
+        "storage mirror-0 sdb write latency 50.0ms is 250.0x the 0.2ms of its mirror partners",
+    ]
+    assert mirror_latency_errors(samples, min_wait_secs=0.1) == []
+
+
+def test_mirror_latency_errors_idle_partner() -> None:
+    """Test partners without operations in a direction are not compared, whatever wait they report."""
+    slow = VdevIostat("storage", "sdf", "mirror-2", 3, 3, 1, 1, 15000000, 15000000, 15000000, 15000000)
+    idle_partner = VdevIostat("storage", "sde", "mirror-2", 0, 0, 0, 0, None, None, None, None)
+    zero_wait_partner = VdevIostat("storage", "sdg", "mirror-2", 0, 0, 0, 0, 0, 0, 0, 0)
+    busy_partner = VdevIostat("storage", "sdh", "mirror-2", 0, 5, 0, 1, None, 100000, None, 100000)
+
+    assert mirror_latency_errors([slow, idle_partner]) == []
+    assert mirror_latency_errors([slow, zero_wait_partner]) == []
+    assert mirror_latency_errors([slow, idle_partner, busy_partner]) == [
+        "storage mirror-2 sdf write latency 15.0ms is 150.0x the 0.1ms of its mirror partners",
+    ]
+
+
+def test_zpool_iostat_sampler(mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test the sampler parses intervals from the running command and skips the first report."""
+    output = tmp_path / "iostat.txt"
+    output.write_text("\n".join([*iostat_interval(), *iostat_interval("50000000"), *iostat_interval()]) + "\n")
+    mocker.patch(f"{ZFS_IOSTAT}._iostat_command", return_value=f"cat {output}")
+
+    intervals: list[list[VdevIostat]] = []
+    done = Event()
+
+    def on_interval(interval: list[VdevIostat]) -> None:
+        intervals.append(interval)
+        if len(intervals) == 2:  # noqa: PLR2004
+            done.set()
+
+    sampler = ZpoolIostatSampler(("storage", "root_pool"), on_interval=on_interval)
+    assert sampler.latest == []
+    assert not sampler.running
+    with sampler:
+        assert done.wait(10)
+
+    assert not sampler.running
+    assert sampler.intervals == 3  # noqa: PLR2004
+    assert len(mirror_latency_errors(intervals[0])) == 1
+    assert sampler.latest == intervals[1]
+
+
+def test_zpool_iostat_tests(mocker: MockerFixture) -> None:
+    """Test zpool_iostat_tests reports slow mirror disks and records each vdev."""
+    parser = ZpoolIostatParser(("storage", "root_pool"))
+    for line in iostat_interval("50000000"):
+        parser.feed(line)
+    mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.sample_zpool_iostat", return_value=parser.flush())
+    metrics = TextfileMetrics()
+
+    errors = zpool_iostat_tests(("storage", "root_pool"), metrics=metrics)
+
+    assert errors == ["storage mirror-0 sdb write latency 50.0ms is 250.0x the 0.2ms of its mirror partners"]
+    lines = metrics.render().splitlines()
+    assert 'zpool_vdev_wait_seconds{pool="storage",vdev="sdb",parent="mirror-0",direction="write"} 0.05' in lines
+    assert 'zpool_vdev_operations_per_second{pool="root_pool",vdev="nvme1n1",parent="",direction="read"} 10' in lines
+
+
+def test_zpool_iostat_tests_sampler(mocker: MockerFixture) -> None:
+    """Test zpool_iostat_tests reads the last interval of a running sampler instead of running zpool iostat."""
+    parser = ZpoolIostatParser(("storage", "root_pool"))
+    for line in iostat_interval("50000000"):
+        parser.feed(line)
+    mock_sample_zpool_iostat = mocker.patch(f"{SYSTEM_TESTS_COMPONENTS}.sample_zpool_iostat")
+    sampler = mocker.MagicMock(spec=ZpoolIostatSampler, running=True, latest=parser.flush())
+
+    errors = zpool_iostat_tests(("storage", "root_pool"), sampler=sampler)
+
+    assert errors == ["storage mirror-0 sdb write latency 50.0ms is 250.0x the 0.2ms of its mirror partners"]
+    mock_sample_zpool_iostat.assert_not_called()
+
+    sampler.running = False
+    assert zpool_iostat_tests(("storage", "root_pool"), sampler=sampler) == [
+        "zpool iostat sampler was not running, restarted it"
+    ]
+    sampler.start.assert_called_once()
@@ -0,0 +1,60 @@
+"""test_json_stream."""
+
+from __future__ import annotations
+
+import json
+from json import JSONDecodeError
+from typing import Any
+
+import pytest
+
+from system_tools.common import iter_json_members
+
+SAMPLE_DOCUMENT = {
+    "output_version": {"command": "zfs list", "vers_major": 0, "vers_minor": 1},
+    "datasets": {
+        f"pool/dataset_{index}": {
+            "name": f"pool/dataset_{index}",
+            "createtxg": index * 10,
+            "ratio": 1.5,
+            "properties": {"mountpoint": {"value": 'C:\\\\ "quoted" é'}},
+        }
+        for index in range(50)
+    },
+    "trailer": [1, None, True],
+}
+
+
+def split(text: str, size: int) -> list[str]:
+    """Split text into chunks of size."""
+    return [text[index : index + size] for index in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1_000_000])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_members(chunk_size: int, indent: int | None) -> None:
+    """test_iter_json_members."""
+    header: dict[str, Any] = {}
+    text = json.dumps(SAMPLE_DOCUMENT, indent=indent)
+
+    members = dict(iter_json_members(split(text, chunk_size), "datasets", header))
+
+    assert members == SAMPLE_DOCUMENT["datasets"]
+    assert header == {"output_version": SAMPLE_DOCUMENT["output_version"], "trailer": [1, None, True]}
+
+
+def test_iter_json_members_empty() -> None:
+    """test_iter_json_members_empty."""
+    header: dict[str, Any] = {}
+    assert list(iter_json_members(['{"output_version": 1, "datasets": {}}'], "datasets", header)) == []
+    assert header == {"output_version": 1}
+    assert list(iter_json_members(["{}"], "datasets", header)) == []
+
+
+def test_iter_json_members_truncated() -> None:
+    """test_iter_json_members_truncated."""
+    with pytest.raises(JSONDecodeError):
+        list(iter_json_members(['{"datasets": {"a": {"b": 1}'], "datasets", {}))
+
+    with pytest.raises(JSONDecodeError):
+        list(iter_json_members([""], "datasets", {}))
@@ -4,15 +4,17 @@ from __future__ import annotations
 
 import logging
 from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from time import perf_counter, sleep
 from typing import TYPE_CHECKING, Any
 
 import pytest
 
-from system_tools.common import parallelize_process, parallelize_thread
+from system_tools.common import iter_parallel, parallelize_process, parallelize_thread
 from system_tools.common.parallelize import _parallelize_base
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Iterator
 
     from pytest_mock import MockerFixture
 
@@ -65,6 +67,11 @@ def add(a: int, b: int) -> int:
     return a + b
 
 
+def divide(a: int, b: int) -> float:
+    """Divide."""
+    return a / b
+
+
 def test_parallelize_thread() -> None:
     """test_parallelize_thread."""
     kwargs_list = [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
@@ -82,6 +89,23 @@ def test_parallelize_thread_exception() -> None:
     assert str(results.exceptions) == output
 
 
+def test_parallelize_thread_partial_exception(caplog: pytest.LogCaptureFixture) -> None:
+    """Test a failing partial is collected, it has no __name__ to log."""
+    results = parallelize_thread(func=partial(divide, b=0), kwargs_list=[{"a": 1}])
+
+    assert results.results == []
+    assert [type(exception) for exception in results.exceptions] == [ZeroDivisionError]
+    assert "call 0 with {'a': 1} raised ZeroDivisionError" in caplog.text
+
+
+def test_parallelize_thread_exception_long_kwargs(caplog: pytest.LogCaptureFixture) -> None:
+    """Test the kwargs of a failed call are logged shortened."""
+    results = parallelize_thread(func=divide, kwargs_list=[{"a": list(range(10_000)), "b": 0}])
+
+    assert len(results.exceptions) == 1
+    assert "divide call 0 with {'a': [0, 1, 2, 3, 4, 5, ...], 'b': 0} raised TypeError" in caplog.text
+
+
 def test_parallelize_process() -> None:
     """test_parallelize_process."""
     kwargs_list = [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
@@ -122,3 +146,106 @@ def test_mock_pool_executor() -> None:
         mode="normal",
     )
     assert repr(results) == "results=[3, 7] exceptions=[]"
+
+
+def slow_add(a: int, b: int, delay: float) -> int:
+    """Add after a delay."""
+    sleep(delay)
+    return a + b
+
+
+def test_iter_parallel_as_completed(caplog: pytest.LogCaptureFixture) -> None:
+    """Test iter_parallel yields results as they complete and logs progress while work is in flight."""
+    kwargs_list: list[dict[str, Any]] = [{"a": 1, "b": 2, "delay": 0.3}, {"a": 3, "b": 4, "delay": 0}]
+
+    with caplog.at_level(logging.INFO):
+        outcomes = iter_parallel(func=slow_add, kwargs_list=kwargs_list, max_workers=2, progress_tracker=1)
+        first = next(outcomes)
+        assert (first.index, first.result, first.exception) == (1, 7, None)
+        assert "Progress: 1/2" not in caplog.text
+
+        second = next(outcomes)
+        assert (second.index, second.kwargs, second.result) == (0, kwargs_list[0], 3)
+        assert "Progress: 1/2" in caplog.text
+
+    assert list(outcomes) == []
+
+
+def test_iter_parallel_exception() -> None:
+    """Test iter_parallel yields exceptions in normal mode."""
+    kwargs_list: list[dict[str, int | None]] = [{"a": 3, "b": None}]
+    (outcome,) = iter_parallel(func=add, kwargs_list=kwargs_list)
+    assert outcome.result is None
+    assert isinstance(outcome.exception, TypeError)
+
+
+def test_iter_parallel_early_error_cancels_pending() -> None:
+    """Test early_error raises as soon as a call fails and cancels the calls that have not started."""
+    calls: list[int] = []
+
+    def record(a: int, b: int | None) -> int:
+        calls.append(a)
+        sleep(0.1)
+        return a + b  # type: ignore[operator]
+
+    kwargs_list: list[dict[str, int | None]] = [{"a": 1, "b": None}] + [{"a": index, "b": 1} for index in range(2, 50)]
+    start = perf_counter()
+    with pytest.raises(TypeError):
+        list(iter_parallel(func=record, kwargs_list=kwargs_list, max_workers=1, mode="early_error"))
+
+    assert perf_counter() - start < 1
+    assert len(calls) < 5  # noqa: PLR2004
+
+
+def test_iter_parallel_close_cancels_pending() -> None:
+    """Test closing the generator cancels the calls that have not started."""
+    calls: list[int] = []
+
+    def record(a: int, b: int) -> int:
+        calls.append(a)
+        sleep(0.05)
+        return a + b
+
+    outcomes = iter_parallel(func=record, kwargs_list=[{"a": index, "b": 1} for index in range(50)], max_workers=1)
+    assert next(outcomes).result == 1
+    outcomes.close()
+
+    sleep(0.2)
+    assert len(calls) < 5  # noqa: PLR2004
+
+
+def test_iter_parallel_bounds_in_flight() -> None:
+    """Test iter_parallel consumes a generator lazily and bounds the submitted work."""
+    consumed: list[int] = []
+
+    def kwargs_generator() -> Iterator[dict[str, int]]:
+        for index in range(1000):
+            consumed.append(index)
+            yield {"a": index, "b": 1}
+
+    max_in_flight, chunksize = 4, 3
+    outcomes = iter_parallel(
+        func=add,
+        kwargs_list=kwargs_generator(),
+        max_workers=2,
+        max_in_flight=max_in_flight,
+        chunksize=chunksize,
+    )
+    first = next(outcomes)
+    assert first.result == first.index + 1
+    # The first tasks plus a refill for each of them that had completed
+    assert len(consumed) <= 2 * max_in_flight * chunksize
+
+    assert sorted(outcome.index for outcome in [first, *outcomes]) == list(range(1000))
+
+
+def test_parallelize_process_chunksize() -> None:
+    """Test parallelize_process keeps the input order and per call exceptions with chunks."""
+    failing = 5
+    kwargs_list: Iterator[dict[str, int | None]] = (
+        {"a": index, "b": None if index == failing else 1} for index in range(100)
+    )
+    results = parallelize_process(func=add, kwargs_list=kwargs_list, chunksize=10)
+    assert results.results == [index + 1 for index in range(100) if index != failing]
+    assert len(results.exceptions) == 1
+    assert isinstance(results.exceptions[0], TypeError)
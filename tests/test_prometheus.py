@@ -0,0 +1,85 @@
+"""test_prometheus."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from system_tools.common import CommandStats, TextfileMetrics
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_textfile_metrics_render() -> None:
+    """test_textfile_metrics_render."""
+    metrics = TextfileMetrics()
+    metrics.add("zpool_capacity_percent", 50, "How full the pool is.", {"pool": "tank"})
+    metrics.add("zpool_capacity_percent", 75, "How full the pool is.", {"pool": "media"})
+    metrics.add("run_duration_seconds", 1.25, "How long the last run took.")
+    metrics.add("service_up", 0, "Service state.", {"service": 'say "hi"\\now'})
+
+    assert metrics.render() == (
+        "# HELP zpool_capacity_percent How full the pool is.\n"
+        "# TYPE zpool_capacity_percent gauge\n"
+        'zpool_capacity_percent{pool="tank"} 50\n'
+        'zpool_capacity_percent{pool="media"} 75\n'
+        "# HELP run_duration_seconds How long the last run took.\n"
+        "# TYPE run_duration_seconds gauge\n"
+        "run_duration_seconds 1.25\n"
+        "# HELP service_up Service state.\n"
+        "# TYPE service_up gauge\n"
+        'service_up{service="say \\"hi\\"\\\\now"} 0\n'
+    )
+
+
+def test_textfile_metrics_command_stats() -> None:
+    """test_textfile_metrics_command_stats."""
+    command_stats = CommandStats()
+    command_stats.record("zfs list -pHj", 0.02, 100)
+    command_stats.record("zfs list -pHj", 3.0, 300)
+    metrics = TextfileMetrics()
+
+    metrics.add_command_stats(command_stats)
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE system_tools_command_duration_seconds histogram" in lines
+    assert 'system_tools_command_duration_seconds_bucket{verb="zfs list",le="0.025"} 1' in lines
+    assert 'system_tools_command_duration_seconds_bucket{verb="zfs list",le="+Inf"} 2' in lines
+    assert 'system_tools_command_duration_seconds_sum{verb="zfs list"} 3.02' in lines
+    assert 'system_tools_command_duration_seconds_count{verb="zfs list"} 2' in lines
+    assert 'system_tools_command_output_bytes{verb="zfs list"} 400' in lines
+
+
+def test_textfile_metrics_write(tmp_path: Path) -> None:
+    """test_textfile_metrics_write replaces the file and leaves no temporary files behind."""
+    textfile = tmp_path / "snapshot_manager.prom"
+    textfile.write_text("old\n")
+    metrics = TextfileMetrics()
+    metrics.add("snapshot_manager_success", 1, "1 if the last run completed.")
+
+    metrics.write(textfile)
+
+    assert textfile.read_text().endswith("snapshot_manager_success 1\n")
+    assert textfile.stat().st_mode & 0o777 == 0o644  # noqa: PLR2004
+    assert list(tmp_path.iterdir()) == [textfile]
+
+
+def test_textfile_metrics_extend() -> None:
+    """Test the samples of another metrics are added to their families."""
+    metrics = TextfileMetrics()
+    metrics.add("validate_system_check_success", 1, "1 if the check passed.", {"check": "zpool"})
+    other = TextfileMetrics()
+    other.add("validate_system_check_success", 0, "1 if the check passed.", {"check": "systemd"})
+    other.add("systemd_service_restarts", 3, "How often the service restarted.", {"service": "docker"})
+
+    metrics.extend(other)
+
+    assert metrics.render().splitlines() == [
+        "# HELP validate_system_check_success 1 if the check passed.",
+        "# TYPE validate_system_check_success gauge",
+        'validate_system_check_success{check="zpool"} 1',
+        'validate_system_check_success{check="systemd"} 0',
+        "# HELP systemd_service_restarts How often the service restarted.",
+        "# TYPE systemd_service_restarts gauge",
+        'systemd_service_restarts{service="docker"} 3',
+    ]
@@ -0,0 +1,165 @@
+"""test_retention."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from re import compile as re_compile
+from re import search
+
+import pytest
+
+from system_tools.tools.retention import (
+    RetentionEngine,
+    RetentionPlan,
+    classify_snapshots,
+    get_expired_snapshots,
+    get_tiers,
+    get_unmatched_times,
+    parse_snapshot_name,
+    plan_retention,
+)
+from system_tools.zfs import Snapshot
+
+DEFAULT_COUNT_LOOKUP = {"15_min": 4, "hourly": 12, "daily": 7, "monthly": 3}
+
+
+def auto_snapshots(start: datetime, count: int, step: timedelta = timedelta(minutes=15)) -> list[str]:
+    """Build auto snapshot names."""
+    return [(start + step * index).strftime("auto_%Y%m%d%H%M") for index in range(count)]
+
+
+def regex_expired_snapshots(snapshot_names: list[str], count_lookup: dict[str, int]) -> list[str]:
+    """The regex based retention that classify_snapshots replaced."""
+    filters = (
+        ("15_min", re_compile(r"auto_\d{10}(?:15|30|45)")),
+        ("hourly", re_compile(r"auto_\d{8}(?!00)\d{2}00")),
+        ("daily", re_compile(r"auto_\d{6}(?!01)\d{2}0000")),
+        ("monthly", re_compile(r"auto_\d{6}010000")),
+    )
+    expired: list[str] = []
+    for filter_name, snapshot_filter in filters:
+        filtered_snapshots = sorted(name for name in snapshot_names if search(snapshot_filter, name))
+        wanted = count_lookup[filter_name]
+        expired.extend(filtered_snapshots[:-wanted] if wanted > 0 else filtered_snapshots)
+    return expired
+
+
+def test_get_expired_snapshots_matches_regex_retention() -> None:
+    """test_get_expired_snapshots_matches_regex_retention."""
+    snapshot_names = auto_snapshots(datetime(2024, 1, 20, tzinfo=UTC), 96 * 60)
+    snapshot_names.extend(["manual_backup", "auto_2024010100xx"])
+
+    assert sorted(get_expired_snapshots(snapshot_names, DEFAULT_COUNT_LOOKUP)) == sorted(
+        regex_expired_snapshots(snapshot_names, DEFAULT_COUNT_LOOKUP)
+    )
+
+
+def test_classify_snapshots_weekly_and_yearly() -> None:
+    """test_classify_snapshots_weekly_and_yearly."""
+    snapshot_names = auto_snapshots(datetime(2024, 12, 28, tzinfo=UTC), 10, timedelta(days=1))
+
+    buckets = classify_snapshots(snapshot_names, get_tiers({"daily": 1, "weekly": 1, "monthly": 1, "yearly": 1}))
+
+    assert buckets == {
+        "yearly": ["auto_202501010000"],
+        "monthly": [],
+        "weekly": ["auto_202412300000", "auto_202501060000"],
+        "daily": [
+            "auto_202412280000",
+            "auto_202412290000",
+            "auto_202412310000",
+            "auto_202501020000",
+            "auto_202501030000",
+            "auto_202501040000",
+            "auto_202501050000",
+        ],
+    }
+
+
+def test_classify_snapshots_custom_tiers() -> None:
+    """test_classify_snapshots_custom_tiers."""
+    snapshot_names = auto_snapshots(datetime(2024, 1, 1, tzinfo=UTC), 24, timedelta(hours=1))
+
+    buckets = classify_snapshots(snapshot_names, get_tiers({"hourly": 1, "6_hour": 1, "30_min": 1}))
+
+    assert buckets["6_hour"] == [
+        "auto_202401010000",
+        "auto_202401010600",
+        "auto_202401011200",
+        "auto_202401011800",
+    ]
+    assert len(buckets["hourly"]) == 20  # noqa: PLR2004
+    assert buckets["30_min"] == []
+
+
+def test_get_tiers_unknown() -> None:
+    """test_get_tiers_unknown."""
+    with pytest.raises(ValueError, match="Unknown retention tier name='fortnightly'"):
+        get_tiers({"fortnightly": 1})
+
+
+def test_get_unmatched_times() -> None:
+    """Test snapshots taken more often than the shortest tier are unmatched."""
+    assert get_unmatched_times({"15_min": 4, "hourly": 12}, 15) == []
+    assert get_unmatched_times({"15_min": 4, "hourly": 12}, 5)[:3] == ["00:05", "00:10", "00:20"]
+    assert get_unmatched_times({"daily": 7}, 60) == [f"{hour:02}:00" for hour in range(1, 24)]
+
+
+def test_parse_snapshot_name() -> None:
+    """test_parse_snapshot_name."""
+    parse_snapshot_name.cache_clear()
+
+    assert parse_snapshot_name("auto_202509150415") == datetime(2025, 9, 15, 4, 15, tzinfo=UTC)
+    assert parse_snapshot_name("auto_202509150415") == datetime(2025, 9, 15, 4, 15, tzinfo=UTC)
+    assert parse_snapshot_name("auto_202513150415") is None
+    assert parse_snapshot_name("manual") is None
+    assert parse_snapshot_name.cache_info().hits == 1
+
+
+def create_snapshot(name: str, creation: datetime, createtxg: int) -> Snapshot:
+    """Build a snapshot with a creation time."""
+    return Snapshot(
+        {
+            "name": f"pool/data@{name}",
+            "createtxg": str(createtxg),
+            "properties": {"creation": {"value": str(int(creation.timestamp()))}},
+        }
+    )
+
+
+def test_creation_retention_plan() -> None:
+    """test_creation_retention_plan keeps the newest snapshot of each period whatever the names are."""
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    snapshots = [
+        create_snapshot(f"snap{index}", start + timedelta(minutes=20) * index, index) for index in range(3 * 24 * 3)
+    ]
+    snapshots.append(create_snapshot("manual", start + timedelta(days=10), 1000))
+
+    plan = plan_retention(snapshots, {"hourly": 3, "daily": 2}, RetentionEngine.CREATION)
+
+    # manual and snap215 are the newest of their hour and of their day
+    assert plan.keep == ["snap212", "snap215", "manual"]
+    assert len(plan.delete) == len(snapshots) - len(plan.keep)
+    assert plan.delete[0] == "snap0"
+
+
+def test_creation_retention_plan_same_creation() -> None:
+    """test_creation_retention_plan orders snapshots created in the same second by createtxg."""
+    creation = datetime(2024, 1, 1, tzinfo=UTC)
+    snapshots = [create_snapshot("second", creation, 2), create_snapshot("first", creation, 1)]
+
+    plan = plan_retention(snapshots, {"hourly": 1}, RetentionEngine.CREATION)
+
+    assert plan == RetentionPlan(keep=["second"], delete=["first"])
+
+
+def test_name_retention_plan_keeps_other_snapshots() -> None:
+    """test_name_retention_plan keeps snapshots that are not auto snapshots."""
+    snapshots = [
+        create_snapshot(name, datetime(2024, 1, 1, tzinfo=UTC), index)
+        for index, name in enumerate(("auto_202401010100", "auto_202401010200", "manual"))
+    ]
+
+    plan = plan_retention(snapshots, {"hourly": 1})
+
+    assert plan == RetentionPlan(keep=["auto_202401010200", "manual"], delete=["auto_202401010100"])
@@ -2,18 +2,26 @@
 
 from __future__ import annotations
 
+import json
+import sys
 from pathlib import Path
+from signal import SIGTERM
+from threading import Event
 from typing import TYPE_CHECKING
 
 import pytest
 from pytest_mock import MockerFixture
 
-from system_tools.system_tests.validate_system import main
+from system_tools.common.instrumentation import record_command
+from system_tools.system_tests.checks import CheckStateStore
+from system_tools.system_tests.validate_system import ValidationDaemon, cli, daemon, main
 
 if TYPE_CHECKING:
     from pyfakefs.fake_filesystem import FakeFilesystem
     from pytest_mock import MockerFixture
 
+    from system_tools.common import TextfileMetrics
+
 VALIDATE_SYSTEM = "system_tools.system_tests.validate_system"
 
 
@@ -29,6 +37,23 @@ def test_validate_system(mocker: MockerFixture, fs: FakeFilesystem) -> None:
     main(Path("/mock_snapshot_config.toml"))
 
 
+def test_validate_system_stats_file(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """test_validate_system_stats_file."""
+    fs.create_file("/mock_snapshot_config.toml", contents='services = ["docker"]\n')
+
+    def fake_systemd_tests(service_names: list[str], metrics: TextfileMetrics) -> list[str]:
+        assert metrics is not None
+        record_command(f"systemctl is-active {service_names[0]}", 0.5, 7)
+        return []
+
+    mocker.patch(f"{VALIDATE_SYSTEM}.systemd_tests", side_effect=fake_systemd_tests)
+    main(Path("/mock_snapshot_config.toml"), stats_file=Path("/stats.json"))
+
+    stats = json.loads(Path("/stats.json").read_text())
+    assert stats["systemctl is-active"]["count"] == 1
+    assert stats["systemctl is-active"]["output_bytes"] == 7  # noqa: PLR2004
+
+
 def test_validate_system_errors(mocker: MockerFixture, fs: FakeFilesystem) -> None:
     """test_validate_system_errors."""
     fs.create_file(
@@ -58,3 +83,168 @@ def test_validate_system_execution(mocker: MockerFixture, fs: FakeFilesystem) ->
         main(Path("/mock_snapshot_config.toml"))
 
     assert exception_info.value.code == 1
+
+
+def test_validate_system_hung_check(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test a hung zpool check times out and the systemd errors are still reported."""
+    fs.create_file("/mock_snapshot_config.toml", contents='zpools = ["root_pool"]\nservices = ["docker"]\n')
+
+    release = Event()
+    mocker.patch(f"{VALIDATE_SYSTEM}.ZPOOL_CHECK_TIMEOUT_SECS", 0.1)
+
+    def hung_zpool_tests(*_: object, metrics: TextfileMetrics, **__: object) -> list[str]:
+        metrics.add("zpool_capacity_percent", 50, "How full the pool is.", {"pool": "root_pool"})
+        release.wait(10)
+        return []
+
+    mocker.patch(f"{VALIDATE_SYSTEM}.zpool_tests", side_effect=hung_zpool_tests)
+
+    def failed_systemd_tests(*_: object, metrics: TextfileMetrics) -> list[str]:
+        metrics.add("systemd_service_restarts", 3, "How often the service restarted.", {"service": "docker"})
+        return ["docker is failed (failed)"]
+
+    mocker.patch(f"{VALIDATE_SYSTEM}.systemd_tests", side_effect=failed_systemd_tests)
+    mock_signal_alert = mocker.patch(f"{VALIDATE_SYSTEM}.signal_alert")
+
+    with pytest.raises(SystemExit):
+        main(Path("/mock_snapshot_config.toml"), textfile=Path("/validate_system.prom"))
+    release.set()
+
+    (alert,), _ = mock_signal_alert.call_args
+    assert "zpool check timed out after 0.1s" in alert
+    assert "docker is failed (failed)" in alert
+    textfile = Path("/validate_system.prom").read_text()
+    assert 'validate_system_check_timed_out{check="zpool"} 1' in textfile
+    # The metrics of a check that timed out are left out, it may still be recording them
+    assert "zpool_capacity_percent" not in textfile
+    assert 'systemd_service_restarts{service="docker"} 3' in textfile
+
+
+def test_validate_system_iostat(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test the iostat check only runs for the pools listed under iostat_zpools."""
+    fs.create_file("/mock_snapshot_config.toml", contents='iostat_zpools = ["storage"]\n')
+
+    mock_zpool_iostat_tests = mocker.patch(
+        f"{VALIDATE_SYSTEM}.zpool_iostat_tests",
+        return_value=["storage mirror-0 sdb write latency 50.0ms is 250.0x the 0.2ms of its mirror partners"],
+    )
+    mock_zpool_tests = mocker.patch(f"{VALIDATE_SYSTEM}.zpool_tests")
+    mock_signal_alert = mocker.patch(f"{VALIDATE_SYSTEM}.signal_alert")
+
+    with pytest.raises(SystemExit):
+        main(Path("/mock_snapshot_config.toml"))
+
+    assert mock_zpool_iostat_tests.call_args.args == (["storage"],)
+    mock_zpool_tests.assert_not_called()
+    (alert,), _ = mock_signal_alert.call_args
+    assert "sdb write latency 50.0ms" in alert
+
+
+def test_validation_daemon_run_check(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test the daemon alerts when a check fails and recovers, not while it keeps failing."""
+    fs.create_dir("/metrics")
+    mocker.patch(f"{VALIDATE_SYSTEM}.gethostname", return_value="jeeves")
+    mock_systemd_tests = mocker.patch(f"{VALIDATE_SYSTEM}.systemd_tests", return_value=["docker is failed (failed)"])
+    mock_zpool_tests = mocker.patch(f"{VALIDATE_SYSTEM}.zpool_tests", return_value=[])
+    mock_signal_alert = mocker.patch(f"{VALIDATE_SYSTEM}.signal_alert")
+    validation_daemon = ValidationDaemon(
+        {"zpools": ["storage"], "services": ["docker"]},
+        CheckStateStore(Path("/state.json")),
+        textfile=Path("/metrics/validate_system.prom"),
+    )
+    assert validation_daemon.check_names == ["zpool", "systemd"]
+
+    validation_daemon.run_check("systemd")
+    validation_daemon.run_check("systemd")
+    validation_daemon.run_check("zpool")
+    mock_zpool_tests.assert_called_once()
+    mock_signal_alert.assert_called_once_with("jeeves systemd check failed: docker is failed (failed)")
+
+    mock_systemd_tests.return_value = []
+    validation_daemon.run_check("systemd")
+    (alert,), _ = mock_signal_alert.call_args
+    assert alert.startswith("jeeves systemd check recovered after ")
+    assert mock_signal_alert.call_count == 2  # noqa: PLR2004
+
+    textfile = Path("/metrics/validate_system.prom").read_text()
+    assert 'validate_system_check_success{check="systemd"} 1' in textfile
+    assert 'validate_system_check_success{check="zpool"} 1' in textfile
+    assert textfile.count('validate_system_check_success{check="systemd"}') == 1
+    assert json.loads(Path("/state.json").read_text())["systemd"]["ok"] is True
+
+
+def test_daemon(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test daemon schedules each check on its own interval and stops on SIGTERM."""
+    fs.create_file(
+        "/mock_snapshot_config.toml",
+        contents='zpools = ["storage"]\nservices = ["docker"]\ncheck_intervals = {zpool = 60}\n',
+    )
+    mock_scheduler = mocker.patch("apscheduler.schedulers.blocking.BlockingScheduler").return_value
+    mock_signal = mocker.patch(f"{VALIDATE_SYSTEM}.signal")
+    mock_set_default_timeout = mocker.patch(f"{VALIDATE_SYSTEM}.set_default_timeout")
+    mocker.patch.dict(f"{VALIDATE_SYSTEM}.environ", {"SYSTEM_TOOLS_COMMAND_TIMEOUT": ""})
+
+    daemon(Path("/mock_snapshot_config.toml"), interval_secs=15, state_file=Path("/state.json"))
+
+    mock_set_default_timeout.assert_called_once_with(60.0)
+    mock_scheduler.start.assert_called_once()
+    jobs = {call.kwargs["id"]: call for call in mock_scheduler.add_job.call_args_list}
+    assert list(jobs) == ["zpool", "systemd"]
+    assert jobs["zpool"].args[1].interval.total_seconds() == 60  # noqa: PLR2004
+    assert jobs["systemd"].args[1].interval.total_seconds() == 15  # noqa: PLR2004
+    assert jobs["systemd"].kwargs["args"] == ("systemd",)
+    validation_daemon = jobs["systemd"].args[0].__self__
+    assert isinstance(validation_daemon, ValidationDaemon)
+    assert validation_daemon.state_store.state_file == Path("/state.json")
+
+    handlers = {call.args[0]: call.args[1] for call in mock_signal.call_args_list}
+    handlers[SIGTERM](SIGTERM, None)
+    mock_scheduler.shutdown.assert_called_once_with(wait=False)
+
+
+def test_daemon_iostat_sampler(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test the daemon keeps one zpool iostat running for the iostat check and stops it on exit."""
+    fs.create_file("/mock_snapshot_config.toml", contents='iostat_zpools = ["storage"]\n')
+    mock_scheduler = mocker.patch("apscheduler.schedulers.blocking.BlockingScheduler").return_value
+    mocker.patch(f"{VALIDATE_SYSTEM}.signal")
+    mock_sampler_class = mocker.patch(f"{VALIDATE_SYSTEM}.ZpoolIostatSampler")
+    mock_sampler = mock_sampler_class.return_value
+    mock_zpool_iostat_tests = mocker.patch(f"{VALIDATE_SYSTEM}.zpool_iostat_tests", return_value=[])
+
+    daemon(Path("/mock_snapshot_config.toml"))
+
+    mock_sampler_class.assert_called_once_with(["storage"], 5)
+    mock_sampler.start.assert_called_once()
+    mock_sampler.stop.assert_called_once()
+    validation_daemon = mock_scheduler.add_job.call_args.args[0].__self__
+    assert validation_daemon.iostat_sampler is mock_sampler
+
+    validation_daemon.run_check("zpool_iostat")
+    assert mock_zpool_iostat_tests.call_args.kwargs["sampler"] is mock_sampler
+
+
+def test_cli_daemon(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test cli runs the daemon for `validate_system daemon`, without typer for a lone configuration file."""
+    mock_run = mocker.patch("typer.run")
+    mock_main = mocker.patch(f"{VALIDATE_SYSTEM}.main")
+    mock_daemon = mocker.patch(f"{VALIDATE_SYSTEM}.daemon")
+
+    monkeypatch.setattr("sys.argv", ["validate_system", "daemon", "/etc/validate_system.toml"])
+    cli()
+    mock_daemon.assert_called_once_with(Path("/etc/validate_system.toml"))
+    assert sys.argv == ["validate_system", "/etc/validate_system.toml"]
+
+    monkeypatch.setattr("sys.argv", ["validate_system", "/etc/validate_system.toml"])
+    cli()
+    mock_main.assert_called_once_with(Path("/etc/validate_system.toml"))
+    mock_run.assert_not_called()
+
+    monkeypatch.setattr(
+        "sys.argv", ["validate_system", "daemon", "/etc/validate_system.toml", "--textfile", "/metrics.prom"]
+    )
+    cli()
+    mock_run.assert_called_once_with(mock_daemon)
+
+    monkeypatch.setattr("sys.argv", ["validate_system", "--help"])
+    cli()
+    mock_run.assert_called_with(mock_main)
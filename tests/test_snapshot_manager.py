@@ -2,13 +2,31 @@
 
 from __future__ import annotations
 
-from datetime import UTC, datetime
+import logging
+import sys
+from datetime import UTC, datetime, timedelta
+from os import environ
 from pathlib import Path
+from signal import SIGHUP, SIGTERM
+from threading import Event, Thread
+from time import perf_counter, sleep
 from typing import TYPE_CHECKING
 
 import pytest
 
-from system_tools.tools.snapshot_manager import get_snapshots_to_delete, get_time_stamp, load_config_data, main
+from system_tools.tools.retention import RetentionEngine
+from system_tools.tools.snapshot_manager import (
+    RunOptions,
+    SnapshotMetrics,
+    cli,
+    daemon,
+    get_snapshots_to_delete,
+    get_time_stamp,
+    load_config_data,
+    main,
+    prune_datasets,
+    run_snapshot_manager,
+)
 from system_tools.zfs.dataset import Dataset, Snapshot
 
 if TYPE_CHECKING:
@@ -34,8 +52,16 @@ def test_main(mocker: MockerFixture, fs: FakeFilesystem) -> None:
 
     mock_dataset = mocker.MagicMock(spec=Dataset)
     mock_dataset.name = "test_dataset"
-    mock_dataset.create_snapshot.return_value = "snapshot created"
     mock_get_datasets = mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=(mock_dataset,))
+    mock_create_snapshots = mocker.patch(
+        f"{SNAPSHOT_MANAGER}.create_snapshots",
+        return_value={"test_dataset": "snapshot created"},
+    )
+    mock_snapshot = create_mock_snapshot(mocker, "auto_202301010000")
+    mock_get_snapshots_by_dataset = mocker.patch(
+        f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset",
+        return_value={"test_dataset": [mock_snapshot]},
+    )
 
     mock_get_snapshots_to_delete = mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_to_delete")
     mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
@@ -45,6 +71,8 @@ def test_main(mocker: MockerFixture, fs: FakeFilesystem) -> None:
 
     mock_signal_alert.assert_not_called()
     mock_get_datasets.assert_called_once()
+    mock_create_snapshots.assert_called_once_with([mock_dataset], "2023-01-01T00:00:00")
+    mock_get_snapshots_by_dataset.assert_called_once_with(fields=("creation",))
     mock_get_snapshots_to_delete.assert_called_once_with(
         mock_dataset,
         {
@@ -53,7 +81,104 @@ def test_main(mocker: MockerFixture, fs: FakeFilesystem) -> None:
             "daily": 0,
             "monthly": 0,
         },
+        [mock_snapshot],
+        retention=RetentionEngine.NAME,
+        dry_run=False,
+        metrics=SnapshotMetrics(datasets=1, created=1),
+    )
+
+
+def test_main_inventory(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test main reads the snapshots of the snapshotted pools from the inventory cache."""
+    load_config_data.cache_clear()
+
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_time_stamp", return_value="2023-01-01T00:00:00")
+
+    mock_datasets = [mocker.MagicMock(spec=Dataset) for _ in range(3)]
+    for mock_dataset, name in zip(mock_datasets, ("tank/data", "tank", "pool/data"), strict=True):
+        mock_dataset.name = name
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=mock_datasets)
+    mocker.patch(
+        f"{SNAPSHOT_MANAGER}.create_snapshots",
+        return_value=dict.fromkeys(("tank/data", "tank", "pool/data"), "snapshot created"),
     )
+    mock_get_snapshots_by_dataset = mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset")
+    mock_inventory = mocker.patch(f"{SNAPSHOT_MANAGER}.SnapshotInventory")
+    mock_inventory.return_value.__enter__.return_value.load.return_value = {}
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_to_delete", return_value=[])
+    mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
+    fs.create_file("/mock_snapshot_config.toml", contents='["default"]\nhourly = 24\n')
+
+    main(Path("/mock_snapshot_config.toml"), inventory=Path("/inventory.sqlite"))
+
+    mock_get_snapshots_by_dataset.assert_not_called()
+    mock_inventory.assert_called_once_with(Path("/inventory.sqlite"))
+    mock_inventory.return_value.__enter__.return_value.load.assert_called_once_with(["pool", "tank"])
+
+
+def test_main_textfile(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test main writes the run metrics for the textfile collector."""
+    load_config_data.cache_clear()
+
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_time_stamp", return_value="auto_202301010300")
+
+    mock_dataset = mocker.MagicMock(spec=Dataset)
+    mock_dataset.name = "pool/data"
+    mock_dataset.delete_snapshots.return_value = {"auto_202301010100": None, "auto_202301010200": "dataset is busy"}
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=(mock_dataset,))
+    mocker.patch(f"{SNAPSHOT_MANAGER}.create_snapshots", return_value={"pool/data": "snapshot created"})
+    snapshots = [
+        create_mock_snapshot(mocker, name) for name in ("auto_202301010100", "auto_202301010200", "auto_202301010300")
+    ]
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset", return_value={"pool/data": snapshots})
+    mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
+    fs.create_file("/mock_snapshot_config.toml", contents='["default"]\nhourly = 1\n')
+    fs.create_dir("/textfile")
+
+    main(Path("/mock_snapshot_config.toml"), textfile=Path("/textfile/snapshot_manager.prom"))
+
+    mock_signal_alert.assert_called_once_with("pool/data@auto_202301010200 failed to delete: dataset is busy")
+    lines = Path("/textfile/snapshot_manager.prom").read_text().splitlines()
+    assert "snapshot_manager_success 1" in lines
+    assert "snapshot_manager_datasets 1" in lines
+    assert 'snapshot_manager_snapshots{result="created"} 1' in lines
+    assert 'snapshot_manager_snapshots{result="create_failed"} 0' in lines
+    assert 'snapshot_manager_snapshots{result="deleted"} 1' in lines
+    assert 'snapshot_manager_snapshots{result="delete_failed"} 1' in lines
+
+
+def test_main_dry_run(mocker: MockerFixture, fs: FakeFilesystem, caplog: pytest.LogCaptureFixture) -> None:
+    """Test main dry run logs the creation retention plan without creating or deleting snapshots."""
+    load_config_data.cache_clear()
+
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_time_stamp", return_value="2023-01-01T00:00:00")
+
+    mock_dataset = mocker.MagicMock(spec=Dataset)
+    mock_dataset.name = "test_dataset"
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=(mock_dataset,))
+    mock_create_snapshots = mocker.patch(f"{SNAPSHOT_MANAGER}.create_snapshots")
+    snapshots = [
+        Snapshot(
+            {
+                "name": f"test_dataset@{name}",
+                "createtxg": str(createtxg),
+                "properties": {"creation": {"value": str(1_700_000_000 + createtxg * 3600)}},
+            }
+        )
+        for createtxg, name in enumerate(("old", "manual", "new"))
+    ]
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset", return_value={"test_dataset": snapshots})
+    mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
+    fs.create_file("/mock_snapshot_config.toml", contents='["default"]\nhourly = 2\n')
+
+    with caplog.at_level(logging.INFO):
+        main(Path("/mock_snapshot_config.toml"), retention=RetentionEngine.CREATION, dry_run=True)
+
+    mock_create_snapshots.assert_not_called()
+    mock_dataset.delete_snapshots.assert_not_called()
+    mock_signal_alert.assert_not_called()
+    assert "test_dataset would keep ['manual', 'new']" in caplog.text
+    assert "test_dataset would delete ['old']" in caplog.text
 
 
 def test_main_create_snapshot_failure(mocker: MockerFixture, fs: FakeFilesystem) -> None:
@@ -64,8 +189,9 @@ def test_main_create_snapshot_failure(mocker: MockerFixture, fs: FakeFilesystem)
 
     mock_dataset = mocker.MagicMock(spec=Dataset)
     mock_dataset.name = "test_dataset"
-    mock_dataset.create_snapshot.return_value = "snapshot not created"
     mock_get_datasets = mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=(mock_dataset,))
+    mocker.patch(f"{SNAPSHOT_MANAGER}.create_snapshots", return_value={"test_dataset": "snapshot not created"})
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset", return_value={})
 
     mock_get_snapshots_to_delete = mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_to_delete")
     mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
@@ -78,6 +204,36 @@ def test_main_create_snapshot_failure(mocker: MockerFixture, fs: FakeFilesystem)
     mock_get_snapshots_to_delete.assert_not_called()
 
 
+def test_main_excluded_dataset(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test main skips excluded datasets."""
+    load_config_data.cache_clear()
+
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_time_stamp", return_value="2023-01-01T00:00:00")
+
+    mock_dataset = mocker.MagicMock(spec=Dataset)
+    mock_dataset.name = "test_dataset"
+    mock_excluded_dataset = mocker.MagicMock(spec=Dataset)
+    mock_excluded_dataset.name = "excluded_dataset"
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=(mock_dataset, mock_excluded_dataset))
+    mock_create_snapshots = mocker.patch(
+        f"{SNAPSHOT_MANAGER}.create_snapshots",
+        return_value={"test_dataset": "snapshot created"},
+    )
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset", return_value={})
+
+    mock_get_snapshots_to_delete = mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_to_delete")
+    mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
+    mock_snapshot_config_toml = (
+        'exclude = ["excluded_dataset"]\n["default"]\n15_min = 8\nhourly = 24\ndaily = 0\nmonthly = 0\n'
+    )
+    fs.create_file("/mock_snapshot_config.toml", contents=mock_snapshot_config_toml)
+    main(Path("/mock_snapshot_config.toml"))
+
+    mock_signal_alert.assert_not_called()
+    mock_create_snapshots.assert_called_once_with([mock_dataset], "2023-01-01T00:00:00")
+    mock_get_snapshots_to_delete.assert_called_once()
+
+
 def test_main_exception(mocker: MockerFixture, fs: FakeFilesystem) -> None:
     """Test main."""
     load_config_data.cache_clear()
@@ -86,7 +242,6 @@ def test_main_exception(mocker: MockerFixture, fs: FakeFilesystem) -> None:
 
     mock_dataset = mocker.MagicMock(spec=Dataset)
     mock_dataset.name = "test_dataset"
-    mock_dataset.create_snapshot.return_value = "snapshot created"
     mock_get_datasets = mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", side_effect=Exception("test"))
 
     mock_get_snapshots_to_delete = mocker.patch(f"{SNAPSHOT_MANAGER}.get_snapshots_to_delete")
@@ -111,14 +266,33 @@ def test_get_snapshots_to_delete(mocker: MockerFixture) -> None:
     mock_dataset = mocker.MagicMock(spec=Dataset)
     mock_dataset.name = "test_dataset"
     mock_dataset.get_snapshots.return_value = (mock_snapshot_0, mock_snapshot_1)
-    mock_dataset.delete_snapshot.return_value = None
+    mock_dataset.delete_snapshots.return_value = {"auto_202509150415": None}
 
     mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
 
     get_snapshots_to_delete(mock_dataset, {"15_min": 1, "hourly": 0, "daily": 0, "monthly": 0})
 
     mock_signal_alert.assert_not_called()
-    mock_dataset.delete_snapshot.assert_called_once_with("auto_202509150415")
+    mock_dataset.delete_snapshots.assert_called_once_with(["auto_202509150415"])
+
+
+def test_get_snapshots_to_delete_with_snapshots(mocker: MockerFixture) -> None:
+    """test_get_snapshots_to_delete_with_snapshots."""
+    mock_snapshot_0 = create_mock_snapshot(mocker, "auto_202509150415")
+    mock_snapshot_1 = create_mock_snapshot(mocker, "auto_202509150430")
+
+    mock_dataset = mocker.MagicMock(spec=Dataset)
+    mock_dataset.name = "test_dataset"
+    mock_dataset.delete_snapshots.return_value = {"auto_202509150415": None}
+
+    get_snapshots_to_delete(
+        mock_dataset,
+        {"15_min": 1, "hourly": 0, "daily": 0, "monthly": 0},
+        [mock_snapshot_0, mock_snapshot_1],
+    )
+
+    mock_dataset.get_snapshots.assert_not_called()
+    mock_dataset.delete_snapshots.assert_called_once_with(["auto_202509150415"])
 
 
 def test_get_snapshots_to_delete_no_snapshot(mocker: MockerFixture) -> None:
@@ -126,14 +300,14 @@ def test_get_snapshots_to_delete_no_snapshot(mocker: MockerFixture) -> None:
     mock_dataset = mocker.MagicMock(spec=Dataset)
     mock_dataset.name = "test_dataset"
     mock_dataset.get_snapshots.return_value = ()
-    mock_dataset.delete_snapshot.return_value = None
+    mock_dataset.delete_snapshots.return_value = {}
 
     mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
 
     get_snapshots_to_delete(mock_dataset, {"15_min": 1, "hourly": 0, "daily": 0, "monthly": 0})
 
     mock_signal_alert.assert_not_called()
-    mock_dataset.delete_snapshot.assert_not_called()
+    mock_dataset.delete_snapshots.assert_not_called()
 
 
 def test_get_snapshots_to_delete_errored(mocker: MockerFixture) -> None:
@@ -144,19 +318,241 @@ def test_get_snapshots_to_delete_errored(mocker: MockerFixture) -> None:
     mock_dataset = mocker.MagicMock(spec=Dataset)
     mock_dataset.name = "test_dataset"
     mock_dataset.get_snapshots.return_value = (mock_snapshot_0, mock_snapshot_1)
-    mock_dataset.delete_snapshot.return_value = "snapshot has dependent clones"
+    mock_dataset.delete_snapshots.return_value = {"auto_202509150415": "snapshot has dependent clones"}
+
+    errors = get_snapshots_to_delete(mock_dataset, {"15_min": 1, "hourly": 0, "daily": 0, "monthly": 0})
+
+    assert errors == ["test_dataset@auto_202509150415 failed to delete: snapshot has dependent clones"]
+    mock_dataset.delete_snapshots.assert_called_once_with(["auto_202509150415"])
+
+
+def test_main_aggregates_errors(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test main sends one alert for every failure."""
+    load_config_data.cache_clear()
 
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_time_stamp", return_value="auto_202301010000")
+
+    mock_datasets = [mocker.MagicMock(spec=Dataset) for _ in range(3)]
+    for index, mock_dataset in enumerate(mock_datasets):
+        mock_dataset.name = f"pool/dataset_{index}"
+        mock_dataset.delete_snapshots.return_value = {"auto_202212310015": "snapshot has dependent clones"}
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", return_value=mock_datasets)
+    mocker.patch(
+        f"{SNAPSHOT_MANAGER}.create_snapshots",
+        return_value={
+            "pool/dataset_0": "snapshot created",
+            "pool/dataset_1": "snapshot created",
+            "pool/dataset_2": "Failed to create snapshot",
+        },
+    )
+    mocker.patch(
+        f"{SNAPSHOT_MANAGER}.get_snapshots_by_dataset",
+        return_value={
+            "pool/dataset_0": [create_mock_snapshot(mocker, "auto_202212310015")],
+            "pool/dataset_1": [create_mock_snapshot(mocker, "auto_202212310015")],
+        },
+    )
     mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
+    fs.create_file(
+        "/mock_snapshot_config.toml", contents='["default"]\n15_min = 0\nhourly = 0\ndaily = 0\nmonthly = 0\n'
+    )
 
-    get_snapshots_to_delete(mock_dataset, {"15_min": 1, "hourly": 0, "daily": 0, "monthly": 0})
+    main(Path("/mock_snapshot_config.toml"), jobs=2)
 
     mock_signal_alert.assert_called_once_with(
-        "test_dataset@auto_202509150415 failed to delete: snapshot has dependent clones"
+        "pool/dataset_2 failed to create snapshot auto_202301010000\n"
+        "pool/dataset_0@auto_202212310015 failed to delete: snapshot has dependent clones\n"
+        "pool/dataset_1@auto_202212310015 failed to delete: snapshot has dependent clones"
+    )
+
+
+def test_prune_datasets_exception(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test prune_datasets raises the exceptions of every dataset."""
+    load_config_data.cache_clear()
+    fs.create_file(
+        "/mock_snapshot_config.toml", contents='["default"]\n15_min = 0\nhourly = 0\ndaily = 0\nmonthly = 0\n'
     )
-    mock_dataset.delete_snapshot.assert_called_once_with("auto_202509150415")
+
+    mock_dataset = mocker.MagicMock(spec=Dataset)
+    mock_dataset.name = "pool/dataset"
+    mock_dataset.delete_snapshots.side_effect = RuntimeError("zfs is gone")
+
+    with pytest.raises(BaseExceptionGroup, match="Failed to prune datasets"):
+        prune_datasets(
+            Path("/mock_snapshot_config.toml"),
+            [mock_dataset],
+            {"pool/dataset": [create_mock_snapshot(mocker, "auto_202212310015")]},
+        )
+
+
+def test_prune_datasets_benchmark(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Compare the wall time of pruning datasets with a fake zfs command that takes 0.1s per call."""
+    load_config_data.cache_clear()
+    fake_zfs = tmp_path / "zfs"
+    fake_zfs.write_text("#!/bin/sh\nsleep 0.1\n")
+    fake_zfs.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{environ['PATH']}")
+    config_file = tmp_path / "snapshot_config.toml"
+    config_file.write_text('["default"]\n15_min = 0\nhourly = 0\ndaily = 0\nmonthly = 0\n')
+
+    datasets = [Dataset(f"pool_{index % 2}/dataset_{index}", {}) for index in range(8)]
+    snapshot_data = {"name": "pool/dataset@auto_202212310015", "createtxg": "1", "properties": {}}
+    snapshots_by_dataset = {dataset.name: [Snapshot(snapshot_data)] for dataset in datasets}
+
+    timings: dict[tuple[int, int | None], float] = {}
+    for jobs, pool_jobs in ((1, None), (8, 1), (8, None)):
+        start = perf_counter()
+        errors = prune_datasets(config_file, datasets, snapshots_by_dataset, jobs, pool_jobs)
+        timings[jobs, pool_jobs] = perf_counter() - start
+        assert errors == []
+
+    logging.info(f"{timings=}")
+
+    assert timings[8, None] < timings[8, 1] < timings[1, None]
 
 
 def test_get_time_stamp(mocker: MockerFixture) -> None:
     """Test get_time_stamp."""
     mocker.patch("system_tools.tools.snapshot_manager.utcnow", return_value=datetime(2023, 1, 1, 0, 0, 0, tzinfo=UTC))
     assert get_time_stamp() == "auto_202301010000"
+
+
+def test_get_time_stamp_interval(mocker: MockerFixture) -> None:
+    """Test get_time_stamp rounds down to the interval."""
+    mocker.patch(f"{SNAPSHOT_MANAGER}.utcnow", return_value=datetime(2023, 1, 1, 0, 14, 0, tzinfo=UTC))
+    assert get_time_stamp(5) == "auto_202301010010"
+
+
+def test_run_snapshot_manager_failure(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test run_snapshot_manager reports a failed run instead of exiting, so the daemon keeps running."""
+    load_config_data.cache_clear()
+    mocker.patch(f"{SNAPSHOT_MANAGER}.get_datasets", side_effect=Exception("test"))
+    mock_signal_alert = mocker.patch(f"{SNAPSHOT_MANAGER}.signal_alert")
+    fs.create_file("/mock_snapshot_config.toml", contents='["default"]\nhourly = 24\n')
+
+    assert run_snapshot_manager(Path("/mock_snapshot_config.toml"), RunOptions()) is False
+    mock_signal_alert.assert_called_once_with("snapshot_manager failed")
+
+
+def test_daemon(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test daemon schedules runs and reloads the configuration on SIGHUP."""
+    load_config_data.cache_clear()
+    fs.create_file("/mock_snapshot_config.toml", contents='["default"]\n5_min = 12\nhourly = 24\n')
+    mock_scheduler = mocker.patch("apscheduler.schedulers.blocking.BlockingScheduler").return_value
+    mock_inventory = mocker.patch(f"{SNAPSHOT_MANAGER}.SnapshotInventory")
+    mock_signal = mocker.patch(f"{SNAPSHOT_MANAGER}.signal")
+
+    daemon(Path("/mock_snapshot_config.toml"), interval_minutes=5, jobs=4)
+
+    mock_inventory.assert_called_once_with(Path(":memory:"))
+    mock_scheduler.start.assert_called_once()
+    func, trigger = mock_scheduler.add_job.call_args.args
+    assert func is run_snapshot_manager
+    assert str(trigger.fields[6]) == "*/5"
+    config_file, options, snapshot_inventory = mock_scheduler.add_job.call_args.kwargs["args"]
+    assert config_file == Path("/mock_snapshot_config.toml")
+    assert options == RunOptions(jobs=4, interval_minutes=5)
+    assert snapshot_inventory is mock_inventory.return_value.__enter__.return_value
+
+    handlers = {call.args[0]: call.args[1] for call in mock_signal.call_args_list}
+    load_config_data(Path("/mock_snapshot_config.toml"))
+    handlers[SIGHUP](SIGHUP, None)
+    assert load_config_data.cache_info().currsize == 0
+
+    handlers[SIGTERM](SIGTERM, None)
+    mock_scheduler.shutdown.assert_called_once_with(wait=True)
+
+
+def test_daemon_stop_waits_for_run(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test SIGTERM during a run stops the daemon only after the run, so the inventory is not closed under it."""
+    from apscheduler.triggers.base import BaseTrigger  # type: ignore[import-untyped]
+
+    class FireNowTrigger(BaseTrigger):  # type: ignore[misc]
+        """Fires once now and then hourly, a run once trigger would remove its job and race the shutdown."""
+
+        def get_next_fire_time(self, previous_fire_time: datetime | None, now: datetime) -> datetime:
+            return now if previous_fire_time is None else previous_fire_time + timedelta(hours=1)
+
+    load_config_data.cache_clear()
+    fs.create_file("/mock_snapshot_config.toml", contents='["default"]\n15_min = 4\nhourly = 24\n')
+    mocker.patch("apscheduler.triggers.cron.CronTrigger", side_effect=lambda **_: FireNowTrigger())
+    mock_signal = mocker.patch(f"{SNAPSHOT_MANAGER}.signal")
+    mock_inventory = mocker.patch(f"{SNAPSHOT_MANAGER}.SnapshotInventory")
+    inventory_closed = Event()
+    mock_inventory.return_value.__exit__.side_effect = lambda *_: inventory_closed.set()
+
+    run_started = Event()
+    closed_during_run: list[bool] = []
+
+    def slow_run(*_: object) -> bool:
+        run_started.set()
+        sleep(0.3)
+        closed_during_run.append(inventory_closed.is_set())
+        return True
+
+    mocker.patch(f"{SNAPSHOT_MANAGER}.run_snapshot_manager", side_effect=slow_run)
+
+    def send_sigterm() -> None:
+        assert run_started.wait(10)
+        handlers = {call.args[0]: call.args[1] for call in mock_signal.call_args_list}
+        handlers[SIGTERM](SIGTERM, None)
+
+    sigterm = Thread(target=send_sigterm)
+    sigterm.start()
+    daemon(Path("/mock_snapshot_config.toml"))
+    sigterm.join()
+
+    assert closed_during_run == [False]
+    assert inventory_closed.is_set()
+
+
+def test_daemon_interval() -> None:
+    """Test daemon only accepts intervals that divide an hour."""
+    with pytest.raises(ValueError, match="must divide an hour"):
+        daemon(Path("/mock_snapshot_config.toml"), interval_minutes=7)
+
+
+def test_daemon_interval_tiers(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """Test daemon refuses an interval whose snapshots match none of the retention tiers of a dataset."""
+    load_config_data.cache_clear()
+    fs.create_file(
+        "/mock_snapshot_config.toml",
+        contents='["default"]\n15_min = 4\nhourly = 24\n\n["storage/media"]\n5_min = 12\nhourly = 24\n',
+    )
+    mock_scheduler = mocker.patch("apscheduler.schedulers.blocking.BlockingScheduler").return_value
+    mocker.patch(f"{SNAPSHOT_MANAGER}.SnapshotInventory")
+    mocker.patch(f"{SNAPSHOT_MANAGER}.signal")
+
+    with pytest.raises(ValueError, match=r"default tiers \['15_min', 'hourly'\] match no snapshot taken at 00:05"):
+        daemon(Path("/mock_snapshot_config.toml"), interval_minutes=5)
+    mock_scheduler.start.assert_not_called()
+
+    daemon(Path("/mock_snapshot_config.toml"), interval_minutes=15)
+    daemon(Path("/mock_snapshot_config.toml"), interval_minutes=5, retention=RetentionEngine.CREATION)
+    assert mock_scheduler.start.call_count == 2  # noqa: PLR2004
+    load_config_data.cache_clear()
+
+
+def test_cli_daemon(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test cli runs the daemon for `snapshot_manager daemon`, without typer for a lone configuration file."""
+    mock_run = mocker.patch("typer.run")
+    mock_main = mocker.patch(f"{SNAPSHOT_MANAGER}.main")
+    mock_daemon = mocker.patch(f"{SNAPSHOT_MANAGER}.daemon")
+
+    monkeypatch.setattr("sys.argv", ["snapshot_manager", "daemon", "/config.toml"])
+    cli()
+    mock_daemon.assert_called_once_with(Path("/config.toml"))
+    assert sys.argv == ["snapshot_manager", "/config.toml"]
+
+    monkeypatch.setattr("sys.argv", ["snapshot_manager", "/config.toml"])
+    cli()
+    mock_main.assert_called_once_with(Path("/config.toml"))
+    mock_run.assert_not_called()
+
+    monkeypatch.setattr("sys.argv", ["snapshot_manager", "daemon", "/config.toml", "--textfile", "/metrics.prom"])
+    cli()
+    mock_run.assert_called_once_with(mock_daemon)
+
+    monkeypatch.setattr("sys.argv", ["snapshot_manager", "--help"])
+    cli()
+    mock_run.assert_called_with(mock_main)
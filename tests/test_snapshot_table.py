@@ -0,0 +1,113 @@
+"""test_snapshot_table."""
+
+from __future__ import annotations
+
+import json
+import logging
+import tracemalloc
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from system_tools.zfs import Snapshot, SnapshotTable
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from pytest_mock import MockerFixture
+
+T = TypeVar("T")
+
+OUTPUT_VERSION = {"vers_major": 0, "vers_minor": 1, "command": "zfs list"}
+
+
+def snapshot_data(dataset: str, index: int) -> dict[str, Any]:
+    """Build the zfs list -j data of a snapshot."""
+    return {
+        "name": f"{dataset}@auto_{index:012d}",
+        "createtxg": str(1000 + index),
+        "properties": {
+            "creation": {"value": str(1620000000 + index * 900)},
+            "defer_destroy": {"value": "off"},
+            "guid": {"value": str(2**63 + index)},
+            "objsetid": {"value": str(5000 + index)},
+            "referenced": {"value": str(1024 * index)},
+            "used": {"value": str(512 * index)},
+            "userrefs": {"value": "0"},
+            "version": {"value": "5"},
+            "written": {"value": str(2048 * index)},
+        },
+    }
+
+
+class DictSnapshot:
+    """The Snapshot class before __slots__, kept as the benchmark baseline."""
+
+    def __init__(self, snapshot_data: dict[str, Any]) -> None:
+        """__init__."""
+        properties = snapshot_data["properties"]
+        self.createtxg = int(snapshot_data["createtxg"])
+        self.creation = datetime.fromtimestamp(int(properties["creation"]["value"]), tz=UTC)
+        self.defer_destroy = properties["defer_destroy"]["value"]
+        self.guid = int(properties["guid"]["value"])
+        self.name = snapshot_data["name"].split("@")[1]
+        self.objsetid = int(properties["objsetid"]["value"])
+        self.referenced = int(properties["referenced"]["value"])
+        self.used = int(properties["used"]["value"])
+        self.userrefs = int(properties["userrefs"]["value"])
+        self.version = int(properties["version"]["value"])
+        self.written = int(properties["written"]["value"])
+
+
+def measure(build: Callable[[], T]) -> tuple[int, T]:
+    """Measure the memory allocated by build."""
+    tracemalloc.start()
+    built = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, built
+
+
+def test_snapshot_table_load(mocker: MockerFixture) -> None:
+    """test_snapshot_table_load."""
+    zfs_list_data = {
+        "output_version": OUTPUT_VERSION,
+        "datasets": {
+            data["name"]: data
+            for data in (snapshot_data("pool/b", 2), snapshot_data("pool/a", 1), snapshot_data("pool/b", 0))
+        },
+    }
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_stream", return_value=[json.dumps(zfs_list_data)])
+
+    table = SnapshotTable.load("pool")
+
+    mock_bash.assert_called_once_with(
+        "zfs list -t snapshot -pHj -o name,creation,guid,referenced,used,written -r pool", check=True
+    )
+    assert len(table) == 3  # noqa: PLR2004
+    assert repr(table) == "SnapshotTable(snapshots=3 datasets=2)"
+    assert table.for_dataset("pool/b")["name"].to_list() == ["auto_000000000000", "auto_000000000002"]
+    assert table.for_dataset("pool/b")["creation"].to_list() == [
+        datetime(2021, 5, 3, 0, 0, tzinfo=UTC),
+        datetime(2021, 5, 3, 0, 30, tzinfo=UTC),
+    ]
+    assert table.frame["guid"].to_list() == [2**63 + 2, 2**63 + 1, 2**63]
+    by_dataset = table.by_dataset()
+    assert sorted(by_dataset) == ["pool/a", "pool/b"]
+    assert by_dataset["pool/a"]["used"].to_list() == [512]
+
+
+def test_snapshot_memory_benchmark() -> None:
+    """Compare the memory used to hold snapshots as dict objects, slotted objects and a SnapshotTable."""
+    snapshot_count = 20_000
+    raw_snapshots = [snapshot_data(f"pool/dataset_{index % 20}", index) for index in range(snapshot_count)]
+
+    dict_size, _ = measure(lambda: [DictSnapshot(data) for data in raw_snapshots])
+    slots_size, snapshots = measure(lambda: [Snapshot(data) for data in raw_snapshots])
+    table = SnapshotTable.from_snapshots(snapshots)
+    table_size = table.frame.estimated_size()
+
+    logging.info(f"{snapshot_count=} {dict_size=} {slots_size=} {table_size=}")
+
+    assert len(table) == snapshot_count
+    assert slots_size < dict_size
+    assert table_size < slots_size
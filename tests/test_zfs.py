@@ -1,13 +1,33 @@
 """Test zfs."""
 
+import asyncio
 import json
+import logging
+import os
+from collections.abc import Iterator
 from datetime import UTC, datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any
 from unittest.mock import call
 
 import pytest
 from pytest_mock import MockerFixture
 
-from system_tools.zfs import Dataset, Snapshot, Zpool, get_datasets
+from system_tools.zfs import (
+    Dataset,
+    Snapshot,
+    Zpool,
+    async_get_datasets,
+    async_get_zpools,
+    create_snapshots,
+    get_datasets,
+    get_snapshots_by_dataset,
+    get_zpools,
+    iter_datasets,
+    iter_snapshot_properties,
+    iter_snapshots,
+)
 from system_tools.zfs.dataset import _zfs_list
 from system_tools.zfs.zpool import _zpool_list
 
@@ -27,7 +47,7 @@ SAMPLE_SNAPSHOT_DATA = {
     "name": "pool/dataset@snap1",
 }
 
-SAMPLE_DATASET_DATA = {
+SAMPLE_DATASET_DATA: dict[str, Any] = {
     "output_version": {"vers_major": 0, "vers_minor": 1, "command": "zfs list"},
     "datasets": {
         "pool/dataset": {
@@ -119,7 +139,7 @@ def test_dataset_initialization(mocker: MockerFixture) -> None:
 
     dataset = Dataset("pool/dataset")
 
-    assert dataset.__dict__ == {
+    expected = {
         "aclinherit": "restricted",
         "aclmode": "discard",
         "acltype": "off",
@@ -167,12 +187,13 @@ def test_dataset_initialization(mocker: MockerFixture) -> None:
         "written": 4096,
         "xattr": "on",
     }
+    assert {attribute: getattr(dataset, attribute) for attribute in expected} == expected
 
 
 def test_snapshot_initialization() -> None:
     """Test Snapshot class initialization with mocked ZFS data."""
     snapshot = Snapshot(SAMPLE_SNAPSHOT_DATA)
-    assert snapshot.__dict__ == {
+    expected = {
         "createtxg": 123,
         "creation": datetime(2021, 5, 3, 0, 0, tzinfo=UTC),
         "defer_destroy": "off",
@@ -185,6 +206,126 @@ def test_snapshot_initialization() -> None:
         "version": 1,
         "written": 2048,
     }
+    assert {attribute: getattr(snapshot, attribute) for attribute in expected} == expected
+
+
+def test_dataset_fields(mocker: MockerFixture) -> None:
+    """Test Dataset only fetches and parses the requested fields."""
+    zfs_list_data = {
+        "output_version": SAMPLE_DATASET_DATA["output_version"],
+        "datasets": {"pool/dataset": {"properties": {"used": {"value": "1024"}}}},
+    }
+    mock_zfs_list = mocker.patch("system_tools.zfs.dataset._zfs_list", return_value=zfs_list_data)
+
+    dataset = Dataset("pool/dataset", fields=("used",))
+
+    mock_zfs_list.assert_called_once_with("zfs list pool/dataset -pHj -o name,used")
+    assert not hasattr(dataset, "__dict__")
+    assert not hasattr(dataset, "_used")
+    assert dataset.used == 1024  # noqa: PLR2004
+    assert dataset._used == 1024  # type: ignore[attr-defined]  # noqa: PLR2004, SLF001
+    assert repr(dataset) == "self.name='pool/dataset'\nself.used=1024\n"
+    with pytest.raises(AttributeError, match="available was not loaded"):
+        _ = dataset.available
+
+
+def test_snapshot_repr() -> None:
+    """Test Snapshot string representation."""
+    assert repr(Snapshot(SAMPLE_SNAPSHOT_DATA)) == "name=snap1 used=512 refer=1024"
+    assert repr(Snapshot(SAMPLE_SNAPSHOT_DATA | {"properties": {}})) == "name=snap1"
+
+
+def test_delete_snapshots(mocker: MockerFixture) -> None:
+    """Test delete_snapshots destroys snapshots in batches."""
+    mocker.patch("system_tools.zfs.dataset.MAX_ARGUMENT_LENGTH", 40)
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_wrapper", return_value=("", 0))
+    dataset = Dataset("pool/dataset", {})
+
+    outcomes = dataset.delete_snapshots(["auto_1", "auto_2", "auto_3", "auto_4"])
+
+    assert outcomes == {"auto_1": None, "auto_2": None, "auto_3": None, "auto_4": None}
+    assert mock_bash.call_args_list == [
+        call("zfs destroy pool/dataset@auto_1,auto_2,auto_3"),
+        call("zfs destroy pool/dataset@auto_4"),
+    ]
+
+
+def test_delete_snapshots_failed_batch(mocker: MockerFixture) -> None:
+    """Test delete_snapshots retries a failed batch one snapshot at a time."""
+    mock_bash = mocker.patch(
+        "system_tools.zfs.dataset.bash_wrapper",
+        side_effect=[
+            ("cannot destroy snapshots", 1),
+            ("", 0),
+            ("cannot destroy 'pool/dataset@auto_2': snapshot has dependent clones\n", 1),
+            ("cannot destroy 'pool/dataset@auto_3': dataset is busy\n", 1),
+        ],
+    )
+    dataset = Dataset("pool/dataset", {})
+
+    outcomes = dataset.delete_snapshots(["auto_1", "auto_2", "auto_3"])
+
+    assert outcomes == {
+        "auto_1": None,
+        "auto_2": "snapshot has dependent clones",
+        "auto_3": "Failed to delete snapshot snapshot_name='auto_3' for pool/dataset",
+    }
+    assert mock_bash.call_args_list == [
+        call("zfs destroy pool/dataset@auto_1,auto_2,auto_3"),
+        call("zfs destroy pool/dataset@auto_1"),
+        call("zfs destroy pool/dataset@auto_2"),
+        call("zfs destroy pool/dataset@auto_3"),
+    ]
+
+
+def test_create_snapshots(mocker: MockerFixture) -> None:
+    """Test create_snapshots snapshots every dataset with one command."""
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_wrapper", return_value=("", 0))
+    datasets = [Dataset("pool/a", {}), Dataset("pool/b", {})]
+
+    statuses = create_snapshots(datasets, "auto_1")
+
+    assert statuses == {"pool/a": "snapshot created", "pool/b": "snapshot created"}
+    mock_bash.assert_called_once_with("zfs snapshot pool/a@auto_1 pool/b@auto_1")
+
+
+def test_create_snapshots_per_pool(mocker: MockerFixture) -> None:
+    """Test create_snapshots makes one call per pool, zfs rejects a snapshot call that spans pools."""
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_wrapper", return_value=("", 0))
+    datasets = [Dataset("pool1/a", {}), Dataset("pool2/b", {}), Dataset("pool1/c", {}), Dataset("pool2", {})]
+
+    statuses = create_snapshots(datasets, "auto_1")
+
+    assert statuses == dict.fromkeys(("pool1/a", "pool2/b", "pool1/c", "pool2"), "snapshot created")
+    assert mock_bash.call_args_list == [
+        call("zfs snapshot pool1/a@auto_1 pool1/c@auto_1"),
+        call("zfs snapshot pool2/b@auto_1 pool2@auto_1"),
+    ]
+
+
+def test_create_snapshots_fallback(mocker: MockerFixture) -> None:
+    """Test create_snapshots falls back to one snapshot at a time when the command fails."""
+    mocker.patch("system_tools.zfs.dataset.MAX_COMMAND_LENGTH", 30)
+    mock_bash = mocker.patch(
+        "system_tools.zfs.dataset.bash_wrapper",
+        side_effect=[("cannot create snapshots", 1), ("", 0), ("dataset does not exist", 1), ("", 0)],
+    )
+    mocker.patch.object(Dataset, "get_snapshots", return_value=[])
+    datasets = [Dataset("pool/a", {}), Dataset("pool/b", {}), Dataset("pool/c", {})]
+
+    statuses = create_snapshots(datasets, "auto_1")
+
+    assert statuses == {
+        "pool/a": "snapshot created",
+        "pool/b": "Failed to create snapshot auto_1 for pool/b",
+        "pool/c": "snapshot created",
+    }
+    assert mock_bash.call_args_list == [
+        call("zfs snapshot pool/a@auto_1 pool/b@auto_1"),
+        call("zfs snapshot pool/a@auto_1"),
+        call("zfs snapshot pool/b@auto_1"),
+        call("zfs snapshot pool/c@auto_1"),
+    ]
 
 
 def test_zfs_list_version_check(mocker: MockerFixture) -> None:
@@ -205,18 +346,210 @@ def test_zfs_list_version_check(mocker: MockerFixture) -> None:
 
 def test_get_datasets(mocker: MockerFixture) -> None:
     """Test get_datasets."""
+    properties = SAMPLE_DATASET_DATA["datasets"]["pool/dataset"]["properties"]
+    zfs_list_data = {
+        "output_version": SAMPLE_DATASET_DATA["output_version"],
+        "datasets": {
+            "pool": {"properties": properties},
+            "pool/dataset": {"properties": properties},
+            "pool/other": {"properties": properties},
+        },
+    }
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_stream", return_value=[json.dumps(zfs_list_data)])
+
+    datasets = get_datasets()
+
+    mock_bash.assert_called_once_with("zfs list -t filesystem -pHj -o all", check=True)
+    assert [dataset.name for dataset in datasets] == ["pool/dataset", "pool/other"]
+    assert datasets[1].mountpoint == "/pool/dataset"
+
+
+def test_get_datasets_root(mocker: MockerFixture) -> None:
+    """Test get_datasets with a root dataset."""
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_stream", return_value=[json.dumps(SAMPLE_DATASET_DATA)])
+
+    datasets = get_datasets("pool/dataset")
+
+    mock_bash.assert_called_once_with("zfs list -t filesystem -pHj -o all -r pool/dataset", check=True)
+    assert [dataset.name for dataset in datasets] == ["pool/dataset"]
+
+
+def test_get_datasets_benchmark(mocker: MockerFixture) -> None:
+    """Compare the forks and wall time of get_datasets against loading each dataset on its own."""
+    dataset_count = 2000
+    properties = SAMPLE_DATASET_DATA["datasets"]["pool/dataset"]["properties"]
+    dataset_names = [f"pool/dataset_{index}" for index in range(dataset_count)]
+    bulk_output = json.dumps(
+        {
+            "output_version": SAMPLE_DATASET_DATA["output_version"],
+            "datasets": {name: {"properties": properties} for name in dataset_names},
+        }
+    )
+
+    def fake_bash_wrapper(command: str) -> tuple[str, int]:
+        name = command.split()[2]
+        single_output = {
+            "output_version": SAMPLE_DATASET_DATA["output_version"],
+            "datasets": {name: {"properties": properties}},
+        }
+        return json.dumps(single_output), 0
+
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_wrapper", side_effect=fake_bash_wrapper)
+    start = perf_counter()
+    per_dataset = [Dataset(name) for name in dataset_names]
+    per_dataset_time = perf_counter() - start
+    per_dataset_forks = mock_bash.call_count
+
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_stream", return_value=[bulk_output])
+    start = perf_counter()
+    bulk = get_datasets()
+    bulk_time = perf_counter() - start
+    bulk_forks = mock_bash.call_count
+
+    logging.info(f"{per_dataset_forks=} {per_dataset_time=:.3f}s {bulk_forks=} {bulk_time=:.3f}s")
+
+    assert [dataset.name for dataset in bulk] == [dataset.name for dataset in per_dataset]
+    assert per_dataset_forks == dataset_count
+    assert bulk_forks == 1
+    assert bulk_time < per_dataset_time
+
+
+def test_get_snapshots_by_dataset(mocker: MockerFixture) -> None:
+    """Test get_snapshots_by_dataset."""
+    zfs_list_data = {
+        "output_version": SAMPLE_DATASET_DATA["output_version"],
+        "datasets": {
+            "pool/dataset@snap1": SAMPLE_SNAPSHOT_DATA,
+            "pool/dataset@snap2": SAMPLE_SNAPSHOT_DATA | {"name": "pool/dataset@snap2"},
+            "pool/other@snap1": SAMPLE_SNAPSHOT_DATA | {"name": "pool/other@snap1"},
+        },
+    }
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_stream", return_value=[json.dumps(zfs_list_data)])
+
+    snapshots_by_dataset = get_snapshots_by_dataset("pool")
+
+    mock_bash.assert_called_once_with("zfs list -t snapshot -pHj -o all -r pool", check=True)
+    assert {
+        dataset_name: [snapshot.name for snapshot in snapshots]
+        for dataset_name, snapshots in snapshots_by_dataset.items()
+    } == {"pool/dataset": ["snap1", "snap2"], "pool/other": ["snap1"]}
+
+
+def test_iter_snapshots_streams(mocker: MockerFixture) -> None:
+    """Test iter_snapshots yields each snapshot before the rest of the output is read."""
+    zfs_list_data = {
+        "output_version": SAMPLE_DATASET_DATA["output_version"],
+        "datasets": {
+            "pool/dataset@snap1": SAMPLE_SNAPSHOT_DATA,
+            "pool/dataset@snap2": SAMPLE_SNAPSHOT_DATA | {"name": "pool/dataset@snap2"},
+        },
+    }
+    raw_output = json.dumps(zfs_list_data)
+    chunks_read: list[str] = []
+
+    def fake_bash_stream(command: str, **_: object) -> Iterator[str]:
+        logging.debug(f"{command=}")
+        for index in range(0, len(raw_output), 16):
+            chunks_read.append(raw_output[index : index + 16])
+            yield chunks_read[-1]
+
+    mocker.patch("system_tools.zfs.dataset.bash_stream", side_effect=fake_bash_stream)
+
+    snapshots = iter_snapshots("pool/dataset", fields=("used",))
+    first_snapshot = next(snapshots)
+
+    assert first_snapshot.dataset == "pool/dataset"
+    assert first_snapshot.name == "snap1"
+    assert len("".join(chunks_read)) < len(raw_output)
+    assert [snapshot.name for snapshot in snapshots] == ["snap2"]
+
+
+def test_iter_snapshot_properties(mocker: MockerFixture) -> None:
+    """Test iter_snapshot_properties batches the snapshots into zfs get calls."""
+    mocker.patch("system_tools.zfs.dataset.MAX_COMMAND_LENGTH", 40)
+    snapshot_names = ["pool/dataset@snap1", "pool/dataset@snap2", "pool/dataset@snap3"]
+
+    def fake_bash_stream(command: str, **_: object) -> Iterator[str]:
+        zfs_get_data = {
+            "output_version": {"vers_major": 0, "vers_minor": 1, "command": "zfs get"},
+            "datasets": {
+                name: SAMPLE_SNAPSHOT_DATA | {"name": name}
+                for name in command.split()[4:]
+                if name != "pool/dataset@snap2"
+            },
+        }
+        yield json.dumps(zfs_get_data)
+
+    mock_bash = mocker.patch("system_tools.zfs.dataset.bash_stream", side_effect=fake_bash_stream)
+
+    snapshots = list(iter_snapshot_properties(snapshot_names, ("guid", "creation")))
+
+    assert [snapshot.name for snapshot in snapshots] == ["snap1", "snap3"]
+    assert snapshots[0].creation == datetime(2021, 5, 3, 0, 0, tzinfo=UTC)
+    assert mock_bash.call_args_list == [
+        call("zfs get -pHj guid,creation pool/dataset@snap1 pool/dataset@snap2", check=False),
+        call("zfs get -pHj guid,creation pool/dataset@snap3", check=False),
+    ]
+
+
+def fake_zfs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, output: dict[str, Any], error: str) -> None:
+    """Put a zfs on the PATH that prints complete JSON, then fails with error."""
+    (tmp_path / "output.json").write_text(json.dumps(output))
+    zfs = tmp_path / "zfs"
+    zfs.write_text(f"#!/bin/sh\ncat {tmp_path / 'output.json'}\necho '{error}' >&2\nexit 1\n")
+    zfs.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+
+
+def test_iter_snapshots_failed_command(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a zfs list that fails after printing complete JSON raises with its stderr."""
+    output = {"output_version": {"vers_major": 0, "vers_minor": 1, "command": "zfs list"}, "datasets": {}}
+    fake_zfs(tmp_path, monkeypatch, output, "cannot open missing: dataset does not exist")
+
+    with pytest.raises(RuntimeError, match="cannot open missing: dataset does not exist"):
+        list(iter_snapshots("missing"))
+
+
+def test_iter_snapshot_properties_missing_snapshot(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test a snapshot that no longer exists is logged and skipped."""
+    output = {
+        "output_version": {"vers_major": 0, "vers_minor": 1, "command": "zfs get"},
+        "datasets": {"pool/dataset@snap1": SAMPLE_SNAPSHOT_DATA | {"name": "pool/dataset@snap1"}},
+    }
+    fake_zfs(tmp_path, monkeypatch, output, "cannot open pool/dataset@snap2: dataset does not exist")
+
+    snapshots = list(iter_snapshot_properties(["pool/dataset@snap1", "pool/dataset@snap2"], ("guid", "creation")))
+
+    assert [snapshot.name for snapshot in snapshots] == ["snap1"]
+    assert "cannot open pool/dataset@snap2: dataset does not exist" in caplog.text
+
+
+def test_async_get_datasets(mocker: MockerFixture) -> None:
+    """Test async_get_datasets."""
+    semaphore = asyncio.Semaphore(1)
     mock_bash = mocker.patch(
-        "system_tools.zfs.dataset.bash_wrapper", return_value=("pool/dataset\npool/other\ninvalid", 0)
+        "system_tools.zfs.dataset.async_bash_wrapper",
+        return_value=(json.dumps(SAMPLE_DATASET_DATA), 0),
     )
-    mock_dataset = mocker.patch("system_tools.zfs.dataset.Dataset")
 
-    get_datasets()
+    datasets = asyncio.run(async_get_datasets("pool", fields=("used",), semaphore=semaphore))
+
+    mock_bash.assert_called_once_with("zfs list -t filesystem -pHj -o name,used -r pool", semaphore)
+    assert [dataset.name for dataset in datasets] == ["pool/dataset"]
 
-    mock_bash.assert_called_once_with("zfs list -Hp -t filesystem -o name")
 
-    calls = [call("pool/dataset"), call("pool/other")]
+def test_iter_datasets_version_check(mocker: MockerFixture) -> None:
+    """Test version validation in iter_datasets."""
+    zfs_list_data = {
+        "output_version": {"vers_major": 1, "vers_minor": 0, "command": "zfs list"},
+        "datasets": SAMPLE_DATASET_DATA["datasets"],
+    }
+    mocker.patch("system_tools.zfs.dataset.bash_stream", return_value=[json.dumps(zfs_list_data)])
 
-    mock_dataset.assert_has_calls(calls)
+    with pytest.raises(RuntimeError, match="Datasets are not in the correct format"):
+        list(iter_datasets())
 
 
 def test_zpool_initialization(mocker: MockerFixture) -> None:
@@ -225,7 +558,7 @@ def test_zpool_initialization(mocker: MockerFixture) -> None:
 
     zpool = Zpool("testpool")
 
-    assert zpool.__dict__ == {
+    expected = {
         "name": "testpool",
         "allocated": 1000000,
         "altroot": "none",
@@ -248,6 +581,60 @@ def test_zpool_initialization(mocker: MockerFixture) -> None:
         "readonly": "off",
         "size": 2000000,
     }
+    assert {attribute: getattr(zpool, attribute) for attribute in expected} == expected
+
+
+def test_async_get_zpools(mocker: MockerFixture) -> None:
+    """Test async_get_zpools loads every pool with one zpool list call."""
+    mock_bash = mocker.patch(
+        "system_tools.zfs.zpool.async_bash_wrapper",
+        return_value=(json.dumps(SAMPLE_ZPOOL_DATA), 0),
+    )
+
+    zpools = asyncio.run(async_get_zpools(["testpool"], fields=("health",)))
+
+    mock_bash.assert_called_once_with("zpool list testpool -pHj -o name,health", None)
+    assert [(zpool.name, zpool.health) for zpool in zpools] == [("testpool", "ONLINE")]
+
+
+def test_get_zpools(mocker: MockerFixture) -> None:
+    """Test get_zpools loads every pool with one zpool list call."""
+    pools = {
+        "testpool": {"properties": {"health": {"value": "ONLINE"}}},
+        "backup": {"properties": {"health": {"value": "DEGRADED"}}},
+    }
+    mock_zpool_list = mocker.patch(
+        "system_tools.zfs.zpool._zpool_list",
+        return_value={**SAMPLE_ZPOOL_DATA, "pools": pools},
+    )
+
+    zpools = get_zpools(["testpool", "backup"], fields=("health",))
+
+    mock_zpool_list.assert_called_once_with("zpool list testpool backup -pHj -o name,health")
+    assert [(zpool.name, zpool.health) for zpool in zpools] == [("testpool", "ONLINE"), ("backup", "DEGRADED")]
+    assert get_zpools([]) == []
+
+
+def test_zpool_fields(mocker: MockerFixture) -> None:
+    """Test Zpool only fetches the requested fields."""
+    mock_zpool_list = mocker.patch("system_tools.zfs.zpool._zpool_list", return_value=SAMPLE_ZPOOL_DATA)
+
+    zpool = Zpool("testpool", fields=("health", "capacity"))
+
+    mock_zpool_list.assert_called_once_with("zpool list testpool -pHj -o name,health,capacity")
+    assert zpool.health == "ONLINE"
+
+
+def test_zpool_positional_properties(mocker: MockerFixture) -> None:
+    """Test Zpool takes its properties second, in the same order as Dataset."""
+    mock_zpool_list = mocker.patch("system_tools.zfs.zpool._zpool_list")
+
+    zpool = Zpool("testpool", {"health": {"value": "ONLINE"}})
+    dataset = Dataset("testpool/data", {"used": {"value": "100"}})
+
+    mock_zpool_list.assert_not_called()
+    assert zpool.health == "ONLINE"
+    assert dataset.used == 100  # noqa: PLR2004
 
 
 def test_zpool_repr(mocker: MockerFixture) -> None: